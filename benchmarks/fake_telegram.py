@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import asyncio
+import collections
+import json
+import time
+from http import HTTPStatus
+from urllib.parse import parse_qsl, urlsplit
+
+BOT_USER = {'id': 1000000, 'is_bot': True, 'first_name': 'Poker', 'username': 'poker_bot', 'can_join_groups': True,
+            'can_read_all_group_messages': True, 'supports_inline_queries': False}
+MAX_POLL_TIMEOUT = 50
+MAX_BODY_SIZE = 1024 * 1024
+REPLY_TIMEOUT = 30
+STRING_PARAMETERS = {'text', 'chat_id'}
+
+
+class FakeTelegramServer:
+    def __init__(self, token: str):
+        self.token = token
+        self.host = None
+        self.port = None
+        self.calls: collections.Counter[str] = collections.Counter()
+        self.sent: list[dict] = []
+        self.edited: list[dict] = []
+        self.polling: asyncio.Event | None = None
+        self.__server: asyncio.Server | None = None
+        self.__connections: set[asyncio.Task] = set()
+        self.__updates: collections.deque[dict] = collections.deque()
+        self.__pushed: dict[int, dict] = {}
+        self.__new_updates: asyncio.Condition | None = None
+        self.__next_update_id = 1
+        self.__next_message_id = 1
+        self.__replies: dict[int, asyncio.Queue] = {}
+        self.__methods = {
+            'getMe': self.__get_me,
+            'getUpdates': self.__get_updates,
+            'sendMessage': self.__send_message,
+            'editMessageText': self.__edit_message_text,
+        }
+
+    @property
+    def base_url(self) -> str:
+        return f'http://{self.host}:{self.port}/bot'
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> None:
+        self.polling = asyncio.Event()
+        self.__new_updates = asyncio.Condition()
+        self.__replies = collections.defaultdict(asyncio.Queue)
+        self.__server = await asyncio.start_server(self.__handle_connection, host, port)
+        self.host = host
+        self.port = self.__server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        if self.__server is None:
+            return
+        self.__server.close()
+        for connection in self.__connections:
+            connection.cancel()
+        await asyncio.gather(*self.__connections, return_exceptions=True)
+        await self.__server.wait_closed()
+        self.__server = None
+
+    async def push_message(self, chat_id: int, username: str, text: str) -> int:
+        update_id = self.__next_update_id
+        self.__next_update_id += 1
+        message = {
+            'message_id': self.__create_message_id(),
+            'date': int(time.time()),
+            'chat': self.__chat(chat_id),
+            'from': {'id': abs(hash(username)) % 10 ** 9, 'is_bot': False, 'first_name': username,
+                     'username': username},
+            'text': text,
+        }
+        if text.startswith('/'):
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split(' ', 1)[0])}]
+        self.__pushed[update_id] = {'update_id': update_id, 'message': message}
+        await self.__enqueue(self.__pushed[update_id])
+        return update_id
+
+    async def redeliver(self, update_id: int) -> None:
+        await self.__enqueue(self.__pushed[update_id])
+
+    async def request(self, chat_id: int, username: str, text: str, timeout: float = REPLY_TIMEOUT) \
+            -> tuple[dict, float]:
+        replies = self.__replies[chat_id]
+        started = time.perf_counter()
+        await self.push_message(chat_id, username, text)
+        try:
+            reply = await asyncio.wait_for(replies.get(), timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f'No reply to {text!r} in chat {chat_id} within {timeout}s') from None
+        return reply, time.perf_counter() - started
+
+    async def __enqueue(self, update: dict) -> None:
+        async with self.__new_updates:
+            self.__updates.append(update)
+            self.__new_updates.notify_all()
+
+    async def __handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        self.__connections.add(task)
+        try:
+            while True:
+                request = await self.__read_request(reader)
+                if request is None:
+                    break
+                path, headers, body = request
+                status, payload = await self.__process_request(path, headers, body)
+                content = json.dumps(payload).encode()
+                writer.write(f'HTTP/1.1 {status.value} {status.phrase}\r\nContent-Type: application/json\r\n'
+                             f'Content-Length: {len(content)}\r\n\r\n'.encode() + content)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.CancelledError, ConnectionError, ValueError):
+            pass
+        finally:
+            self.__connections.discard(task)
+            writer.close()
+
+    async def __read_request(self, reader: asyncio.StreamReader) -> tuple[str, dict[str, str], bytes] | None:
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        _, path, _ = request_line.decode('latin-1').split(' ', 2)
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode('latin-1').strip()
+            if not line:
+                break
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get('content-length', 0))
+        if length > MAX_BODY_SIZE:
+            raise ValueError('Request body is too large')
+        body = await reader.readexactly(length) if length else b''
+        return path, headers, body
+
+    async def __process_request(self, path: str, headers: dict[str, str], body: bytes) -> tuple[HTTPStatus, dict]:
+        prefix, _, method = urlsplit(path).path.rpartition('/')
+        if prefix != f'/bot{self.token}':
+            return HTTPStatus.UNAUTHORIZED, {'ok': False, 'error_code': 401, 'description': 'Unauthorized'}
+        self.calls[method] += 1
+        handler = self.__methods.get(method)
+        parameters = self.__parse_parameters(headers, body)
+        result = await handler(parameters) if handler else True
+        return HTTPStatus.OK, {'ok': True, 'result': result}
+
+    @staticmethod
+    def __parse_parameters(headers: dict[str, str], body: bytes) -> dict:
+        if not body:
+            return {}
+        if headers.get('content-type', '').startswith('application/json'):
+            return json.loads(body)
+        parameters = {}
+        for name, value in parse_qsl(body.decode()):
+            if name in STRING_PARAMETERS:
+                parameters[name] = value
+                continue
+            try:
+                parameters[name] = json.loads(value)
+            except ValueError:
+                parameters[name] = value
+        return parameters
+
+    async def __get_me(self, _: dict) -> dict:
+        return BOT_USER
+
+    async def __get_updates(self, parameters: dict) -> list[dict]:
+        self.polling.set()
+        offset = int(parameters.get('offset') or 0)
+        limit = int(parameters.get('limit') or 100)
+        timeout = min(float(parameters.get('timeout') or 0), MAX_POLL_TIMEOUT)
+        async with self.__new_updates:
+            self.__updates = collections.deque(update for update in self.__updates if update['update_id'] >= offset)
+            if not self.__updates and timeout:
+                try:
+                    await asyncio.wait_for(self.__new_updates.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+            return list(self.__updates)[:limit]
+
+    async def __send_message(self, parameters: dict) -> dict:
+        message = {
+            'message_id': self.__create_message_id(),
+            'date': int(time.time()),
+            'chat': self.__chat(int(parameters['chat_id'])),
+            'from': BOT_USER,
+            'text': parameters['text'],
+        }
+        self.sent.append(message)
+        self.__replies[message['chat']['id']].put_nowait(message)
+        return message
+
+    async def __edit_message_text(self, parameters: dict) -> dict:
+        message = {
+            'message_id': int(parameters['message_id']),
+            'date': int(time.time()),
+            'edit_date': int(time.time()),
+            'chat': self.__chat(int(parameters['chat_id'])),
+            'from': BOT_USER,
+            'text': parameters['text'],
+        }
+        self.edited.append(message)
+        return message
+
+    def __create_message_id(self) -> int:
+        message_id = self.__next_message_id
+        self.__next_message_id += 1
+        return message_id
+
+    @staticmethod
+    def __chat(chat_id: int) -> dict:
+        return {'id': chat_id, 'type': 'group', 'title': f'Chat {chat_id}'}
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from typing import Callable
+
+from peewee import SqliteDatabase
+
+from benchmarks.results import save_results, print_results, check_baseline, DEFAULT_THRESHOLD
+from benchmarks.workload import Workload
+from core.analytics import get_user_stats, get_monthly_trend
+from core.buy_in import add_buy_in, calculate_total_buy_in
+from core.cache import active_games
+from core.database import create_database
+from core.game import calculate_profit, calculate_money_transfers, calculate_total_profit_in_all_finished_games, \
+    undo_last_action
+from core.migrations import migrate, MODELS
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines', 'ledger.json')
+
+
+def measure(func: Callable[[], object], repeat: int, prepare: Callable[[], object] = None) -> float:
+    timings = []
+    for _ in range(repeat):
+        if prepare:
+            prepare()
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+def run_benchmarks(database: SqliteDatabase, workload: Workload, repeat: int) -> dict[str, float]:
+    chat_id = workload.busy_chat
+    with database.bind_ctx(MODELS):
+        migrate(database)
+        active_games.clear()
+        started = time.perf_counter()
+        workload.generate()
+        results = {
+            'generate_workload': (time.perf_counter() - started) * 1000,
+            'calculate_total_buy_in': measure(lambda: calculate_total_buy_in(chat_id), repeat),
+            'calculate_profit': measure(lambda: calculate_profit(chat_id), repeat),
+            'calculate_money_transfers': measure(lambda: calculate_money_transfers(chat_id), repeat),
+            'calculate_total_profit_in_all_finished_games':
+                measure(lambda: calculate_total_profit_in_all_finished_games(chat_id), repeat),
+            'get_user_stats': measure(lambda: get_user_stats(chat_id), repeat),
+            'get_monthly_trend': measure(lambda: get_monthly_trend(chat_id), repeat),
+            'undo_last_action': measure(lambda: undo_last_action(chat_id), repeat,
+                                        prepare=lambda: add_buy_in(chat_id, ['player0'], 100)),
+        }
+        active_games.clear()
+    database.close()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Time core ledger functions on a synthetic multi-chat workload')
+    parser.add_argument('--chats', type=int, default=20)
+    parser.add_argument('--players', type=int, default=300)
+    parser.add_argument('--finished-games', type=int, default=40)
+    parser.add_argument('--actions-per-game', type=int, default=150)
+    parser.add_argument('--active-actions', type=int, default=3000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='save results as JSON')
+    parser.add_argument('--baseline', nargs='?', const=BASELINE_PATH, help='compare with results saved earlier')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        databases = {
+            'memory': SqliteDatabase(':memory:'),
+            'disk': create_database(os.path.join(directory, 'poker.db')),
+        }
+        for name, database in databases.items():
+            workload = Workload(args.chats, args.players, finished_games=args.finished_games,
+                                actions_per_game=args.actions_per_game, active_actions=args.active_actions,
+                                seed=args.seed)
+            for function, value in run_benchmarks(database, workload, args.repeat).items():
+                results[f'{name}.{function}'] = value
+    print_results(results, 'ms')
+    if args.output:
+        save_results(args.output, results)
+    if args.baseline:
+        check_baseline(results, args.baseline, args.threshold)
+
+
+if __name__ == '__main__':
+    main()
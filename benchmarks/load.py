@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import random
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.fake_telegram import FakeTelegramServer, BOT_USER
+from benchmarks.results import save_results, print_results, check_baseline, DEFAULT_THRESHOLD
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOKEN = '123456:load-test'
+START_TIMEOUT = 60
+STOP_TIMEOUT = 30
+REPLY_TIMEOUT = 30
+BUY_IN = 500
+HIGHER_IS_BETTER = ['commands_per_second']
+
+
+def script_chat(random_: random.Random, games: int) -> list[tuple[str, str]]:
+    players = [f'player{index}' for index in range(random_.randint(3, 8))]
+    host = players[0]
+    commands = []
+    for _ in range(games):
+        commands.append((host, '/start'))
+        bank = 0
+        for player in players:
+            if random_.random() < 0.3:
+                commands.append((host, f'@{BOT_USER["username"]} /buy @{player} {BUY_IN}'))
+            else:
+                commands.append((player, f'/buy {BUY_IN}'))
+            bank += BUY_IN
+        rebuys = random_.sample(players, random_.randint(0, len(players) // 2))
+        if rebuys:
+            commands.append((host, f'/buy {" ".join(f"@{player}" for player in rebuys)} {BUY_IN}'))
+            bank += BUY_IN * len(rebuys)
+        commands.append((host, '/status'))
+        if random_.random() < 0.5:
+            commands.append((host, '/undo'))
+            commands.append((host, '/redo'))
+        shares = sorted(random_.sample(range(0, bank + 1, 100), len(players) - 1))
+        amounts = [end - start for start, end in zip([0, *shares], [*shares, bank])]
+        for player, amount in zip(players, amounts):
+            commands.append((player, f'/quit {amount}'))
+        commands.append((host, '/stop'))
+        commands.append((host, '/statistics'))
+    return commands
+
+
+async def play_chat(server: FakeTelegramServer, chat_id: int, commands: list[tuple[str, str]],
+                    semaphore: asyncio.Semaphore, latencies: dict[str, list[float]]) -> None:
+    async with semaphore:
+        for username, text in commands:
+            _, latency = await server.request(chat_id, username, text, REPLY_TIMEOUT)
+            command = text.split(' /', 1)[-1].split(' ', 1)[0].lstrip('/')
+            latencies.setdefault(command, []).append(latency)
+
+
+async def run_load(args: argparse.Namespace) -> dict[str, float]:
+    server = FakeTelegramServer(TOKEN)
+    await server.start()
+    random_ = random.Random(args.seed)
+    scripts = {-1000000 - index: script_chat(random_, args.games) for index in range(args.chats)}
+    latencies: dict[str, list[float]] = {}
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(os.environ, POKER_BOT_TOKEN=TOKEN, POKER_BOT_API_BASE_URL=server.base_url,
+                   POKER_BOT_DB_PATH=os.path.join(directory, 'poker.db'), POKER_BOT_STORAGE=args.storage,
+                   POKER_BOT_WORKERS=str(args.workers), POKER_BOT_MODE='polling',
+                   POKER_BOT_STATE_PATH=os.path.join(directory, 'bot-state.pickle'), POKER_BOT_LIVE_STATUS='0')
+        process = await asyncio.create_subprocess_exec(sys.executable, 'main.py', cwd=ROOT, env=env,
+                                                       stdout=subprocess.DEVNULL,
+                                                       stderr=None if args.verbose else subprocess.DEVNULL)
+        try:
+            await asyncio.wait_for(server.polling.wait(), START_TIMEOUT)
+            semaphore = asyncio.Semaphore(args.concurrency or len(scripts))
+            started = time.perf_counter()
+            await asyncio.gather(*(play_chat(server, chat_id, commands, semaphore, latencies)
+                                   for chat_id, commands in scripts.items()))
+            elapsed = time.perf_counter() - started
+        finally:
+            process.send_signal(signal.SIGINT)
+            try:
+                await asyncio.wait_for(process.wait(), STOP_TIMEOUT)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+            await server.stop()
+    return summarize(latencies, elapsed, server)
+
+
+def summarize(latencies: dict[str, list[float]], elapsed: float, server: FakeTelegramServer) -> dict[str, float]:
+    everything = [latency for values in latencies.values() for latency in values]
+    results = {
+        'commands': len(everything),
+        'commands_per_second': len(everything) / elapsed,
+        'api_calls_per_command': sum(server.calls.values()) / len(everything),
+    }
+    for name, values in [('all', everything), *sorted(latencies.items())]:
+        results.update({f'{name}.{key}': value for key, value in percentiles(values).items()})
+    return results
+
+
+def percentiles(values: list[float]) -> dict[str, float]:
+    if len(values) < 2:
+        return {'p50_ms': values[0] * 1000, 'p90_ms': values[0] * 1000, 'p99_ms': values[0] * 1000,
+                'max_ms': values[0] * 1000}
+    quantiles = statistics.quantiles(values, n=100, method='inclusive')
+    return {'p50_ms': quantiles[49] * 1000, 'p90_ms': quantiles[89] * 1000, 'p99_ms': quantiles[98] * 1000,
+            'max_ms': max(values) * 1000}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Replay scripted chats through a fake Telegram API and measure the '
+                                                 'end-to-end latency of the bot')
+    parser.add_argument('--chats', type=int, default=200)
+    parser.add_argument('--games', type=int, default=3, help='games played in every chat')
+    parser.add_argument('--concurrency', type=int, help='chats playing at the same time, all by default')
+    parser.add_argument('--storage', choices=['sqlite', 'memory'], default='sqlite')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--verbose', action='store_true', help='show bot logs')
+    parser.add_argument('--output', help='save results as JSON')
+    parser.add_argument('--baseline', help='compare with results saved earlier')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args()
+    results = asyncio.run(run_load(args))
+    print_results(results, '')
+    if args.output:
+        save_results(args.output, results)
+    if args.baseline:
+        check_baseline(results, args.baseline, args.threshold, HIGHER_IS_BETTER)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import datetime
+import json
+import platform
+import sys
+from typing import Iterable
+
+DEFAULT_THRESHOLD = 0.25
+
+
+def save_results(path: str, results: dict[str, float]) -> None:
+    report = {
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+    with open(path, 'w') as file:
+        json.dump(report, file, indent=2, sort_keys=True)
+
+
+def load_results(path: str) -> dict[str, float]:
+    with open(path) as file:
+        return json.load(file)['results']
+
+
+def find_regressions(results: dict[str, float], baseline: dict[str, float], threshold: float = DEFAULT_THRESHOLD,
+                     higher_is_better: Iterable[str] = ()) -> list[tuple[str, float | None, float]]:
+    higher_is_better = set(higher_is_better)
+    return [(name, baseline.get(name), value) for name, value in sorted(results.items())
+            if name not in baseline or (value < baseline[name] * (1 - threshold) if name in higher_is_better
+                                        else value > baseline[name] * (1 + threshold))]
+
+
+def print_results(results: dict[str, float], unit: str) -> None:
+    width = max(map(len, results), default=0)
+    for name, value in sorted(results.items()):
+        print(f'{name:<{width}}  {value:12.3f} {unit}')
+
+
+def check_baseline(results: dict[str, float], baseline_path: str, threshold: float,
+                   higher_is_better: Iterable[str] = ()) -> None:
+    regressions = find_regressions(results, load_results(baseline_path), threshold, higher_is_better)
+    for name, expected, actual in regressions:
+        if expected is None:
+            print(f'MISSING {name}: {actual:.3f} has no baseline, regenerate {baseline_path}')
+        else:
+            print(f'REGRESSION {name}: {expected:.3f} -> {actual:.3f} ({(actual / expected - 1) * 100:+.0f}%)')
+    if regressions:
+        sys.exit(1)
+    print(f'No regressions over {threshold * 100:.0f}% against {baseline_path}')
@@ -0,0 +1,47 @@
+import argparse
+import os
+import tempfile
+import time
+
+from peewee import SqliteDatabase
+
+from core.buy_in import add_buy_in
+from core.cache import active_games
+from core.database import create_database
+from core.game import start_game
+from core.migrations import migrate, MODELS
+
+CHAT_ID = 'benchmark'
+
+
+def measure_writes(database: SqliteDatabase, operations: int) -> float:
+    with database.bind_ctx(MODELS):
+        migrate(database)
+        active_games.clear()
+        start_game(CHAT_ID)
+        started = time.perf_counter()
+        for operation in range(operations):
+            add_buy_in(CHAT_ID, [f'user{operation % 10}'], 100)
+        elapsed = time.perf_counter() - started
+        active_games.clear()
+    database.close()
+    return operations / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Compare SQLite write throughput with default and tuned pragmas')
+    parser.add_argument('--operations', type=int, default=2000)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        databases = {
+            'default': SqliteDatabase(os.path.join(directory, 'default.db')),
+            'tuned': create_database(os.path.join(directory, 'tuned.db')),
+        }
+        results = {name: measure_writes(database, args.operations) for name, database in databases.items()}
+    for name, throughput in results.items():
+        print(f'{name:>8}: {throughput:10.1f} buy-ins/s')
+    print(f' speedup: {results["tuned"] / results["default"]:10.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.results import save_results, print_results, check_baseline, DEFAULT_THRESHOLD
+
+MODULES = ['core.models', 'core.game', 'core.database', 'bot.bot', 'manage']
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure_import(module: str) -> float:
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                               cwd=ROOT, capture_output=True, text=True, check=True)
+    for line in reversed(completed.stderr.splitlines()):
+        _, cumulative, name = line.split('|')
+        if name.strip() == module:
+            return int(cumulative) / 1000
+    raise ValueError(f'No import time reported for {module}')
+
+
+def measure_bootstrap() -> dict[str, float]:
+    script = ('import sys, time; started = time.perf_counter(); import core.database; '
+              'core.database.bootstrap(sys.argv[1]); print(time.perf_counter() - started)')
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'poker.db')
+        timings = [float(subprocess.run([sys.executable, '-c', script, path], cwd=ROOT, capture_output=True,
+                                        text=True, check=True).stdout) * 1000 for _ in range(2)]
+    return {'bootstrap.new_database': timings[0], 'bootstrap.existing_database': timings[1]}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Measure import and schema bootstrap time')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='save results as JSON')
+    parser.add_argument('--baseline', help='compare with results saved earlier')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args()
+    results = {f'import.{module}': statistics.median(measure_import(module) for _ in range(args.repeat))
+               for module in MODULES}
+    bootstraps = [measure_bootstrap() for _ in range(args.repeat)]
+    for name in bootstraps[0]:
+        results[name] = statistics.median(bootstrap[name] for bootstrap in bootstraps)
+    print_results(results, 'ms')
+    if args.output:
+        save_results(args.output, results)
+    if args.baseline:
+        check_baseline(results, args.baseline, args.threshold)
+
+
+if __name__ == '__main__':
+    main()
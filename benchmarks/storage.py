@@ -0,0 +1,70 @@
+import argparse
+import os
+import tempfile
+import time
+
+from core.cache import active_games
+from core.database import create_database
+from core.memory_storage import MemoryStorage
+from core.migrations import migrate, MODELS
+from core.storage import Storage, SqliteStorage
+
+CHAT_ID = 'benchmark'
+PLAYERS = 10
+
+
+def run_commands(storage: Storage, operations: int) -> float:
+    started = time.perf_counter()
+    storage.start_game(CHAT_ID)
+    for operation in range(operations):
+        user = f'user{operation % PLAYERS}'
+        with storage.atomic():
+            if operation % 5 == 4 and storage.has_buy_in(CHAT_ID, user):
+                storage.add_cash_out(CHAT_ID, user, 50)
+                storage.calculate_profit(CHAT_ID, user)
+            else:
+                storage.add_buy_in(CHAT_ID, [user], 100)
+                storage.calculate_total_buy_in(CHAT_ID, [user])
+            storage.calculate_bank_size(CHAT_ID)
+        if operation % 50 == 49:
+            with storage.atomic():
+                storage.undo_last_actions(CHAT_ID)
+                storage.calculate_total_buy_in(CHAT_ID)
+                storage.calculate_total_cash_out(CHAT_ID)
+        if operation % 500 == 499:
+            with storage.atomic():
+                storage.calculate_money_transfers(CHAT_ID)
+                storage.finish_games(CHAT_ID)
+                storage.calculate_total_profit_in_all_finished_games(CHAT_ID)
+                storage.get_user_stats(CHAT_ID)
+                storage.start_game(CHAT_ID)
+    return operations / (time.perf_counter() - started)
+
+
+def measure_sqlite(path: str, operations: int) -> float:
+    database = create_database(path)
+    with database.bind_ctx(MODELS):
+        migrate(database)
+        active_games.clear()
+        throughput = run_commands(SqliteStorage(), operations)
+        active_games.clear()
+    database.close()
+    return throughput
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Compare command throughput of the SQLite and in-memory storage')
+    parser.add_argument('--operations', type=int, default=2000)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        results = {
+            'sqlite': measure_sqlite(os.path.join(directory, 'poker.db'), args.operations),
+            'memory': run_commands(MemoryStorage(), args.operations),
+        }
+    for name, throughput in results.items():
+        print(f'{name:>8}: {throughput:10.1f} commands/s')
+    print(f' speedup: {results["memory"] / results["sqlite"]:10.2f}x')
+
+
+if __name__ == '__main__':
+    main()
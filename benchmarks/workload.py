@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import datetime
+import random
+
+from peewee import chunked
+
+from core.action_log import backfill_actions
+from core.analytics import rebuild_analytics
+from core.balance import rebuild_balances
+from core.buy_in import add_buy_in
+from core.cash_out import add_cash_out
+from core.game import start_game, undo_last_action
+from core.leaderboard import rebuild_lifetime_totals
+from core.models import Game, BuyIn, CashOut, atomic
+
+INSERT_BATCH_SIZE = 500
+BUY_IN_AMOUNTS = [100, 200, 500, 1000]
+
+
+class Workload:
+    def __init__(self, chats: int = 20, players: int = 300, players_per_game: int = 12,
+                 finished_games: int = 40, actions_per_game: int = 150, active_actions: int = 3000,
+                 seed: int = 0):
+        self.chats = [f'chat{index}' for index in range(chats)]
+        self.players = [f'player{index}' for index in range(players)]
+        self.players_per_game = players_per_game
+        self.finished_games = finished_games
+        self.actions_per_game = actions_per_game
+        self.active_actions = active_actions
+        self.random = random.Random(seed)
+
+    @property
+    def busy_chat(self) -> str:
+        return self.chats[0]
+
+    def generate(self) -> None:
+        with atomic():
+            for chat_id in self.chats:
+                self.__generate_history(chat_id)
+            backfill_actions()
+            rebuild_balances()
+            rebuild_lifetime_totals()
+            rebuild_analytics()
+        for chat_id in self.chats:
+            start_game(chat_id)
+        self.play(self.busy_chat, self.active_actions)
+
+    def play(self, chat_id: str, actions: int) -> None:
+        players = self.random.sample(self.players, self.players_per_game)
+        add_buy_in(chat_id, players, self.random.choice(BUY_IN_AMOUNTS))
+        for _ in range(actions):
+            roll = self.random.random()
+            if roll < 0.7:
+                add_buy_in(chat_id, [self.random.choice(players)], self.random.choice(BUY_IN_AMOUNTS))
+            elif roll < 0.95:
+                add_cash_out(chat_id, self.random.choice(players), self.random.choice(BUY_IN_AMOUNTS))
+            else:
+                undo_last_action(chat_id)
+
+    def __generate_history(self, chat_id: str) -> None:
+        started = datetime.datetime(2020, 1, 1)
+        for game_index in range(self.finished_games):
+            timestamp = started + datetime.timedelta(days=7 * game_index)
+            game = Game.create(chat_id=chat_id, is_finished=True, finished_at=timestamp + datetime.timedelta(hours=6))
+            players = self.random.sample(self.players, self.players_per_game)
+            buy_ins = []
+            for action in range(self.actions_per_game):
+                buy_ins.append({'game': game, 'user': self.random.choice(players),
+                                'amount': self.random.choice(BUY_IN_AMOUNTS),
+                                'timestamp': timestamp + datetime.timedelta(seconds=action)})
+            totals = {}
+            for buy_in in buy_ins:
+                totals[buy_in['user']] = totals.get(buy_in['user'], 0) + buy_in['amount']
+            bank = sum(totals.values())
+            cash_outs = []
+            for index, user in enumerate(totals):
+                amount = bank if index == len(totals) - 1 else self.random.randint(0, bank // 2)
+                bank -= amount
+                cash_outs.append({'game': game, 'user': user, 'amount': amount,
+                                  'timestamp': timestamp + datetime.timedelta(hours=5, seconds=index)})
+            for batch in chunked(buy_ins, INSERT_BATCH_SIZE):
+                BuyIn.insert_many(batch).execute()
+            CashOut.insert_many(cash_outs).execute()
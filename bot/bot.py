@@ -1,18 +1,58 @@
+from __future__ import annotations
+
+import asyncio
+import datetime
 import os
 import re
+from typing import TYPE_CHECKING, Coroutine
+
+import core.aio
+import core.database
+import core.profiling
+import core.storage
+from bot.rendering import format_summary, format_profit, format_transfers, format_report, render, reply_pages
 
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Application, CommandHandler, ContextTypes, filters, \
-    MessageHandler
+if TYPE_CHECKING:
+    from telegram import Update
+    from telegram.ext import Application, ContextTypes
 
-import core.buy_in
-import core.cash_out
-import core.game
+    from bot.cluster import WorkerChannel
+    from bot.live_status import LiveStatus
+    from bot.persistence import UpdateTracker
 
 TOKEN = os.getenv('POKER_BOT_TOKEN')
+API_BASE_URL = os.getenv('POKER_BOT_API_BASE_URL')
+DB_PATH = os.getenv('POKER_BOT_DB_PATH', core.database.DEFAULT_PATH)
+MODE = os.getenv('POKER_BOT_MODE', 'polling')
+WEBHOOK_URL = os.getenv('POKER_BOT_WEBHOOK_URL')
+WEBHOOK_SECRET = os.getenv('POKER_BOT_WEBHOOK_SECRET')
+WEBHOOK_LISTEN = os.getenv('POKER_BOT_WEBHOOK_LISTEN', '127.0.0.1')
+WEBHOOK_PORT = int(os.getenv('POKER_BOT_WEBHOOK_PORT', 8443))
+DB_POOL_SIZE = int(os.getenv('POKER_BOT_DB_POOL_SIZE', core.aio.DEFAULT_POOL_SIZE))
+MAX_CONCURRENT_UPDATES = int(os.getenv('POKER_BOT_MAX_CONCURRENT_UPDATES', 64))
+WORKERS = int(os.getenv('POKER_BOT_WORKERS', 1))
+LIVE_STATUS = os.getenv('POKER_BOT_LIVE_STATUS', '').lower() in ('1', 'true', 'yes')
+LIVE_STATUS_DELAY = float(os.getenv('POKER_BOT_LIVE_STATUS_DELAY', 2))
+METRICS_LISTEN = os.getenv('POKER_BOT_METRICS_LISTEN', '127.0.0.1')
+METRICS_PORT = os.getenv('POKER_BOT_METRICS_PORT')
+OWNER_ID = os.getenv('POKER_BOT_OWNER_ID')
+STORAGE = os.getenv('POKER_BOT_STORAGE', core.storage.SQLITE)
+SNAPSHOT_PATH = os.getenv('POKER_BOT_SNAPSHOT_PATH')
+SNAPSHOT_INTERVAL = float(os.getenv('POKER_BOT_SNAPSHOT_INTERVAL', 60))
+STATE_PATH = os.getenv('POKER_BOT_STATE_PATH', 'bot-state.pickle')
+STATE_INTERVAL = float(os.getenv('POKER_BOT_STATE_INTERVAL', 5))
+PROFILE_DIR = os.getenv('POKER_BOT_PROFILE_DIR', core.profiling.DEFAULT_DIRECTORY)
+PROFILE_RATE = float(os.getenv('POKER_BOT_PROFILE_RATE', 0))
+PROFILE_KEEP = int(os.getenv('POKER_BOT_PROFILE_KEEP', core.profiling.DEFAULT_KEEP))
 NUMBER_REGEXP = '\\d+'
+MONTH_REGEXP = '\\d{4}-\\d{2}'
 NOT_FOUND = -1
 
+storage: core.storage.Storage = core.storage.SqliteStorage()
+live_status: LiveStatus | None = None
+update_tracker: UpdateTracker | None = None
+profiler = core.profiling.Profiler(PROFILE_DIR, PROFILE_RATE, PROFILE_KEEP)
+
 
 def __get_chat_id(update: Update) -> str:
     return str(update.effective_chat.id)
@@ -34,164 +74,229 @@ def __get_mentioned_users(args: list[str], effective_user: str) -> list[str]:
     return users
 
 
-def __format_summary(total_buy_in: dict[str, int], total_cash_out: dict[str, int], bank_size: int = 0) -> str:
-    if not total_buy_in:
-        return 'Никто не входил'
-    message = ''
-    if bank_size != 0:
-        message += f'Банк {bank_size}\n'
-    message += '\nВход:\n'
-    total_buy_in_sorted = sorted(total_buy_in.items(), key=lambda item: item[1], reverse=True)
-    for user, total in total_buy_in_sorted:
-        message += f'{user} {total}\n'
-    if total_cash_out:
-        message += '\nВыход:\n'
-        total_cash_out_sorted = sorted(total_cash_out.items(), key=lambda item: item[1], reverse=True)
-        for user, total in total_cash_out_sorted:
-            message += f'{user} {total}\n'
-    return message
+async def start(update: Update, _: ContextTypes.DEFAULT_TYPE) -> None:
+    message = await core.aio.transaction(__start, __get_chat_id(update), immediate=True)
+    await update.message.reply_text(message)
 
 
-def __format_profit(profits: dict[str, int]):
-    message = '\nПрофит:\n'
-    profits_sorted = sorted(profits.items(), key=lambda item: item[1], reverse=True)
-    for user, profit in profits_sorted:
-        message += f'{user} {profit}\n'
-    return message
+def __start(chat_id: str) -> str:
+    if storage.has_active_games(chat_id):
+        return 'Катка уже идёт'
+    storage.start_game(chat_id)
+    return 'Катка началась'
 
 
-async def start(update: Update, _: ContextTypes.DEFAULT_TYPE) -> None:
-    chat_id = __get_chat_id(update)
-    if core.game.has_active_games(chat_id):
-        await update.message.reply_text('Катка уже идёт')
-        return
-    core.game.start_game(chat_id)
-    await update.message.reply_text('Катка началась')
+async def buy(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    message, changed = await core.aio.transaction(__buy, __get_chat_id(update), context.args,
+                                                  update.effective_user.username, immediate=True)
+    await __reply_or_refresh(update, context, message, changed)
 
 
-async def buy(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    chat_id = __get_chat_id(update)
-    if not core.game.has_active_games(chat_id):
-        await update.message.reply_text('Катка не идёт')
-        return
-    amount = __find_number(context.args)
+def __buy(chat_id: str, args: list[str], username: str) -> tuple[str, bool]:
+    if not storage.has_active_games(chat_id):
+        return 'Катка не идёт', False
+    amount = __find_number(args)
     if amount == NOT_FOUND:
-        await update.message.reply_text('Не указана сумма закупа')
-        return
-    mentions = __get_mentioned_users(context.args, effective_user=update.effective_user.username)
-    users = mentions if mentions else [update.effective_user.username]
-    core.buy_in.add_buy_in(chat_id, users, amount)
-    total_buy_in = core.buy_in.calculate_total_buy_in(chat_id, users)
+        return 'Не указана сумма закупа', False
+    mentions = __get_mentioned_users(args, effective_user=username)
+    users = mentions if mentions else [username]
+    storage.add_buy_in(chat_id, users, amount)
+    total_buy_in = storage.calculate_total_buy_in(chat_id, users)
     message = 'Закуп:\n'
     for user, total in total_buy_in.items():
         message += f'{user} {total}\n'
-    bank_size = core.game.calculate_bank_size(chat_id)
+    bank_size = storage.calculate_bank_size(chat_id)
     message += f'\nБанк {bank_size}'
-    await update.message.reply_text(message)
+    return message, True
 
 
 async def quit(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    chat_id = __get_chat_id(update)
-    if not core.game.has_active_games(chat_id):
-        await update.message.reply_text('Катка не идёт')
-        return
-    mentions = __get_mentioned_users(context.args, effective_user=update.effective_user.username)
-    user = mentions[0] if mentions else update.effective_user.username
-    if not core.buy_in.has_buy_in(chat_id, user):
-        await update.message.reply_text(f'{user} не заходил')
-        return
-    amount = __find_number(context.args)
+    message, changed = await core.aio.transaction(__quit, __get_chat_id(update), context.args,
+                                                  update.effective_user.username, immediate=True)
+    await __reply_or_refresh(update, context, message, changed)
+
+
+def __quit(chat_id: str, args: list[str], username: str) -> tuple[str, bool]:
+    if not storage.has_active_games(chat_id):
+        return 'Катка не идёт', False
+    mentions = __get_mentioned_users(args, effective_user=username)
+    user = mentions[0] if mentions else username
+    if not storage.has_buy_in(chat_id, user):
+        return f'{user} не заходил', False
+    amount = __find_number(args)
     if amount == NOT_FOUND:
-        await update.message.reply_text('Не указана сумма выхода')
-        return
-    core.cash_out.add_cash_out(chat_id, user, amount)
-    profit = core.game.calculate_profit(chat_id, user)
+        return 'Не указана сумма выхода', False
+    storage.add_cash_out(chat_id, user, amount)
+    profit = storage.calculate_profit(chat_id, user)
     message = f'Профит:\n{user} {profit}\n'
-    bank_size = core.game.calculate_bank_size(chat_id)
+    bank_size = storage.calculate_bank_size(chat_id)
     message += f'\nБанк {bank_size}'
-    await update.message.reply_text(message)
+    return message, True
 
 
-async def undo(update: Update, _: ContextTypes.DEFAULT_TYPE) -> None:
-    chat_id = __get_chat_id(update)
-    if not core.game.has_active_games(chat_id):
-        await update.message.reply_text('Катка не идёт')
-        return
-    if not core.game.has_actions(chat_id):
-        await update.message.reply_text('Никто не заходил')
-        return
-    result = core.game.undo_last_action(chat_id)
-    message = f"{'Закуп' if result['type'] == 'buy_in' else 'Выход'} отменён:\n"
-    message += f"{result['user']} {result['amount']}\n"
-    bank_size = core.game.calculate_bank_size(chat_id)
-    message += f'\nБанк {bank_size}'
-    await update.message.reply_text(message)
+async def undo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    message, changed = await core.aio.transaction(__undo, __get_chat_id(update), context.args, immediate=True)
+    await __reply_or_refresh(update, context, message, changed)
 
 
-async def status(update: Update, _: ContextTypes.DEFAULT_TYPE) -> None:
-    chat_id = __get_chat_id(update)
-    if not core.game.has_active_games(chat_id):
-        await update.message.reply_text('Катка не идёт')
+def __undo(chat_id: str, args: list[str]) -> tuple[str, bool]:
+    if not storage.has_active_games(chat_id):
+        return 'Катка не идёт', False
+    if not storage.has_actions(chat_id):
+        return 'Никто не заходил', False
+    count = __find_number(args)
+    results = storage.undo_last_actions(chat_id, 1 if count == NOT_FOUND else max(count, 1))
+    return __format_actions(chat_id, results, 'отменён', 'Отменено действий'), True
+
+
+async def redo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    message, changed = await core.aio.transaction(__redo, __get_chat_id(update), context.args, immediate=True)
+    await __reply_or_refresh(update, context, message, changed)
+
+
+def __redo(chat_id: str, args: list[str]) -> tuple[str, bool]:
+    if not storage.has_active_games(chat_id):
+        return 'Катка не идёт', False
+    if not storage.has_undone_actions(chat_id):
+        return 'Нечего возвращать', False
+    count = __find_number(args)
+    results = storage.redo_undone_actions(chat_id, 1 if count == NOT_FOUND else max(count, 1))
+    return __format_actions(chat_id, results, 'возвращён', 'Возвращено действий'), True
+
+
+async def __reply_or_refresh(update: Update, context: ContextTypes.DEFAULT_TYPE, message: str, changed: bool) -> None:
+    if changed and live_status:
+        live_status.schedule(update.effective_chat.id, context)
         return
-    total_buy_in = core.game.calculate_total_buy_in(chat_id)
-    total_cash_out = core.game.calculate_total_cash_out(chat_id)
-    bank_size = core.game.calculate_bank_size(chat_id)
-    message = __format_summary(total_buy_in, total_cash_out, bank_size)
     await update.message.reply_text(message)
 
 
-async def stop(update: Update, _: ContextTypes.DEFAULT_TYPE) -> None:
-    chat_id = __get_chat_id(update)
-    if not core.game.has_active_games(chat_id):
-        await update.message.reply_text('Катка не идёт')
-        return
-    active_players = core.game.calculate_active_players(chat_id)
+def __format_actions(chat_id: str, results: list[dict[str, str | int]], verb: str, title: str) -> str:
+    def action_name(result: dict[str, str | int]) -> str:
+        return 'Закуп' if result['type'] == 'buy_in' else 'Выход'
+
+    if len(results) == 1:
+        lines = [f'{action_name(results[0])} {verb}:\n', f"{results[0]['user']} {results[0]['amount']}\n"]
+    else:
+        lines = [f'{title}: {len(results)}\n',
+                 *(f"{action_name(result)} {result['user']} {result['amount']}\n" for result in results)]
+    bank_size = storage.calculate_bank_size(chat_id)
+    lines.append(f'\nБанк {bank_size}')
+    return render(lines)
+
+
+async def status(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    lines = await core.aio.transaction(__status, __get_chat_id(update))
+    await reply_pages(update, context, lines)
+
+
+def __status(chat_id: str) -> list[str]:
+    if not storage.has_active_games(chat_id):
+        return ['Катка не идёт']
+    total_buy_in = storage.calculate_total_buy_in(chat_id)
+    total_cash_out = storage.calculate_total_cash_out(chat_id)
+    bank_size = storage.calculate_bank_size(chat_id)
+    return format_summary(total_buy_in, total_cash_out, bank_size)
+
+
+async def __load_status(chat_id: int) -> list[str]:
+    return await core.aio.transaction(__status, str(chat_id))
+
+
+async def stop(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    lines = await core.aio.transaction(__stop, __get_chat_id(update), immediate=True)
+    if live_status and not await core.aio.run(storage.has_active_games, __get_chat_id(update)):
+        await live_status.finish(update.effective_chat.id, context)
+    await reply_pages(update, context, lines)
+
+
+def __stop(chat_id: str) -> list[str]:
+    if not storage.has_active_games(chat_id):
+        return ['Катка не идёт']
+    active_players = storage.calculate_active_players(chat_id)
     if active_players:
-        message = 'Не вышли игроки:\n'
-        for player in active_players:
-            message += f'{player}\n'
-        await update.message.reply_text(message)
-        return
-    bank_size = core.game.calculate_bank_size(chat_id)
+        return ['Не вышли игроки:\n', *(f'{player}\n' for player in active_players)]
+    bank_size = storage.calculate_bank_size(chat_id)
     if bank_size != 0:
-        message = 'Банк не сходится\n'
-        message += f'Вход больше выхода на {bank_size}\n' if bank_size > 0 else f'Вход меньше выхода на {-bank_size}\n'
-        total_buy_in = core.buy_in.calculate_total_buy_in(chat_id)
-        total_cash_out = core.cash_out.calculate_total_cash_out(chat_id)
-        message += __format_summary(total_buy_in, total_cash_out, bank_size)
-        await update.message.reply_text(message)
-        return
-    total_buy_in = core.buy_in.calculate_total_buy_in(chat_id)
+        lines = ['Банк не сходится\n']
+        if bank_size > 0:
+            lines.append(f'Вход больше выхода на {bank_size}\n')
+        else:
+            lines.append(f'Вход меньше выхода на {-bank_size}\n')
+        total_buy_in = storage.calculate_total_buy_in(chat_id)
+        total_cash_out = storage.calculate_total_cash_out(chat_id)
+        return lines + format_summary(total_buy_in, total_cash_out, bank_size)
+    total_buy_in = storage.calculate_total_buy_in(chat_id)
     if not total_buy_in:
-        core.game.finish_games(chat_id)
-        await update.message.reply_text('Катка закончилась, никто не заходил')
-        return
-    total_cash_out = core.cash_out.calculate_total_cash_out(chat_id)
-    message = 'Катка закончилась, банк сходится\n'
-    message += __format_summary(total_buy_in, total_cash_out)
-    profits = core.game.calculate_profit(chat_id)
-    message += __format_profit(profits)
-    message += '\nПереводы:\n'
-    money_transfers = core.game.calculate_money_transfers(chat_id)
-    for transfer in money_transfers:
-        message += f'{transfer["from"]} -> {transfer["to"]}: {transfer["amount"]}\n'
-    core.game.finish_games(chat_id)
-    await update.message.reply_text(message)
+        storage.finish_games(chat_id)
+        return ['Катка закончилась, никто не заходил']
+    total_cash_out = storage.calculate_total_cash_out(chat_id)
+    profits = storage.calculate_profit(chat_id)
+    money_transfers = storage.calculate_money_transfers(chat_id)
+    storage.finish_games(chat_id)
+    return ['Катка закончилась, банк сходится\n',
+            *format_summary(total_buy_in, total_cash_out),
+            *format_profit(profits),
+            *format_transfers(money_transfers)]
 
 
-async def statistics(update: Update, _: ContextTypes.DEFAULT_TYPE) -> None:
-    chat_id = __get_chat_id(update)
-    total_profit = core.game.calculate_total_profit_in_all_finished_games(chat_id)
+async def statistics(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    lines = await core.aio.transaction(__statistics, __get_chat_id(update))
+    await reply_pages(update, context, lines)
+
+
+def __statistics(chat_id: str) -> list[str]:
+    total_profit = storage.calculate_total_profit_in_all_finished_games(chat_id)
     if not total_profit:
-        await update.message.reply_text('Нет завершенных игр')
+        return ['Нет завершенных игр']
+    return format_profit(total_profit)
+
+
+async def report(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    try:
+        start_date, end_date = __parse_date_range(context.args)
+    except ValueError:
+        await update.message.reply_text('Неверная дата, формат ГГГГ-ММ или ГГГГ-ММ-ДД')
         return
-    message = __format_profit(total_profit)
-    await update.message.reply_text(message)
+    lines = await core.aio.transaction(__report, __get_chat_id(update), start_date, end_date)
+    await reply_pages(update, context, lines)
+
+
+def __report(chat_id: str, start_date: datetime.date | None, end_date: datetime.date | None) -> list[str]:
+    stats = storage.get_user_stats(chat_id, start_date, end_date)
+    if not stats:
+        return ['Нет завершенных игр']
+    trend = storage.get_monthly_trend(chat_id, start_date, end_date)
+    title = 'Статистика'
+    if start_date or end_date:
+        title += f" {start_date or '...'} — {end_date or '...'}"
+    return format_report(stats, trend, title)
+
+
+def __parse_date_range(args: list[str]) -> tuple[datetime.date | None, datetime.date | None]:
+    if not args:
+        return None, None
+    start_date, _ = __parse_date(args[0])
+    _, end_date = __parse_date(args[1] if len(args) > 1 else args[0])
+    if start_date > end_date:
+        raise ValueError('Range start is after its end')
+    return start_date, end_date
+
+
+def __parse_date(arg: str) -> tuple[datetime.date, datetime.date]:
+    if re.fullmatch(MONTH_REGEXP, arg):
+        start_date = datetime.datetime.strptime(arg, '%Y-%m').date()
+        next_month = (start_date + datetime.timedelta(days=31)).replace(day=1)
+        return start_date, next_month - datetime.timedelta(days=1)
+    date = datetime.date.fromisoformat(arg)
+    return date, date
 
 
 async def actions(update: Update, _: ContextTypes.DEFAULT_TYPE) -> None:
+    from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
     chat_id = __get_chat_id(update)
-    if not core.game.has_active_games(chat_id):
+    if not await core.aio.run(storage.has_active_games, chat_id):
         await update.message.reply_text('Катка не идёт')
         return
     keyboard = [
@@ -220,15 +325,151 @@ async def process_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         await quit(update, context)
 
 
+async def stats(update: Update, _: ContextTypes.DEFAULT_TYPE) -> None:
+    from bot.metrics import format_stats
+
+    if not __is_owner(update):
+        return
+    await update.message.reply_text(format_stats())
+
+
+async def profile(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if not __is_owner(update):
+        return
+    args = context.args or []
+    if args:
+        percent = __find_number(args[:1])
+        if percent == NOT_FOUND or percent > 100:
+            await update.message.reply_text('Укажи процент команд от 0 до 100 и, если нужно, id чатов')
+            return
+        profiler.rate = percent / 100
+        profiler.chats = set(args[1:])
+    chats = ', '.join(sorted(profiler.chats)) or 'все'
+    await update.message.reply_text(f'Профилирование: {profiler.rate * 100:g}% команд, чаты: {chats}, '
+                                    f'сохранено {profiler.saved} в {profiler.directory}')
+
+
+def __is_owner(update: Update) -> bool:
+    return bool(OWNER_ID) and str(update.effective_user.id) == OWNER_ID
+
+
+def build_application(worker: int = None) -> Application:
+    from telegram import Update
+    from telegram.ext import Application, CallbackQueryHandler, CommandHandler, filters, MessageHandler, TypeHandler
+
+    from bot.metrics import InstrumentedRequest, MetricsServer, instrument_handler
+    from bot.persistence import UpdateTracker, create_persistence, MARK_PROCESSED_GROUP
+    from bot.rendering import show_page, PAGE_CALLBACK_PATTERN
+    from bot.scheduler import ChatUpdateProcessor
+
+    global storage, live_status, update_tracker
+    if STORAGE == core.storage.MEMORY:
+        snapshot_path = SNAPSHOT_PATH if worker is None or not SNAPSHOT_PATH else f'{SNAPSHOT_PATH}.{worker}'
+        storage = core.storage.create_storage(STORAGE, snapshot_path, SNAPSHOT_INTERVAL if snapshot_path else None)
+    else:
+        storage = core.storage.create_storage(STORAGE, DB_PATH)
+    storage.start()
+    core.aio.init(DB_POOL_SIZE, storage)
+    update_tracker = UpdateTracker(storage)
+    metrics_port = int(METRICS_PORT) + (0 if worker is None else worker + 1) if METRICS_PORT else None
+    metrics_server = MetricsServer(METRICS_LISTEN, metrics_port) if metrics_port else None
+
+    async def shutdown(_: Application) -> None:
+        if metrics_server:
+            metrics_server.stop()
+        core.aio.shutdown()
+        storage.stop()
+
+    builder = (Application.builder()
+               .token(TOKEN)
+               .request(InstrumentedRequest())
+               .concurrent_updates(ChatUpdateProcessor(MAX_CONCURRENT_UPDATES))
+               .post_init(update_tracker.load_processed_updates)
+               .post_shutdown(shutdown))
+    if API_BASE_URL:
+        builder = builder.base_url(API_BASE_URL)
+    if STATE_PATH:
+        builder = builder.persistence(create_persistence(STATE_PATH if worker is None else f'{STATE_PATH}.{worker}',
+                                                         STATE_INTERVAL))
+    application = builder.build()
+    application.add_handler(TypeHandler(Update, update_tracker.skip_processed_updates), group=-1)
+    application.add_handler(TypeHandler(Update, update_tracker.record_handled_update), group=MARK_PROCESSED_GROUP)
+    application.add_error_handler(update_tracker.keep_failed_update)
+    commands = {
+        'start': start,
+        'buy': buy,
+        'quit': quit,
+        'undo': undo,
+        'redo': redo,
+        'status': status,
+        'stop': stop,
+        'statistics': statistics,
+        'report': report,
+        'actions': actions,
+        'stats': stats,
+        'profile': profile,
+    }
+    for command, callback in commands.items():
+        application.add_handler(CommandHandler(command, instrument_handler(command, callback, profiler)))
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND,
+                                           instrument_handler('message', process_message, profiler)))
+    application.add_handler(CallbackQueryHandler(instrument_handler('page', show_page, profiler),
+                                                 pattern=PAGE_CALLBACK_PATTERN))
+    if LIVE_STATUS:
+        from bot.live_status import LiveStatus
+
+        live_status = LiveStatus(__load_status, LIVE_STATUS_DELAY)
+    if metrics_server:
+        metrics_server.start()
+    return application
+
+
+def run_worker(channel: WorkerChannel) -> None:
+    from bot.cluster import serve_worker
+
+    application = build_application(channel.index)
+    __run_until_complete(serve_worker(application, channel, update_tracker))
+
+
 def start_bot() -> None:
-    application = Application.builder().token(TOKEN).build()
-    application.add_handler(CommandHandler('start', start))
-    application.add_handler(CommandHandler('buy', buy))
-    application.add_handler(CommandHandler('quit', quit))
-    application.add_handler(CommandHandler('undo', undo))
-    application.add_handler(CommandHandler('status', status))
-    application.add_handler(CommandHandler('stop', stop))
-    application.add_handler(CommandHandler('statistics', statistics))
-    application.add_handler(CommandHandler('actions', actions))
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, process_message))
-    application.run_polling()
+    if WORKERS > 1:
+        __start_cluster()
+        return
+
+    from bot.polling import run_polling
+    from bot.webhook import run_webhook
+
+    application = build_application()
+    if MODE == 'webhook':
+        __run_until_complete(run_webhook(application, update_tracker, WEBHOOK_URL, WEBHOOK_SECRET, WEBHOOK_LISTEN,
+                                         WEBHOOK_PORT))
+    else:
+        __run_until_complete(run_polling(application, update_tracker))
+
+
+def __run_until_complete(coroutine: Coroutine) -> None:
+    try:
+        loop = asyncio.get_event_loop()
+    except RuntimeError:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+    try:
+        loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def __start_cluster() -> None:
+    from telegram import Bot
+
+    from bot.cluster import Dispatcher, run_dispatcher
+
+    if STORAGE == core.storage.SQLITE:
+        core.database.bootstrap(DB_PATH)
+        core.database.close_database()
+    dispatcher = Dispatcher(WORKERS, run_worker)
+    bot = Bot(TOKEN, base_url=API_BASE_URL) if API_BASE_URL else Bot(TOKEN)
+    if MODE == 'webhook':
+        asyncio.run(run_dispatcher(dispatcher, bot, WEBHOOK_URL, WEBHOOK_SECRET, WEBHOOK_LISTEN, WEBHOOK_PORT))
+    else:
+        asyncio.run(run_dispatcher(dispatcher, bot))
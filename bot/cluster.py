@@ -0,0 +1,260 @@
+from __future__ import annotations
+
+import asyncio
+import collections
+import logging
+import multiprocessing
+import queue
+import signal
+import time
+import zlib
+from typing import Callable
+from urllib.parse import urlsplit
+
+from telegram import Bot, Update
+from telegram.ext import Application, Updater
+
+from bot.persistence import UpdateTracker
+from bot.scheduler import get_update_chat_id
+from bot.webhook import WebhookServer
+
+HEARTBEAT_INTERVAL = 1.0
+HEARTBEAT_TIMEOUT = 30.0
+STOP_TIMEOUT = 10.0
+MAX_REPLAYS = 1
+STOP = 'stop'
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerChannel:
+    def __init__(self, index: int, updates: multiprocessing.Queue, heartbeat, received, handled):
+        self.index = index
+        self.updates = updates
+        self.heartbeat = heartbeat
+        self.received = received
+        self.handled = handled
+        self.__in_flight: collections.deque[int] = collections.deque()
+        self.__completed: set[int] = set()
+
+    def beat(self) -> None:
+        self.heartbeat.value = time.time()
+
+    def receive(self, timeout: float = HEARTBEAT_INTERVAL) -> dict | str | None:
+        try:
+            data = self.updates.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        if data != STOP:
+            self.__in_flight.append(data['update_id'])
+            self.received.value = data['update_id']
+        return data
+
+    def complete(self, update_id: int) -> None:
+        self.__completed.add(update_id)
+        while self.__in_flight and self.__in_flight[0] in self.__completed:
+            self.__completed.discard(self.__in_flight[0])
+            self.handled.value = self.__in_flight.popleft()
+
+
+class WorkerProcess:
+    def __init__(self, channel: WorkerChannel):
+        self.channel = channel
+        self.process: multiprocessing.Process | None = None
+        self.pending: collections.deque[dict] = collections.deque()
+        self.replays: dict[int, int] = {}
+        self.started_at = 0.0
+        self.restarts = 0
+
+
+class Dispatcher:
+    def __init__(self, workers: int, target: Callable[..., None], args: tuple = (),
+                 heartbeat_timeout: float = HEARTBEAT_TIMEOUT):
+        assert workers > 0
+        self.target = target
+        self.args = args
+        self.heartbeat_timeout = heartbeat_timeout
+        self.__context = multiprocessing.get_context('spawn')
+        self.__workers = [WorkerProcess(WorkerChannel(index, self.__context.Queue(), self.__context.Value('d', 0.0),
+                                                      self.__context.Value('q', 0), self.__context.Value('q', 0)))
+                          for index in range(workers)]
+
+    @property
+    def workers(self) -> int:
+        return len(self.__workers)
+
+    def start(self) -> None:
+        for worker in self.__workers:
+            self.__spawn(worker)
+
+    def route(self, update: Update) -> int:
+        chat_id = get_update_chat_id(update)
+        if chat_id is None:
+            return 0
+        return zlib.crc32(str(chat_id).encode()) % len(self.__workers)
+
+    def dispatch(self, update: Update) -> int:
+        index = self.route(update)
+        worker = self.__workers[index]
+        data = update.to_dict()
+        self.__trim_pending(worker)
+        worker.pending.append(data)
+        worker.channel.updates.put(data)
+        return index
+
+    def check_health(self) -> list[int]:
+        restarted = []
+        now = time.time()
+        for worker in self.__workers:
+            if not worker.process.is_alive():
+                logger.warning('Worker %s exited with code %s, restarting', worker.channel.index,
+                               worker.process.exitcode)
+            elif now - max(worker.channel.heartbeat.value, worker.started_at) > self.heartbeat_timeout:
+                logger.warning('Worker %s stopped responding, restarting', worker.channel.index)
+                worker.process.kill()
+                worker.process.join()
+            else:
+                continue
+            worker.restarts += 1
+            self.__restart(worker)
+            restarted.append(worker.channel.index)
+        return restarted
+
+    def health(self) -> list[dict[str, int | float | bool | None]]:
+        now = time.time()
+        return [{
+            'worker': worker.channel.index,
+            'pid': worker.process.pid if worker.process else None,
+            'alive': bool(worker.process and worker.process.is_alive()),
+            'heartbeat_age': now - worker.channel.heartbeat.value if worker.channel.heartbeat.value else None,
+            'restarts': worker.restarts,
+            'pending': len(self.__trim_pending(worker)),
+        } for worker in self.__workers]
+
+    def stop(self, timeout: float = STOP_TIMEOUT) -> None:
+        for worker in self.__workers:
+            if worker.process and worker.process.is_alive():
+                worker.channel.updates.put(STOP)
+        deadline = time.monotonic() + timeout
+        for worker in self.__workers:
+            if worker.process is None:
+                continue
+            worker.process.join(max(deadline - time.monotonic(), 0))
+            if worker.process.is_alive():
+                logger.warning('Worker %s did not stop in time, killing it', worker.channel.index)
+                worker.process.kill()
+                worker.process.join()
+            worker.process = None
+
+    def __spawn(self, worker: WorkerProcess) -> None:
+        worker.started_at = time.time()
+        worker.channel.heartbeat.value = 0.0
+        worker.process = self.__context.Process(target=self.target, args=(worker.channel, *self.args),
+                                                name=f'poker-worker-{worker.channel.index}', daemon=True)
+        worker.process.start()
+
+    def __restart(self, worker: WorkerProcess) -> None:
+        channel = worker.channel
+        channel.updates.cancel_join_thread()
+        channel.updates.close()
+        worker.channel = WorkerChannel(channel.index, self.__context.Queue(), channel.heartbeat, channel.received,
+                                       channel.handled)
+        for data in self.__replay_pending(worker):
+            worker.channel.updates.put(data)
+        self.__spawn(worker)
+
+    def __replay_pending(self, worker: WorkerProcess) -> collections.deque[dict]:
+        pending = self.__trim_pending(worker)
+        received = worker.channel.received.value
+        for data in [data for data in pending if data['update_id'] <= received]:
+            replays = worker.replays[data['update_id']] = worker.replays.get(data['update_id'], 0) + 1
+            if replays > MAX_REPLAYS:
+                logger.warning('Dropping update %s, worker %s failed while handling it %s times', data['update_id'],
+                               worker.channel.index, replays)
+                pending.remove(data)
+                del worker.replays[data['update_id']]
+        return pending
+
+    @staticmethod
+    def __trim_pending(worker: WorkerProcess) -> collections.deque[dict]:
+        handled = worker.channel.handled.value
+        while worker.pending and worker.pending[0]['update_id'] <= handled:
+            worker.replays.pop(worker.pending.popleft()['update_id'], None)
+        return worker.pending
+
+
+async def serve_worker(application: Application, channel: WorkerChannel, tracker: UpdateTracker) -> None:
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    loop = asyncio.get_running_loop()
+    async with application:
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+        try:
+            while True:
+                channel.beat()
+                data = await loop.run_in_executor(None, channel.receive)
+                if data is None:
+                    continue
+                if data == STOP:
+                    break
+                update = Update.de_json(data, application.bot)
+                tracker.track(update.update_id).add_done_callback(
+                    lambda _, update_id=update.update_id: channel.complete(update_id))
+                await application.update_queue.put(update)
+        finally:
+            await application.stop()
+            if application.post_stop:
+                await application.post_stop(application)
+    if application.post_shutdown:
+        await application.post_shutdown(application)
+
+
+async def run_dispatcher(dispatcher: Dispatcher, bot: Bot, webhook_url: str = None, secret_token: str = None,
+                         listen: str = None, port: int = None) -> None:
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for stop_signal in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(stop_signal, stop_event.set)
+
+    update_queue = asyncio.Queue()
+    dispatcher.start()
+    tasks = [asyncio.create_task(__forward_updates(dispatcher, update_queue)),
+             asyncio.create_task(__monitor(dispatcher))]
+    try:
+        if webhook_url:
+            server = WebhookServer(update_queue, bot, secret_token, urlsplit(webhook_url).path or '/')
+            async with bot:
+                await bot.set_webhook(webhook_url, secret_token=secret_token, allowed_updates=Update.ALL_TYPES)
+                await server.start(listen, port)
+                try:
+                    await stop_event.wait()
+                finally:
+                    await server.stop()
+        else:
+            updater = Updater(bot, update_queue)
+            async with updater:
+                await updater.start_polling(allowed_updates=Update.ALL_TYPES)
+                try:
+                    await stop_event.wait()
+                finally:
+                    await updater.stop()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        while not update_queue.empty():
+            dispatcher.dispatch(update_queue.get_nowait())
+        dispatcher.stop()
+
+
+async def __forward_updates(dispatcher: Dispatcher, update_queue: asyncio.Queue) -> None:
+    while True:
+        update = await update_queue.get()
+        dispatcher.dispatch(update)
+
+
+async def __monitor(dispatcher: Dispatcher) -> None:
+    while True:
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+        dispatcher.check_health()
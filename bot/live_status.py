@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import TYPE_CHECKING, Awaitable, Callable
+
+from bot.rendering import paginate, render, message_length, MAX_MESSAGE_LENGTH
+
+if TYPE_CHECKING:
+    from telegram.ext import ContextTypes
+
+LIVE_STATUS_KEY = 'live_status'
+DEFAULT_DELAY = 2.0
+MORE_MARKER = '\n… полный статус: /status'
+
+logger = logging.getLogger(__name__)
+
+
+class LiveStatus:
+    def __init__(self, load_status: Callable[[int], Awaitable[list[str]]], delay: float = DEFAULT_DELAY):
+        self.load_status = load_status
+        self.delay = delay
+        self.__pending: dict[int, asyncio.Task] = {}
+        self.__dirty: set[int] = set()
+
+    @property
+    def pending_chats(self) -> int:
+        return len(self.__pending)
+
+    def schedule(self, chat_id: int, context: ContextTypes.DEFAULT_TYPE) -> None:
+        if chat_id in self.__pending:
+            self.__dirty.add(chat_id)
+            return
+        self.__pending[chat_id] = asyncio.create_task(self.__publish_later(chat_id, context))
+
+    async def publish(self, chat_id: int, context: ContextTypes.DEFAULT_TYPE) -> None:
+        from telegram.error import BadRequest
+
+        text = render_status(await self.load_status(chat_id))
+        state = context.chat_data.get(LIVE_STATUS_KEY)
+        if state and state['text'] == text:
+            return
+        if state:
+            try:
+                await context.bot.edit_message_text(text, chat_id=chat_id, message_id=state['message_id'])
+                state['text'] = text
+                return
+            except BadRequest:
+                logger.info('Live status message %s in chat %s is gone, sending a new one', state['message_id'],
+                            chat_id)
+        message = await context.bot.send_message(chat_id, text)
+        context.chat_data[LIVE_STATUS_KEY] = {'message_id': message.message_id, 'text': text}
+        try:
+            await context.bot.pin_chat_message(chat_id, message.message_id, disable_notification=True)
+        except BadRequest:
+            logger.info('Cannot pin live status message in chat %s', chat_id)
+
+    async def finish(self, chat_id: int, context: ContextTypes.DEFAULT_TYPE) -> None:
+        from telegram.error import BadRequest
+
+        task = self.__pending.pop(chat_id, None)
+        self.__dirty.discard(chat_id)
+        if task:
+            task.cancel()
+        state = context.chat_data.pop(LIVE_STATUS_KEY, None)
+        if state:
+            try:
+                await context.bot.unpin_chat_message(chat_id, message_id=state['message_id'])
+            except BadRequest:
+                logger.info('Cannot unpin live status message in chat %s', chat_id)
+
+    async def __publish_later(self, chat_id: int, context: ContextTypes.DEFAULT_TYPE) -> None:
+        try:
+            while True:
+                await asyncio.sleep(self.delay)
+                self.__dirty.discard(chat_id)
+                await self.publish(chat_id, context)
+                if chat_id not in self.__dirty:
+                    break
+        except Exception:
+            logger.exception('Failed to publish live status in chat %s', chat_id)
+        finally:
+            if self.__pending.get(chat_id) is asyncio.current_task():
+                del self.__pending[chat_id]
+
+
+def render_status(lines: list[str]) -> str:
+    if len(paginate(lines)) <= 1:
+        return render(lines)
+    return render(paginate(lines, MAX_MESSAGE_LENGTH - message_length(MORE_MARKER))[0]) + MORE_MARKER
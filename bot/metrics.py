@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import contextlib
+import functools
+import logging
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Awaitable, Callable
+
+from telegram import Update
+from telegram.ext import ContextTypes
+from telegram.request import HTTPXRequest
+
+from core.cache import active_games
+from core.profiling import Profiler, handed_off
+from core.metrics import registry, track_command, record_api_call, COMMAND_SECONDS, COMMAND_SQL_STATEMENTS, \
+    COMMAND_ROWS_FETCHED, COMMAND_API_SECONDS, COMMAND_ERRORS
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+logger = logging.getLogger(__name__)
+
+registry.callback_counter('poker_active_game_cache_hits_total', 'Active game cache hits',
+                          lambda: active_games.stats()['hits'])
+registry.callback_counter('poker_active_game_cache_misses_total', 'Active game cache misses',
+                          lambda: active_games.stats()['misses'])
+registry.gauge('poker_active_game_cache_size', 'Chats in the active game cache', lambda: active_games.stats()['size'])
+
+
+class InstrumentedRequest(HTTPXRequest):
+    async def do_request(self, url: str, method: str, *args, **kwargs) -> tuple[int, bytes]:
+        started = time.perf_counter()
+        try:
+            with handed_off():
+                return await super().do_request(url, method, *args, **kwargs)
+        finally:
+            record_api_call(url.rsplit('/', 1)[-1], time.perf_counter() - started)
+
+
+def instrument_handler(command: str, callback: Callable[[Update, ContextTypes.DEFAULT_TYPE], Awaitable[None]],
+                       profiler: Profiler = None):
+    @functools.wraps(callback)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        chat_id = str(update.effective_chat.id) if update.effective_chat else None
+        async with contextlib.AsyncExitStack() as stack:
+            if profiler is not None and profiler.sample(chat_id):
+                await stack.enter_async_context(profiler.profile(command, chat_id))
+            with track_command(command):
+                await callback(update, context)
+
+    return wrapper
+
+
+def format_stats() -> str:
+    latencies = COMMAND_SECONDS.snapshot()
+    if not latencies:
+        return 'Нет данных'
+    statements = COMMAND_SQL_STATEMENTS.snapshot()
+    rows = COMMAND_ROWS_FETCHED.snapshot()
+    api = COMMAND_API_SECONDS.snapshot()
+    errors = COMMAND_ERRORS.snapshot()
+    lines = []
+    for command, (_, total, count) in sorted(latencies.items()):
+        lines.append(f'/{command}: {count} раз, среднее {total / count * 1000:.1f} мс, '
+                     f'p95 ≤ {COMMAND_SECONDS.quantile(command, 0.95) * 1000:g} мс, '
+                     f'SQL {statements[command][1] / count:.1f}, строк {rows[command][1] / count:.1f}, '
+                     f'API {api[command][1] / count * 1000:.1f} мс, ошибок {errors.get(command, 0):g}')
+    cache = active_games.stats()
+    lines.append(f"\nКэш игр: {cache['hits']} попаданий, {cache['misses']} промахов, "
+                 f"{cache['size']}/{cache['max_size']} чатов")
+    return '\n'.join(lines)
+
+
+class MetricsServer:
+    def __init__(self, host: str, port: int):
+        self.__server = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+        self.__server.daemon_threads = True
+        self.port = self.__server.server_address[1]
+        self.__thread = threading.Thread(target=self.__server.serve_forever, name='poker-metrics', daemon=True)
+
+    def start(self) -> None:
+        self.__thread.start()
+        logger.info('Serving metrics on port %s', self.port)
+
+    def stop(self) -> None:
+        self.__server.shutdown()
+        self.__server.server_close()
+        self.__thread.join()
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path != '/metrics':
+            self.send_error(404)
+            return
+        body = registry.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', PROMETHEUS_CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
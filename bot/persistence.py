@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import asyncio
+import datetime
+import logging
+from typing import TYPE_CHECKING, Iterable
+
+from telegram import Update
+from telegram.ext import ApplicationHandlerStop, PersistenceInput, PicklePersistence
+
+import core.aio
+from bot.rendering import PAGES_KEY
+
+if TYPE_CHECKING:
+    from telegram.ext import Application, ContextTypes
+
+    from core.storage import Storage
+
+MAX_PROCESSED_AGE = datetime.timedelta(days=6)
+DEFAULT_UPDATE_INTERVAL = 5.0
+TRANSIENT_CHAT_KEYS = [PAGES_KEY]
+MARK_PROCESSED_GROUP = 1
+
+logger = logging.getLogger(__name__)
+
+
+class BotPersistence(PicklePersistence):
+    def __init__(self, path: str, update_interval: float = DEFAULT_UPDATE_INTERVAL,
+                 transient_chat_keys: Iterable[str] = TRANSIENT_CHAT_KEYS):
+        super().__init__(path, store_data=PersistenceInput(bot_data=False, chat_data=True, user_data=False,
+                                                           callback_data=False),
+                         update_interval=update_interval)
+        self.transient_chat_keys = frozenset(transient_chat_keys)
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        await super().update_chat_data(chat_id, {key: value for key, value in data.items()
+                                                 if key not in self.transient_chat_keys})
+
+
+def create_persistence(path: str, update_interval: float = DEFAULT_UPDATE_INTERVAL) -> BotPersistence:
+    return BotPersistence(path, update_interval)
+
+
+class UpdateTracker:
+    def __init__(self, storage: Storage):
+        self.storage = storage
+        self.__pending: dict[int, asyncio.Future] = {}
+        self.__last_seen = 0
+
+    def __contains__(self, update_id: int) -> bool:
+        return update_id in self.__pending
+
+    def track(self, update_id: int) -> asyncio.Future:
+        future = self.__pending.get(update_id)
+        if future is None:
+            future = self.__pending[update_id] = asyncio.get_running_loop().create_future()
+        return future
+
+    def finish(self, update_id: int, handled: bool) -> None:
+        future = self.__pending.pop(update_id, None)
+        if future is not None and not future.done():
+            future.set_result(handled)
+
+    async def skip_processed_updates(self, update: Update, _: ContextTypes.DEFAULT_TYPE) -> None:
+        core.aio.current_update.set(update.update_id)
+        seen, self.__last_seen = update.update_id <= self.__last_seen, max(self.__last_seen, update.update_id)
+        if seen and await core.aio.run(self.storage.is_update_processed, update.update_id):
+            logger.info('Skipping update %s, it was processed before', update.update_id)
+            self.finish(update.update_id, True)
+            raise ApplicationHandlerStop
+
+    async def record_handled_update(self, update: Update, _: ContextTypes.DEFAULT_TYPE) -> None:
+        self.finish(update.update_id, True)
+
+    async def keep_failed_update(self, update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
+        logger.error('Update %s failed', getattr(update, 'update_id', None), exc_info=context.error)
+        if isinstance(update, Update):
+            self.finish(update.update_id, False)
+            raise ApplicationHandlerStop
+
+    async def load_processed_updates(self, _: Application) -> None:
+        pruned = await core.aio.run(self.storage.prune_processed_updates,
+                                    datetime.datetime.now() - MAX_PROCESSED_AGE)
+        if pruned:
+            logger.info('Pruned %s processed updates', pruned)
+        self.__last_seen = await core.aio.run(self.storage.last_processed_update) or 0
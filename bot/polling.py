@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import signal
+
+from telegram import Bot, Update
+from telegram.error import TelegramError
+from telegram.ext import Application
+
+from bot.persistence import UpdateTracker
+
+POLL_TIMEOUT = 10
+RETRY_DELAY = 1.0
+CONFIRM_DELAY = 0.1
+
+logger = logging.getLogger(__name__)
+
+
+class UpdatePoller:
+    def __init__(self, bot: Bot, update_queue: asyncio.Queue, tracker: UpdateTracker, timeout: float = POLL_TIMEOUT):
+        self.bot = bot
+        self.update_queue = update_queue
+        self.tracker = tracker
+        self.timeout = timeout
+        self.__unconfirmed: dict[int, asyncio.Future] = {}
+        self.__next_update_id: int | None = None
+
+    @property
+    def offset(self) -> int | None:
+        pending = [update_id for update_id, future in self.__unconfirmed.items() if not future.done()]
+        return min(pending) if pending else self.__next_update_id
+
+    async def run(self) -> None:
+        while True:
+            try:
+                updates = await self.bot.get_updates(offset=self.offset, timeout=self.timeout,
+                                                     allowed_updates=Update.ALL_TYPES)
+            except TelegramError:
+                logger.exception('Cannot get updates')
+                await asyncio.sleep(RETRY_DELAY)
+                continue
+            await self.__enqueue(updates)
+
+    async def confirm(self) -> None:
+        offset = self.offset
+        if offset is None:
+            return
+        try:
+            await self.bot.get_updates(offset=offset, limit=1, timeout=0)
+        except TelegramError:
+            logger.exception('Cannot confirm updates before %s', offset)
+
+    async def __enqueue(self, updates: tuple[Update, ...]) -> None:
+        new_updates = [update for update in updates if update.update_id not in self.__unconfirmed]
+        for update in new_updates:
+            self.__unconfirmed[update.update_id] = self.tracker.track(update.update_id)
+            await self.update_queue.put(update)
+        if updates:
+            self.__next_update_id = max(self.__next_update_id or 0, updates[-1].update_id + 1)
+        pending = [future for future in self.__unconfirmed.values() if not future.done()]
+        if pending:
+            await asyncio.wait(pending, timeout=CONFIRM_DELAY)
+        offset = self.offset
+        for update_id in [update_id for update_id in self.__unconfirmed if update_id < offset]:
+            del self.__unconfirmed[update_id]
+
+
+async def run_polling(application: Application, tracker: UpdateTracker, timeout: float = POLL_TIMEOUT) -> None:
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for stop_signal in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(stop_signal, stop_event.set)
+
+    poller = UpdatePoller(application.bot, application.update_queue, tracker, timeout)
+    async with application:
+        if application.post_init:
+            await application.post_init(application)
+        await application.bot.delete_webhook()
+        await application.start()
+        polling = asyncio.create_task(poller.run())
+        try:
+            await stop_event.wait()
+        finally:
+            polling.cancel()
+            await asyncio.gather(polling, return_exceptions=True)
+            await application.stop()
+            await poller.confirm()
+            if application.post_stop:
+                await application.post_stop(application)
+    if application.post_shutdown:
+        await application.post_shutdown(application)
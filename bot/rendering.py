@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Iterator
+
+if TYPE_CHECKING:
+    from telegram import InlineKeyboardMarkup, Message, Update
+    from telegram.ext import ContextTypes
+
+MAX_MESSAGE_LENGTH = 4096
+MAX_STORED_REPLIES = 20
+PAGES_KEY = 'pages'
+PAGE_CALLBACK_PREFIX = 'page:'
+PAGE_CALLBACK_PATTERN = f'^{PAGE_CALLBACK_PREFIX}\\d+$'
+
+
+def message_length(text: str) -> int:
+    return len(text.encode('utf-16-le')) // 2
+
+
+def render(lines: list[str]) -> str:
+    return ''.join(lines)
+
+
+def paginate(lines: list[str], limit: int = MAX_MESSAGE_LENGTH) -> list[list[str]]:
+    pages = []
+    page = []
+    size = 0
+    for line in __split_long_lines(lines, limit):
+        length = message_length(line)
+        if page and size + length > limit:
+            pages.append(page)
+            page = []
+            size = 0
+        page.append(line)
+        size += length
+    if page:
+        pages.append(page)
+    return pages
+
+
+def __split_long_lines(lines: list[str], limit: int) -> Iterator[str]:
+    for line in lines:
+        while message_length(line) > limit:
+            end = limit
+            while message_length(line[:end]) > limit:
+                end -= 1
+            yield line[:end]
+            line = line[end:]
+        yield line
+
+
+def format_summary(total_buy_in: dict[str, int], total_cash_out: dict[str, int], bank_size: int = 0) -> list[str]:
+    if not total_buy_in:
+        return ['Никто не входил']
+    lines = []
+    if bank_size != 0:
+        lines.append(f'Банк {bank_size}\n')
+    lines.append('\nВход:\n')
+    total_buy_in_sorted = sorted(total_buy_in.items(), key=lambda item: item[1], reverse=True)
+    lines.extend(f'{user} {total}\n' for user, total in total_buy_in_sorted)
+    if total_cash_out:
+        lines.append('\nВыход:\n')
+        total_cash_out_sorted = sorted(total_cash_out.items(), key=lambda item: item[1], reverse=True)
+        lines.extend(f'{user} {total}\n' for user, total in total_cash_out_sorted)
+    return lines
+
+
+def format_profit(profits: dict[str, int]) -> list[str]:
+    profits_sorted = sorted(profits.items(), key=lambda item: item[1], reverse=True)
+    return ['\nПрофит:\n', *(f'{user} {profit}\n' for user, profit in profits_sorted)]
+
+
+def format_transfers(money_transfers: list[dict]) -> list[str]:
+    return ['\nПереводы:\n',
+            *(f'{transfer["from"]} -> {transfer["to"]}: {transfer["amount"]}\n' for transfer in money_transfers)]
+
+
+def format_report(stats: list[tuple[str, int, int, int, int, int]], trend: list[tuple[str, str, int, int]],
+                  title: str) -> list[str]:
+    lines = [f'{title}\n']
+    for user, games, buy_in, profit, biggest_win, biggest_loss in stats:
+        roi = profit / buy_in if buy_in else 0
+        lines.append(f'\n{user}: игр {games}, профит {profit}, ROI {roi:+.0%}\n')
+        lines.append(f'Средний закуп {round(buy_in / games)}, лучшая {biggest_win}, худшая {biggest_loss}\n')
+    if trend:
+        lines.append('\nПо месяцам:\n')
+        months: dict[str, list[str]] = {}
+        for month, user, games, profit in trend:
+            months.setdefault(month, []).append(f'{user} {profit}')
+        lines.extend(f"{month}: {', '.join(results)}\n" for month, results in months.items())
+    return lines
+
+
+async def reply_pages(update: Update, context: ContextTypes.DEFAULT_TYPE, lines: list[str]) -> Message:
+    pages = [render(page) for page in paginate(lines)]
+    if len(pages) == 1:
+        return await update.message.reply_text(pages[0])
+    message = await update.message.reply_text(pages[0], reply_markup=page_keyboard(0, len(pages)))
+    stored = context.chat_data.setdefault(PAGES_KEY, {})
+    stored[message.message_id] = pages
+    while len(stored) > MAX_STORED_REPLIES:
+        del stored[next(iter(stored))]
+    return message
+
+
+async def show_page(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    query = update.callback_query
+    pages = context.chat_data.get(PAGES_KEY, {}).get(query.message.message_id)
+    if pages is None:
+        await query.answer('Страница устарела')
+        return
+    index = min(int(query.data[len(PAGE_CALLBACK_PREFIX):]), len(pages) - 1)
+    await query.answer()
+    if query.message.text != pages[index].strip():
+        await query.edit_message_text(pages[index], reply_markup=page_keyboard(index, len(pages)))
+
+
+def page_keyboard(index: int, count: int) -> InlineKeyboardMarkup:
+    from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+    return InlineKeyboardMarkup([[
+        InlineKeyboardButton('«', callback_data=f'{PAGE_CALLBACK_PREFIX}{max(index - 1, 0)}'),
+        InlineKeyboardButton(f'{index + 1}/{count}', callback_data=f'{PAGE_CALLBACK_PREFIX}{index}'),
+        InlineKeyboardButton('»', callback_data=f'{PAGE_CALLBACK_PREFIX}{min(index + 1, count - 1)}'),
+    ]])
@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Awaitable, Any
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+class ChatUpdateProcessor(BaseUpdateProcessor):
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        self.__locks: dict[int, asyncio.Lock] = {}
+        self.__pending: dict[int, int] = {}
+
+    @property
+    def active_chats(self) -> int:
+        return len(self.__locks)
+
+    async def process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        chat_id = get_update_chat_id(update)
+        if chat_id is None:
+            await super().process_update(update, coroutine)
+            return
+        lock = self.__locks.setdefault(chat_id, asyncio.Lock())
+        self.__pending[chat_id] = self.__pending.get(chat_id, 0) + 1
+        try:
+            async with lock:
+                await super().process_update(update, coroutine)
+        finally:
+            self.__pending[chat_id] -= 1
+            if not self.__pending[chat_id]:
+                del self.__pending[chat_id]
+                del self.__locks[chat_id]
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        await coroutine
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+
+def get_update_chat_id(update: object) -> int | None:
+    if isinstance(update, Update) and update.effective_chat:
+        return update.effective_chat.id
+    return None
@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import asyncio
+import hmac
+import json
+import logging
+import signal
+from http import HTTPStatus
+from urllib.parse import urlsplit
+
+from telegram import Bot, Update
+from telegram.ext import Application
+
+from bot.persistence import UpdateTracker
+
+SECRET_TOKEN_HEADER = 'x-telegram-bot-api-secret-token'
+MAX_BODY_SIZE = 1024 * 1024
+READ_TIMEOUT = 30
+
+logger = logging.getLogger(__name__)
+
+
+class WebhookServer:
+    def __init__(self, update_queue: asyncio.Queue, bot: Bot | None, secret_token: str, url_path: str = '/',
+                 tracker: UpdateTracker = None):
+        assert secret_token, 'Webhook secret token is required'
+        self.update_queue = update_queue
+        self.bot = bot
+        self.secret_token = secret_token
+        self.url_path = url_path
+        self.tracker = tracker
+        self.port = None
+        self.__server: asyncio.Server | None = None
+        self.__connections: set[asyncio.Task] = set()
+        self.__in_flight = 0
+        self.__idle = asyncio.Event()
+        self.__idle.set()
+
+    async def start(self, host: str, port: int) -> None:
+        self.__server = await asyncio.start_server(self.__handle_connection, host, port)
+        self.port = self.__server.sockets[0].getsockname()[1]
+        logger.info('Webhook server listening on %s:%s%s', host, self.port, self.url_path)
+
+    async def stop(self) -> None:
+        if self.__server is None:
+            return
+        self.__server.close()
+        await self.__idle.wait()
+        for connection in self.__connections:
+            connection.cancel()
+        await asyncio.gather(*self.__connections, return_exceptions=True)
+        await self.__server.wait_closed()
+        self.__server = None
+
+    async def __handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        self.__connections.add(task)
+        try:
+            keep_alive = True
+            while keep_alive:
+                request = await asyncio.wait_for(self.__read_request(reader), READ_TIMEOUT)
+                if request is None:
+                    break
+                self.__in_flight += 1
+                self.__idle.clear()
+                try:
+                    method, path, headers, body = request
+                    status = await self.__process_request(method, path, headers, body)
+                    keep_alive = headers.get('connection', '').lower() != 'close' and self.__server.is_serving()
+                    writer.write(f'HTTP/1.1 {status.value} {status.phrase}\r\nContent-Length: 0\r\n'
+                                 f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n'.encode())
+                    await writer.drain()
+                finally:
+                    self.__in_flight -= 1
+                    if not self.__in_flight:
+                        self.__idle.set()
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            self.__connections.discard(task)
+            writer.close()
+
+    async def __read_request(self, reader: asyncio.StreamReader) -> tuple[str, str, dict[str, str], bytes] | None:
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        method, path, _ = request_line.decode('latin-1').split(' ', 2)
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode('latin-1').strip()
+            if not line:
+                break
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get('content-length', 0))
+        if length > MAX_BODY_SIZE:
+            raise ValueError('Request body is too large')
+        body = await reader.readexactly(length) if length else b''
+        return method, path, headers, body
+
+    async def __process_request(self, method: str, path: str, headers: dict[str, str], body: bytes) -> HTTPStatus:
+        if urlsplit(path).path != self.url_path:
+            return HTTPStatus.NOT_FOUND
+        if method != 'POST':
+            return HTTPStatus.METHOD_NOT_ALLOWED
+        if not hmac.compare_digest(headers.get(SECRET_TOKEN_HEADER, '').encode('latin-1'), self.secret_token.encode()):
+            return HTTPStatus.FORBIDDEN
+        try:
+            data = json.loads(body)
+            if not isinstance(data, dict):
+                raise ValueError('Update is not a JSON object')
+            update = Update.de_json(data, self.bot)
+        except (ValueError, TypeError, KeyError):
+            logger.warning('Received invalid update on webhook')
+            return HTTPStatus.BAD_REQUEST
+        if self.tracker is None:
+            await self.update_queue.put(update)
+            return HTTPStatus.OK
+        queued = update.update_id in self.tracker
+        handled = self.tracker.track(update.update_id)
+        if not queued:
+            await self.update_queue.put(update)
+        return HTTPStatus.OK if await asyncio.shield(handled) else HTTPStatus.INTERNAL_SERVER_ERROR
+
+
+async def run_webhook(application: Application, tracker: UpdateTracker, webhook_url: str, secret_token: str,
+                      listen: str, port: int) -> None:
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for stop_signal in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(stop_signal, stop_event.set)
+
+    server = WebhookServer(application.update_queue, application.bot, secret_token, urlsplit(webhook_url).path or '/',
+                           tracker)
+    async with application:
+        if application.post_init:
+            await application.post_init(application)
+        await application.bot.set_webhook(webhook_url, secret_token=secret_token, allowed_updates=Update.ALL_TYPES)
+        await server.start(listen, port)
+        await application.start()
+        try:
+            await stop_event.wait()
+        finally:
+            await server.stop()
+            await application.stop()
+            if application.post_stop:
+                await application.post_stop(application)
+    if application.post_shutdown:
+        await application.post_shutdown(application)
@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import datetime
+
+from peewee import fn, chunked, Select, Table, Value, JOIN
+
+from core.balance import refresh_balance, rebuild_balances
+from core.models import Action, BuyIn, CashOut, atomic
+from core.queries import select_unarchived_games
+
+BUY_IN = 'buy_in'
+CASH_OUT = 'cash_out'
+INSERT_BATCH_SIZE = 100
+LEDGER_MODELS = {BUY_IN: BuyIn, CASH_OUT: CashOut}
+BACKFILL_TABLE = 'backfill_seq'
+
+
+def append_actions(game: int, type: str, users: list[str], amount: int) -> list[Action]:
+    Action.delete().where((Action.game == game) & Action.is_undone).execute()
+    last_seq = Action.select(fn.MAX(Action.seq)).where(Action.game == game).scalar() or 0
+    timestamp = datetime.datetime.now()
+    actions = [Action(game=game, seq=seq, type=type, user=user, amount=amount, timestamp=timestamp)
+               for seq, user in enumerate(users, start=last_seq + 1)]
+    Action.bulk_create(actions)
+    return actions
+
+
+def to_ledger_rows(actions: list[Action]) -> list[BuyIn | CashOut]:
+    return [LEDGER_MODELS[action.type](game=action.game_id, user=action.user, amount=action.amount,
+                                       timestamp=action.timestamp, seq=action.seq)
+            for action in actions]
+
+
+def insert_ledger_rows(actions: list[Action]) -> None:
+    rows = to_ledger_rows(actions)
+    for model in LEDGER_MODELS.values():
+        model_rows = [row for row in rows if isinstance(row, model)]
+        if model_rows:
+            model.bulk_create(model_rows)
+
+
+def undo_actions(game: int, count: int = 1) -> list[Action]:
+    assert count > 0
+    with atomic():
+        actions = list(Action.select()
+                       .where((Action.game == game) & ~Action.is_undone)
+                       .order_by(Action.seq.desc())
+                       .limit(count))
+        if not actions:
+            return actions
+        seqs = [action.seq for action in actions]
+        for model in LEDGER_MODELS.values():
+            model.delete().where((model.game == game) & model.seq.in_(seqs)).execute()
+        Action.update(is_undone=True).where((Action.game == game) & Action.seq.in_(seqs)).execute()
+        __refresh_balances(game, actions)
+    return actions
+
+
+def redo_actions(game: int, count: int = 1) -> list[Action]:
+    assert count > 0
+    with atomic():
+        actions = list(Action.select()
+                       .where((Action.game == game) & Action.is_undone)
+                       .order_by(Action.seq)
+                       .limit(count))
+        if not actions:
+            return actions
+        insert_ledger_rows(actions)
+        Action.update(is_undone=False).where((Action.game == game) & Action.seq.in_([a.seq for a in actions])).execute()
+        __refresh_balances(game, actions)
+    return actions
+
+
+def can_redo(game: int) -> bool:
+    return Action.select().where((Action.game == game) & Action.is_undone).exists()
+
+
+def backfill_actions() -> int:
+    database = Action._meta.database
+    backfill = Table(BACKFILL_TABLE,
+                     ('type', 'row_id', 'game_id', 'seq', 'user', 'amount', 'timestamp')).bind(database)
+    ledger = None
+    for type, model in LEDGER_MODELS.items():
+        query = (model.select(Value(type).alias('type'), model.id.alias('row_id'), model.game.alias('game_id'),
+                              model.user, model.amount, model.timestamp)
+                 .where(model.seq.is_null()))
+        ledger = query if ledger is None else ledger.union_all(query)
+    ledger = ledger.alias('ledger')
+    last_seqs = (Action.select(Action.game.alias('game_id'), fn.MAX(Action.seq).alias('seq'))
+                 .group_by(Action.game)
+                 .alias('last_seqs'))
+    seq = fn.COALESCE(last_seqs.c.seq, 0) + fn.ROW_NUMBER().over(
+        partition_by=[ledger.c.game_id], order_by=[ledger.c.timestamp, ledger.c.type, ledger.c.row_id])
+    with atomic():
+        database.execute_sql(f'CREATE TEMP TABLE {BACKFILL_TABLE} '
+                             '(type TEXT NOT NULL, row_id INTEGER NOT NULL, game_id INTEGER NOT NULL, '
+                             'seq INTEGER NOT NULL, user TEXT NOT NULL, amount INTEGER NOT NULL, timestamp DATETIME, '
+                             'PRIMARY KEY (type, row_id)) WITHOUT ROWID')
+        try:
+            count = (backfill
+                     .insert(Select([ledger], [ledger.c.type, ledger.c.row_id, ledger.c.game_id, seq, ledger.c.user,
+                                               ledger.c.amount, ledger.c.timestamp])
+                             .join(last_seqs, JOIN.LEFT_OUTER, on=(last_seqs.c.game_id == ledger.c.game_id)),
+                             columns=[backfill.type, backfill.row_id, backfill.game_id, backfill.seq, backfill.user,
+                                      backfill.amount, backfill.timestamp])
+                     .as_rowcount()
+                     .execute())
+            Action.insert_from(backfill.select(backfill.game_id, backfill.seq, backfill.type, backfill.user,
+                                               backfill.amount, backfill.timestamp, Value(False)),
+                               [Action.game, Action.seq, Action.type, Action.user, Action.amount, Action.timestamp,
+                                Action.is_undone]).execute()
+            for type, model in LEDGER_MODELS.items():
+                model.update(seq=backfill.select(backfill.seq).where((backfill.type == type)
+                                                                     & (backfill.row_id == model.id))) \
+                    .where(model.seq.is_null()) \
+                    .execute()
+        finally:
+            database.execute_sql(f'DROP TABLE temp.{BACKFILL_TABLE}')
+    return count
+
+
+def rebuild_ledger(games: int | Select = None) -> int:
+    games = select_unarchived_games(games)
+    with atomic():
+        query = (Action.select()
+                 .where(~Action.is_undone & Action.game.in_(games))
+                 .order_by(Action.game, Action.seq))
+        for model in LEDGER_MODELS.values():
+            model.delete().where(model.game.in_(games)).execute()
+        actions = list(query)
+        for batch in chunked(actions, INSERT_BATCH_SIZE):
+            insert_ledger_rows(batch)
+        rebuild_balances(games)
+    return len(actions)
+
+
+def __refresh_balances(game: int, actions: list[Action]) -> None:
+    for user in dict.fromkeys(action.user for action in actions):
+        refresh_balance(game, user)
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, TypeVar
+
+from peewee import Database
+
+from core.cache import active_games
+from core.models import Game
+from core.profiling import run_profiled, handed_off
+from core.storage import Storage
+from core.updates import record_update
+
+DEFAULT_POOL_SIZE = 4
+
+T = TypeVar('T')
+
+current_update: contextvars.ContextVar[int | None] = contextvars.ContextVar('current_update', default=None)
+
+
+class DatabaseExecutor:
+    def __init__(self, pool_size: int = DEFAULT_POOL_SIZE, database: Database | Storage = None):
+        assert pool_size > 0
+        self.pool_size = pool_size
+        self.database = database or Game._meta.database
+        self.__record_update = self.database.record_update if isinstance(self.database, Storage) else record_update
+        self.__workers = 0
+        self.__lock = threading.Lock()
+        self.__executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix='poker-db',
+                                             initializer=self.__connect)
+
+    async def run(self, func: Callable[..., T], *args, **kwargs) -> T:
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        with handed_off():
+            return await loop.run_in_executor(self.__executor,
+                                              functools.partial(context.run, run_profiled, func, *args, **kwargs))
+
+    async def transaction(self, func: Callable[..., T], *args, immediate: bool = False, **kwargs) -> T:
+        return await self.run(self.__run_in_transaction, functools.partial(func, *args, **kwargs), immediate)
+
+    def shutdown(self) -> None:
+        with self.__lock:
+            workers, self.__workers = self.__workers, 0
+        if workers:
+            barrier = threading.Barrier(workers)
+            for _ in range(workers):
+                self.__executor.submit(self.__close, barrier)
+        self.__executor.shutdown(wait=True)
+
+    def __connect(self) -> None:
+        self.database.connect(reuse_if_open=True)
+        with self.__lock:
+            self.__workers += 1
+
+    def __run_in_transaction(self, func: Callable[[], T], immediate: bool) -> T:
+        try:
+            with self.database.atomic('IMMEDIATE' if immediate else None):
+                result = func()
+                update_id = current_update.get()
+                if immediate and update_id is not None:
+                    self.__record_update(update_id)
+                return result
+        except Exception:
+            active_games.rollback()
+            raise
+
+    def __close(self, barrier: threading.Barrier) -> None:
+        barrier.wait()
+        self.database.close()
+
+
+__default_executor: DatabaseExecutor | None = None
+
+
+def init(pool_size: int = DEFAULT_POOL_SIZE, database: Database | Storage = None) -> DatabaseExecutor:
+    global __default_executor
+    assert __default_executor is None, 'Database executor is already running'
+    __default_executor = DatabaseExecutor(pool_size, database)
+    return __default_executor
+
+
+async def run(func: Callable[..., T], *args, **kwargs) -> T:
+    assert __default_executor is not None, 'Database executor is not running'
+    return await __default_executor.run(func, *args, **kwargs)
+
+
+async def transaction(func: Callable[..., T], *args, immediate: bool = False, **kwargs) -> T:
+    assert __default_executor is not None, 'Database executor is not running'
+    return await __default_executor.transaction(func, *args, immediate=immediate, **kwargs)
+
+
+def shutdown() -> None:
+    global __default_executor
+    if __default_executor is not None:
+        __default_executor.shutdown()
+        __default_executor = None
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import datetime
+
+from peewee import fn, chunked, Select, EXCLUDED
+
+from core.models import Action, Balance, Game, GameResult, MonthlyResult, atomic
+
+INSERT_BATCH_SIZE = 100
+MONTH_FORMAT = '%Y-%m'
+GAME_RESULT_FIELDS = [GameResult.game, GameResult.chat_id, GameResult.user, GameResult.buy_in, GameResult.cash_out,
+                      GameResult.profit, GameResult.finished_at]
+
+
+def record_game_results(games: Select, finished_at: datetime.datetime) -> None:
+    rows = list(Balance.select(Balance.game, Game.chat_id, Balance.user, Balance.buy_in, Balance.cash_out,
+                               Balance.cash_out - Balance.buy_in)
+                .join(Game)
+                .where(Balance.game.in_(games))
+                .tuples())
+    __insert_results([(*row, finished_at) for row in rows])
+
+
+def rebuild_analytics(chat_id: str = None) -> int:
+    games = Game.select(Game.id).where(Game.is_finished)
+    if chat_id is not None:
+        games = games.where(Game.chat_id == chat_id)
+    rows = list(Balance.select(Balance.game, Game.chat_id, Balance.user, Balance.buy_in, Balance.cash_out,
+                               Balance.cash_out - Balance.buy_in, Game.finished_at)
+                .join(Game)
+                .where(Balance.game.in_(games) & Game.finished_at.is_null(False))
+                .order_by(Game.finished_at, Balance.game, Balance.id)
+                .tuples())
+    with atomic():
+        for model in [GameResult, MonthlyResult]:
+            delete = model.delete()
+            if chat_id is not None:
+                delete = delete.where(model.chat_id == chat_id)
+            delete.execute()
+        __insert_results(rows)
+    return len(rows)
+
+
+def backfill_finished_at() -> int:
+    last_action = Action.select(fn.MAX(Action.timestamp)).where(Action.game == Game.id)
+    return (Game.update(finished_at=last_action)
+            .where(Game.is_finished & Game.finished_at.is_null())
+            .execute())
+
+
+def get_user_stats(chat_id: str, start: datetime.date = None, end: datetime.date = None) \
+        -> list[tuple[str, int, int, int, int, int]]:
+    if start is None and end is None:
+        query = (MonthlyResult.select(MonthlyResult.user, fn.SUM(MonthlyResult.games), fn.SUM(MonthlyResult.buy_in),
+                                      fn.SUM(MonthlyResult.profit), fn.MAX(MonthlyResult.biggest_win),
+                                      fn.MIN(MonthlyResult.biggest_loss))
+                 .where(MonthlyResult.chat_id == chat_id)
+                 .group_by(MonthlyResult.user))
+    else:
+        query = (GameResult.select(GameResult.user, fn.COUNT(GameResult.id), fn.SUM(GameResult.buy_in),
+                                   fn.SUM(GameResult.profit), fn.MAX(GameResult.profit), fn.MIN(GameResult.profit))
+                 .where(__in_range(GameResult.chat_id == chat_id, start, end))
+                 .group_by(GameResult.user))
+    return sorted(query.tuples(), key=lambda row: row[3], reverse=True)
+
+
+def get_monthly_trend(chat_id: str, start: datetime.date = None, end: datetime.date = None) \
+        -> list[tuple[str, str, int, int]]:
+    query = (MonthlyResult.select(MonthlyResult.month, MonthlyResult.user, MonthlyResult.games, MonthlyResult.profit)
+             .where(MonthlyResult.chat_id == chat_id))
+    if start is not None:
+        query = query.where(MonthlyResult.month >= start.strftime(MONTH_FORMAT))
+    if end is not None:
+        query = query.where(MonthlyResult.month <= end.strftime(MONTH_FORMAT))
+    return list(query.order_by(MonthlyResult.month, MonthlyResult.profit.desc()).tuples())
+
+
+def __in_range(condition, start: datetime.date | None, end: datetime.date | None):
+    if start is not None:
+        condition &= GameResult.finished_at >= datetime.datetime.combine(start, datetime.time())
+    if end is not None:
+        condition &= GameResult.finished_at < datetime.datetime.combine(end + datetime.timedelta(days=1),
+                                                                        datetime.time())
+    return condition
+
+
+def __insert_results(rows: list[tuple]) -> None:
+    for batch in chunked(rows, INSERT_BATCH_SIZE):
+        GameResult.insert_many(batch, fields=GAME_RESULT_FIELDS).execute()
+    months = [{'chat_id': chat_id, 'month': finished_at.strftime(MONTH_FORMAT), 'user': user, 'games': 1,
+               'buy_in': buy_in, 'profit': profit, 'biggest_win': profit, 'biggest_loss': profit}
+              for _, chat_id, user, buy_in, _, profit, finished_at in rows]
+    for batch in chunked(months, INSERT_BATCH_SIZE):
+        (MonthlyResult.insert_many(batch)
+         .on_conflict(conflict_target=[MonthlyResult.chat_id, MonthlyResult.month, MonthlyResult.user],
+                      update={MonthlyResult.games: MonthlyResult.games + EXCLUDED.games,
+                              MonthlyResult.buy_in: MonthlyResult.buy_in + EXCLUDED.buy_in,
+                              MonthlyResult.profit: MonthlyResult.profit + EXCLUDED.profit,
+                              MonthlyResult.biggest_win: fn.MAX(MonthlyResult.biggest_win, EXCLUDED.biggest_win),
+                              MonthlyResult.biggest_loss: fn.MIN(MonthlyResult.biggest_loss,
+                                                                 EXCLUDED.biggest_loss)})
+         .execute())
@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import contextlib
+import datetime
+import os
+from typing import Iterator
+
+from peewee import SqliteDatabase, Model, Field, Table, chunked
+
+from core.models import Game, Action, BuyIn, CashOut, atomic
+
+ARCHIVE_SCHEMA = 'archive'
+ARCHIVE_BATCH_SIZE = 500
+ARCHIVE_SUFFIX = '-archive'
+RAW_MODELS = [Action, BuyIn, CashOut]
+FULL = 'full'
+INCREMENTAL = 'incremental'
+NONE = 'none'
+VACUUM_MODES = [FULL, INCREMENTAL, NONE]
+INCREMENTAL_AUTO_VACUUM = 2
+
+
+def default_archive_path(path: str) -> str:
+    root, extension = os.path.splitext(path)
+    return f'{root}{ARCHIVE_SUFFIX}{extension or ".db"}'
+
+
+def archive_games(archive_path: str, before: datetime.datetime, batch_size: int = ARCHIVE_BATCH_SIZE) \
+        -> dict[str, int]:
+    __create_archive(archive_path)
+    game_ids = [game_id for game_id, in (Game.select(Game.id)
+                                         .where(Game.is_finished & ~Game.is_archived & (Game.finished_at < before))
+                                         .order_by(Game.id)
+                                         .tuples())]
+    stats = {'games': len(game_ids), **{model._meta.table_name: 0 for model in RAW_MODELS}}
+    if not game_ids:
+        return stats
+    with attach_archive(archive_path):
+        for batch in chunked(game_ids, batch_size):
+            with atomic():
+                __copy(Game, Game.id, batch)
+                for model in RAW_MODELS:
+                    __copy(model, model.game, batch)
+                    stats[model._meta.table_name] += model.delete().where(model.game.in_(batch)).execute()
+                Game.update(is_archived=True).where(Game.id.in_(batch)).execute()
+    return stats
+
+
+@contextlib.contextmanager
+def attach_archive(archive_path: str) -> Iterator[None]:
+    database = Game._meta.database
+    database.execute_sql(f'ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}', (archive_path,))
+    try:
+        yield
+    finally:
+        database.execute_sql(f'DETACH DATABASE {ARCHIVE_SCHEMA}')
+
+
+def archive_table(model: type[Model]) -> Table:
+    return Table(model._meta.table_name, schema=ARCHIVE_SCHEMA).bind(model._meta.database)
+
+
+def vacuum(mode: str = FULL) -> int:
+    database = Game._meta.database
+    size = __database_size(database)
+    if mode == INCREMENTAL and database.pragma('auto_vacuum') == INCREMENTAL_AUTO_VACUUM:
+        database.connection().executescript('PRAGMA incremental_vacuum;')
+    elif mode == INCREMENTAL:
+        database.pragma('auto_vacuum', INCREMENTAL_AUTO_VACUUM)
+        database.execute_sql('VACUUM')
+    elif mode == FULL:
+        database.execute_sql('VACUUM')
+    return size - __database_size(database)
+
+
+def __create_archive(path: str) -> None:
+    archive = SqliteDatabase(path)
+    with archive.connection_context():
+        for model in [Game, *RAW_MODELS]:
+            archive.execute(model._schema._create_table(safe=True))
+            for index in model._schema._create_indexes(safe=True):
+                archive.execute(index)
+
+
+def __copy(model: type[Model], field: Field, game_ids: list[int]) -> None:
+    fields = model._meta.sorted_fields
+    target = archive_table(model)
+    (target.insert(model.select(*fields).where(field.in_(game_ids)),
+                   columns=[getattr(target.c, column.column_name) for column in fields])
+     .on_conflict_ignore()
+     .execute())
+
+
+def __database_size(database: SqliteDatabase) -> int:
+    return database.pragma('page_count') * database.pragma('page_size')
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import datetime
+
+from peewee import fn, chunked, Select, EXCLUDED
+
+from core.models import Balance, BuyIn, CashOut, atomic
+from core.queries import sum_balances, select_unarchived_games
+
+INSERT_BATCH_SIZE = 100
+BALANCE_FIELDS = [Balance.game, Balance.user, Balance.buy_in, Balance.cash_out, Balance.last_buy_in,
+                  Balance.last_cash_out]
+
+
+def apply_buy_ins(buy_ins: list[BuyIn]) -> None:
+    rows = [{'game': buy_in.game_id, 'user': buy_in.user, 'buy_in': buy_in.amount, 'last_buy_in': buy_in.timestamp}
+            for buy_in in buy_ins]
+    (Balance.insert_many(rows)
+     .on_conflict(conflict_target=[Balance.game, Balance.user],
+                  update={Balance.buy_in: Balance.buy_in + EXCLUDED.buy_in,
+                          Balance.last_buy_in: EXCLUDED.last_buy_in})
+     .execute())
+
+
+def apply_cash_out(cash_out: CashOut) -> None:
+    (Balance.insert(game=cash_out.game_id, user=cash_out.user, cash_out=cash_out.amount,
+                    last_cash_out=cash_out.timestamp)
+     .on_conflict(conflict_target=[Balance.game, Balance.user],
+                  update={Balance.cash_out: Balance.cash_out + EXCLUDED.cash_out,
+                          Balance.last_cash_out: EXCLUDED.last_cash_out})
+     .execute())
+
+
+def refresh_balance(game: int, user: str) -> None:
+    rows = sum_balances(game, user)
+    if not rows:
+        Balance.delete().where((Balance.game == game) & (Balance.user == user)).execute()
+        return
+    (Balance.insert_many(rows, fields=BALANCE_FIELDS)
+     .on_conflict(conflict_target=[Balance.game, Balance.user], preserve=BALANCE_FIELDS[2:])
+     .execute())
+
+
+def get_balances(game: int, users: list[str] = ()) \
+        -> list[tuple[str, int, int, datetime.datetime | None, datetime.datetime | None]]:
+    query = (Balance.select(Balance.user, Balance.buy_in, Balance.cash_out, Balance.last_buy_in,
+                            Balance.last_cash_out)
+             .where(Balance.game == game))
+    if users:
+        query = query.where(Balance.user.in_(list(users)))
+    return list(query.order_by(Balance.id).tuples())
+
+
+def get_bank(game: int) -> int:
+    return (Balance.select(fn.COALESCE(fn.SUM(Balance.buy_in - Balance.cash_out), 0))
+            .where(Balance.game == game)
+            .scalar())
+
+
+def check_balances(games: int | Select = None) -> list[tuple[int, str, tuple | None, tuple | None]]:
+    games = select_unarchived_games(games)
+    expected = {(game_id, user): tuple(row) for game_id, user, *row in sum_balances(games)}
+    query = (Balance.select(Balance.game, Balance.user, Balance.buy_in, Balance.cash_out, Balance.last_buy_in,
+                            Balance.last_cash_out)
+             .where(Balance.game.in_(games)))
+    actual = {(game_id, user): tuple(row) for game_id, user, *row in query.tuples()}
+    return [(game_id, user, expected.get((game_id, user)), actual.get((game_id, user)))
+            for game_id, user in sorted(expected.keys() | actual.keys())
+            if expected.get((game_id, user)) != actual.get((game_id, user))]
+
+
+def rebuild_balances(games: int | Select = None) -> list[tuple[int, str, tuple | None, tuple | None]]:
+    games = select_unarchived_games(games)
+    with atomic():
+        drift = check_balances(games)
+        Balance.delete().where(Balance.game.in_(games)).execute()
+        insert_balances(sum_balances(games))
+    return drift
+
+
+def insert_balances(rows: list[tuple]) -> None:
+    for batch in chunked(rows, INSERT_BATCH_SIZE):
+        Balance.insert_many(batch, fields=BALANCE_FIELDS).execute()
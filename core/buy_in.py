@@ -1,27 +1,27 @@
-from core.models import Game, BuyIn
+from core.action_log import append_actions, to_ledger_rows, BUY_IN
+from core.balance import apply_buy_ins, get_balances
+from core.cache import get_active_game
+from core.metrics import instrumented
+from core.models import BuyIn, atomic
 
 
+@instrumented
 def add_buy_in(chat_id: str, users: list[str], amount: int) -> None:
     assert users and amount > 0
-    game = Game.get(chat_id=chat_id, is_finished=False)
-    buy_ins = [BuyIn(game=game, user=user, amount=amount) for user in users]
-    BuyIn.bulk_create(buy_ins)
+    game = get_active_game(chat_id)
+    with atomic():
+        buy_ins = to_ledger_rows(append_actions(game, BUY_IN, users, amount))
+        BuyIn.bulk_create(buy_ins)
+        apply_buy_ins(buy_ins)
 
 
+@instrumented
 def has_buy_in(chat_id: str, user: str) -> bool:
-    game = Game.get(chat_id=chat_id, is_finished=False)
+    game = get_active_game(chat_id)
     return BuyIn.select().where((BuyIn.game == game) & (BuyIn.user == user)).exists()
 
 
+@instrumented
 def calculate_total_buy_in(chat_id: str, users: list[str] = ()) -> dict[str, int]:
-    game = Game.get(chat_id=chat_id, is_finished=False)
-    users_set = set(users)
-    total = {}
-    for buy_in in game.buy_ins:
-        user = buy_in.user
-        if users_set and user not in users_set:
-            continue
-        if user not in total:
-            total[user] = 0
-        total[user] += buy_in.amount
-    return total
+    game = get_active_game(chat_id)
+    return {user: total for user, total, _, last_buy_in, _ in get_balances(game, users) if last_buy_in}
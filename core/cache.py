@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import functools
+import threading
+from collections import OrderedDict
+
+from core.models import Game
+
+ACTIVE_GAME_CACHE_SIZE = 1024
+
+
+class ActiveGameCache:
+    def __init__(self, max_size: int = ACTIVE_GAME_CACHE_SIZE):
+        assert max_size > 0
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.__games: OrderedDict[str, int | None] = OrderedDict()
+        self.__version = 0
+        self.__lock = threading.Lock()
+        self.__transaction = threading.local()
+
+    def lookup(self, chat_id: str) -> int | None:
+        with self.__lock:
+            if chat_id in self.__games:
+                self.__games.move_to_end(chat_id)
+                self.hits += 1
+                return self.__games[chat_id]
+            self.misses += 1
+            version = self.__version
+        game_id = Game.select(Game.id).where((Game.chat_id == chat_id) & ~Game.is_finished).scalar()
+        if game_id is None and Game._meta.database.in_transaction():
+            return None
+        with self.__lock:
+            if self.__version == version:
+                self.__games[chat_id] = game_id
+                self.__games.move_to_end(chat_id)
+                self.__evict()
+        return game_id
+
+    def get(self, chat_id: str) -> int:
+        game_id = self.lookup(chat_id)
+        if game_id is None:
+            raise Game.DoesNotExist(f'No active game in chat {chat_id}')
+        return game_id
+
+    def invalidate(self, chat_id: str) -> None:
+        self.__drop(chat_id)
+        database = Game._meta.database
+        if database.in_transaction():
+            self.__uncommitted().add(chat_id)
+            database.after_commit(functools.partial(self.__commit, chat_id))
+
+    def rollback(self) -> None:
+        uncommitted = self.__uncommitted()
+        while uncommitted:
+            self.__drop(uncommitted.pop())
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__games.clear()
+            self.__version += 1
+
+    def stats(self) -> dict[str, int]:
+        with self.__lock:
+            return {'size': len(self.__games), 'max_size': self.max_size, 'hits': self.hits,
+                    'misses': self.misses, 'evictions': self.evictions}
+
+    def __drop(self, chat_id: str) -> None:
+        with self.__lock:
+            self.__games.pop(chat_id, None)
+            self.__version += 1
+
+    def __commit(self, chat_id: str) -> None:
+        self.__uncommitted().discard(chat_id)
+        self.__drop(chat_id)
+
+    def __uncommitted(self) -> set[str]:
+        if not hasattr(self.__transaction, 'chats'):
+            self.__transaction.chats = set()
+        return self.__transaction.chats
+
+    def __evict(self) -> None:
+        while len(self.__games) > self.max_size:
+            self.__games.popitem(last=False)
+            self.evictions += 1
+
+
+active_games = ActiveGameCache()
+
+
+def get_active_game(chat_id: str) -> int:
+    return active_games.get(chat_id)
@@ -1,26 +1,25 @@
 from __future__ import annotations
 
-from core.models import Game, CashOut
+from core.action_log import append_actions, CASH_OUT
+from core.balance import apply_cash_out, get_balances
+from core.cache import get_active_game
+from core.metrics import instrumented
+from core.models import CashOut, atomic
 
 
+@instrumented
 def add_cash_out(chat_id: str, user: str, amount: int) -> None:
     assert amount >= 0
-    game = Game.get(chat_id=chat_id, is_finished=False)
-    CashOut.create(game=game, user=user, amount=amount)
+    game = get_active_game(chat_id)
+    with atomic():
+        action, = append_actions(game, CASH_OUT, [user], amount)
+        cash_out = CashOut.create(game=game, user=user, amount=amount, timestamp=action.timestamp, seq=action.seq)
+        apply_cash_out(cash_out)
 
 
+@instrumented
 def calculate_total_cash_out(chat_id: str, user: str = None) -> int | dict[str, int]:
-    game = Game.get(chat_id=chat_id, is_finished=False)
+    game = get_active_game(chat_id)
     if user:
-        total = 0
-        for cash_out in game.cash_outs:
-            if cash_out.user == user:
-                total += cash_out.amount
-        return total
-    total = {}
-    for cash_out in game.cash_outs:
-        user = cash_out.user
-        if user not in total:
-            total[user] = 0
-        total[user] += cash_out.amount
-    return total
+        return sum(total for _, _, total, _, last_cash_out in get_balances(game, [user]) if last_cash_out)
+    return {user: total for user, _, total, _, last_cash_out in get_balances(game) if last_cash_out}
@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+from peewee import SqliteDatabase
+
+from core.metrics import InstrumentedSqliteDatabase
+from core.migrations import migrate
+from core.models import db
+
+DEFAULT_PATH = 'poker.db'
+BUSY_TIMEOUT = 5
+PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'cache_size': -64 * 1024,
+    'mmap_size': 256 * 1024 * 1024,
+}
+
+__bootstrapped: set[str] = set()
+
+
+def database_options(pragmas: dict = None, timeout: float = BUSY_TIMEOUT) -> dict:
+    return {'pragmas': {**PRAGMAS, **(pragmas or {})}, 'timeout': timeout}
+
+
+def create_database(path: str = DEFAULT_PATH, pragmas: dict = None, timeout: float = BUSY_TIMEOUT) -> SqliteDatabase:
+    return InstrumentedSqliteDatabase(path, **database_options(pragmas, timeout))
+
+
+def init_database(path: str = DEFAULT_PATH, pragmas: dict = None, timeout: float = BUSY_TIMEOUT) -> SqliteDatabase:
+    db.init(path, **database_options(pragmas, timeout))
+    return db
+
+
+def bootstrap(path: str = DEFAULT_PATH, pragmas: dict = None, timeout: float = BUSY_TIMEOUT) -> SqliteDatabase:
+    init_database(path, pragmas, timeout)
+    if path not in __bootstrapped:
+        migrate(db)
+        close_database()
+        __bootstrapped.add(path)
+    return db
+
+
+def close_database() -> None:
+    if not db.is_closed():
+        db.close()
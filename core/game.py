@@ -2,138 +2,107 @@ from __future__ import annotations
 
 import datetime
 
+from core.action_log import undo_actions, redo_actions, can_redo
+from core.analytics import record_game_results
+from core.balance import get_balances, get_bank
 from core.buy_in import calculate_total_buy_in
+from core.cache import active_games, get_active_game
 from core.cash_out import calculate_total_cash_out
-from core.models import Game, BuyIn, CashOut
+from core.leaderboard import record_finished_games, get_lifetime_profits
+from core.metrics import instrumented
+from core.models import Game, Action, atomic
+from core.settlement import settle, AUTO
 
 
+@instrumented
 def has_active_games(chat_id: str) -> bool:
-    return Game.select().where((Game.chat_id == chat_id) & ~Game.is_finished).exists()
+    return active_games.lookup(chat_id) is not None
 
 
+@instrumented
 def start_game(chat_id: str) -> None:
     Game.create(chat_id=chat_id, is_finished=False)
+    active_games.invalidate(chat_id)
 
 
+@instrumented
 def finish_games(chat_id: str) -> None:
-    Game.update(is_finished=True).where(Game.chat_id == chat_id).execute()
-
-
-def __calculate_total_profit(games: list[Game]) -> dict[str, int]:
-    profits = {}
-
-    def update_profit(profit_user, diff):
-        if profit_user not in profits:
-            profits[profit_user] = 0
-        profits[profit_user] += diff
-
-    for game in games:
-        for cash_out in game.cash_outs:
-            update_profit(cash_out.user, cash_out.amount)
-        for buy_in in game.buy_ins:
-            update_profit(buy_in.user, -buy_in.amount)
-
-    return profits
-
-
+    finished_at = datetime.datetime.now()
+    with atomic():
+        games = Game.select(Game.id).where((Game.chat_id == chat_id) & ~Game.is_finished)
+        record_finished_games(games)
+        record_game_results(games, finished_at)
+        (Game.update(is_finished=True, finished_at=finished_at)
+         .where((Game.chat_id == chat_id) & ~Game.is_finished)
+         .execute())
+    active_games.invalidate(chat_id)
+
+
+@instrumented
 def calculate_profit(chat_id: str, user: str = None) -> int | dict[str, int]:
     if user:
         total_cash_out = calculate_total_cash_out(chat_id, user)
         total_buy_in = calculate_total_buy_in(chat_id, [user])[user]
         return total_cash_out - total_buy_in
-    game = Game.get(chat_id=chat_id, is_finished=False)
-    return __calculate_total_profit([game])
+    game = get_active_game(chat_id)
+    return {user: cash_out - buy_in for user, buy_in, cash_out, _, _ in get_balances(game)}
 
 
+@instrumented
 def calculate_total_profit_in_all_finished_games(chat_id: str) -> dict[str, int]:
-    games = Game.select().where((Game.chat_id == chat_id) & Game.is_finished)
-    return __calculate_total_profit(games)
+    return get_lifetime_profits(chat_id)
 
 
+@instrumented
 def calculate_active_players(chat_id: str) -> list[str]:
-    last_actions_time = {}
-    game = Game.get(chat_id=chat_id, is_finished=False)
+    game = get_active_game(chat_id)
+    return [user for user, _, _, last_buy_in, last_cash_out in get_balances(game) if
+            last_buy_in and (not last_cash_out or last_buy_in > last_cash_out)]
 
-    def update_last_action_time(user, action, timestamp):
-        if user not in last_actions_time:
-            last_actions_time[user] = {'buy_in': datetime.datetime(1, 1, 1),
-                                       'cash_out': datetime.datetime(1, 1, 1)}
-        if last_actions_time[user][action] < timestamp:
-            last_actions_time[user][action] = timestamp
 
-    for buy_in in game.buy_ins:
-        update_last_action_time(buy_in.user, 'buy_in', buy_in.timestamp)
-    for cash_out in game.cash_outs:
-        update_last_action_time(cash_out.user, 'cash_out', cash_out.timestamp)
-    return [user for user, actions_time in last_actions_time.items() if
-            actions_time['buy_in'] > actions_time['cash_out']]
+@instrumented
+def calculate_bank_size(chat_id: str) -> int:
+    game = get_active_game(chat_id)
+    return get_bank(game)
 
 
-def calculate_bank_size(chat_id: str) -> int:
-    game = Game.get(chat_id=chat_id, is_finished=False)
-    diff = 0
-    for buy_in in game.buy_ins:
-        diff += buy_in.amount
-    for cash_out in game.cash_outs:
-        diff -= cash_out.amount
-    return diff
-
-
-def calculate_money_transfers(chat_id: str) -> list[dict]:
-    profits = calculate_profit(chat_id)
-
-    if not profits:
-        return []
-
-    transfers = []
-    while True:
-        min_profit_user = min(profits, key=profits.get)
-        min_profit = profits[min_profit_user]
-        if min_profit >= 0:
-            return transfers
-        max_profit_user = max(profits, key=profits.get)
-        max_profit = profits[max_profit_user]
-        if max_profit <= 0:
-            return transfers
-        transfer_amount = min(-min_profit, max_profit)
-        profits[min_profit_user] += transfer_amount
-        profits[max_profit_user] -= transfer_amount
-        transfer = {
-            'from': min_profit_user,
-            'to': max_profit_user,
-            'amount': transfer_amount
-        }
-        transfers.append(transfer)
+@instrumented
+def calculate_money_transfers(chat_id: str, mode: str = AUTO) -> list[dict]:
+    return settle(calculate_profit(chat_id), mode)
 
 
+@instrumented
 def has_actions(chat_id: str) -> bool:
-    game = Game.get(chat_id=chat_id, is_finished=False)
-    return BuyIn.select().where(BuyIn.game == game).exists() or CashOut.select().where(CashOut.game == game).exists()
+    game = get_active_game(chat_id)
+    return Action.select().where((Action.game == game) & ~Action.is_undone).exists()
 
 
+@instrumented
+def has_undone_actions(chat_id: str) -> bool:
+    game = get_active_game(chat_id)
+    return can_redo(game)
+
+
+@instrumented
+def undo_last_actions(chat_id: str, count: int = 1) -> list[dict[str, str | int]]:
+    game = get_active_game(chat_id)
+    return [__format_action(action) for action in undo_actions(game, count)]
+
+
+@instrumented
 def undo_last_action(chat_id: str) -> dict[str, str | int]:
-    game = Game.get(chat_id=chat_id, is_finished=False)
-    last_buy_in = (BuyIn.select().where(BuyIn.game == game).order_by(BuyIn.timestamp.desc()).limit(1)
-                   .get_or_none())
-    last_cash_out = (CashOut.select().where(CashOut.game == game).order_by(CashOut.timestamp.desc()).limit(1)
-                     .get_or_none())
-
-    def format_result(model: BuyIn | CashOut) -> dict[str, str | int]:
-        return {
-            'type': 'buy_in' if isinstance(model, BuyIn) else 'cash_out',
-            'user': model.user,
-            'amount': model.amount
-        }
-
-    if not last_buy_in:
-        last_cash_out.delete_instance()
-        return format_result(last_cash_out)
-    if not last_cash_out:
-        last_buy_in.delete_instance()
-        return format_result(last_buy_in)
-    if last_cash_out.timestamp > last_buy_in.timestamp:
-        last_cash_out.delete_instance()
-        return format_result(last_cash_out)
-    else:
-        last_buy_in.delete_instance()
-        return format_result(last_buy_in)
+    return undo_last_actions(chat_id)[0]
+
+
+@instrumented
+def redo_undone_actions(chat_id: str, count: int = 1) -> list[dict[str, str | int]]:
+    game = get_active_game(chat_id)
+    return [__format_action(action) for action in redo_actions(game, count)]
+
+
+def __format_action(action: Action) -> dict[str, str | int]:
+    return {
+        'type': action.type,
+        'user': action.user,
+        'amount': action.amount
+    }
@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+import csv
+import datetime
+import json
+import time
+from collections import Counter
+from typing import IO, Iterable, Iterator
+
+from peewee import chunked, Table
+
+from core.action_log import insert_ledger_rows, BUY_IN, CASH_OUT
+from core.analytics import backfill_finished_at, rebuild_analytics
+from core.archive import attach_archive, archive_table
+from core.balance import rebuild_balances
+from core.cache import active_games
+from core.leaderboard import rebuild_lifetime_totals
+from core.models import Action, Game, atomic
+
+CSV = 'csv'
+JSONL = 'jsonl'
+FORMATS = [CSV, JSONL]
+FIELDS = ['chat_id', 'game', 'is_finished', 'finished_at', 'seq', 'type', 'user', 'amount', 'timestamp']
+IMPORT_BATCH_SIZE = 1000
+TRUE_VALUES = {'1', 'true', 'yes'}
+GAME_ID_PREFIX = '#'
+
+
+def iter_history(chat_id: str = None, archive_path: str = None) -> Iterator[dict]:
+    if archive_path is not None:
+        with attach_archive(archive_path):
+            yield from __iter_actions(archive_table(Action), chat_id)
+    yield from __iter_actions(Action, chat_id)
+
+
+def count_archived_games(chat_id: str = None) -> int:
+    query = Game.select().where(Game.is_archived)
+    if chat_id is not None:
+        query = query.where(Game.chat_id == chat_id)
+    return query.count()
+
+
+def export_history(file: IO[str], format: str, chat_id: str = None, archive_path: str = None) \
+        -> dict[str, int | float]:
+    assert format in FORMATS
+    started = time.perf_counter()
+    rows = 0
+    if format == CSV:
+        writer = csv.DictWriter(file, FIELDS)
+        writer.writeheader()
+    for row in iter_history(chat_id, archive_path):
+        if format == CSV:
+            writer.writerow(row)
+        else:
+            file.write(json.dumps(row, ensure_ascii=False) + '\n')
+        rows += 1
+    skipped_games = 0 if archive_path is not None else count_archived_games(chat_id)
+    return {'rows': rows, 'skipped_games': skipped_games, 'seconds': time.perf_counter() - started}
+
+
+def read_history(file: IO[str], format: str) -> Iterator[dict]:
+    assert format in FORMATS
+    records = csv.DictReader(file) if format == CSV else (json.loads(line) for line in file if line.strip())
+    for record in records:
+        yield __parse_record(record)
+
+
+def import_history(file: IO[str], format: str, batch_size: int = IMPORT_BATCH_SIZE) -> dict[str, int | float]:
+    return import_records(read_history(file, format), batch_size)
+
+
+def import_records(records: Iterable[dict], batch_size: int = IMPORT_BATCH_SIZE) -> dict[str, int | float]:
+    started = time.perf_counter()
+    stats = {'rows': 0, 'imported': 0, 'skipped': 0, 'games': 0}
+    games: dict[tuple[str, str], int] = {}
+    archived: set[int] = set()
+    next_seqs: dict[int, int] = {}
+    contents: dict[int, Counter] = {}
+    for batch in chunked(records, batch_size):
+        with atomic():
+            actions = []
+            for record in batch:
+                game_id = games.get((record['chat_id'], record['game']))
+                if game_id is None:
+                    game_id, created, is_archived = __get_or_create_game(record)
+                    games[record['chat_id'], record['game']] = game_id
+                    stats['games'] += created
+                    if is_archived:
+                        archived.add(game_id)
+                    else:
+                        next_seqs[game_id], contents[game_id] = (1, Counter()) if created else __load_actions(game_id)
+                if game_id in archived:
+                    continue
+                seq = record['seq']
+                if seq is None:
+                    content = (record['type'], record['user'], record['amount'], record['timestamp'])
+                    if contents[game_id][content]:
+                        contents[game_id][content] -= 1
+                        continue
+                    seq = next_seqs[game_id]
+                next_seqs[game_id] = max(next_seqs[game_id], seq + 1)
+                actions.append(Action(game=game_id, seq=seq, type=record['type'], user=record['user'],
+                                      amount=record['amount'], timestamp=record['timestamp']))
+            actions = __skip_existing(actions)
+            Action.bulk_create(actions)
+            insert_ledger_rows(actions)
+        stats['rows'] += len(batch)
+        stats['imported'] += len(actions)
+    stats['skipped'] = stats['rows'] - stats['imported']
+    game_ids = set(games.values()) - archived
+    if game_ids:
+        __rebuild_aggregates(game_ids, {chat_id for (chat_id, _), game_id in games.items() if game_id in game_ids})
+    stats['seconds'] = time.perf_counter() - started
+    return stats
+
+
+def __iter_actions(actions: type[Action] | Table, chat_id: str | None) -> Iterator[dict]:
+    fields = [Game.chat_id, Game.id, Game.import_key, Game.is_finished, Game.finished_at, Action.seq, Action.type,
+              Action.user, Action.amount, Action.timestamp]
+    game, is_undone, *columns = [field if actions is Action else getattr(actions.c, field.column_name)
+                                 for field in [Action.game, Action.is_undone, *fields[5:]]]
+    query = (actions.select(*fields[:5], *columns)
+             .join(Game, on=(game == Game.id))
+             .where(~is_undone)
+             .order_by(game, columns[0]))
+    if chat_id is not None:
+        query = query.where(Game.chat_id == chat_id)
+    for row in query.tuples().iterator():
+        chat, game_id, import_key, is_finished, finished_at, seq, type, user, amount, timestamp = [
+            field.python_value(value) for field, value in zip(fields, row)]
+        yield {'chat_id': chat, 'game': import_key or f'{GAME_ID_PREFIX}{game_id}', 'is_finished': is_finished,
+               'finished_at': finished_at.isoformat(sep=' ') if finished_at else None, 'seq': seq, 'type': type,
+               'user': user, 'amount': amount, 'timestamp': timestamp.isoformat(sep=' ')}
+
+
+def __parse_record(record: dict) -> dict:
+    if record['type'] not in (BUY_IN, CASH_OUT):
+        raise ValueError(f"Unknown action type {record['type']!r}")
+    is_finished = record.get('is_finished')
+    return {
+        'chat_id': str(record['chat_id']),
+        'game': str(record['game']),
+        'is_finished': is_finished if isinstance(is_finished, bool) else str(is_finished).lower() in TRUE_VALUES,
+        'finished_at': __parse_timestamp(record.get('finished_at')),
+        'seq': int(record['seq']) if record.get('seq') not in (None, '') else None,
+        'type': record['type'],
+        'user': record['user'],
+        'amount': int(record['amount']),
+        'timestamp': __parse_timestamp(record['timestamp']),
+    }
+
+
+def __parse_timestamp(value: str | None) -> datetime.datetime | None:
+    return datetime.datetime.fromisoformat(value) if value else None
+
+
+def __get_or_create_game(record: dict) -> tuple[int, bool, bool]:
+    key = Game.import_key == record['game']
+    exported_id = __parse_game_id(record['game'])
+    if exported_id is not None:
+        key |= Game.import_key.is_null() & (Game.id == exported_id)
+    game = Game.select(Game.id, Game.is_archived).where((Game.chat_id == record['chat_id']) & key).tuples().first()
+    if game is not None:
+        return game[0], False, game[1]
+    if not record['is_finished'] and active_games.lookup(record['chat_id']) is not None:
+        raise ValueError(f"Chat {record['chat_id']} already has an active game")
+    game = Game.create(chat_id=record['chat_id'], is_finished=record['is_finished'],
+                       finished_at=record['finished_at'], import_key=record['game'])
+    active_games.invalidate(record['chat_id'])
+    return game.id, True, False
+
+
+def __parse_game_id(key: str) -> int | None:
+    game_id = key.removeprefix(GAME_ID_PREFIX)
+    return int(game_id) if key.startswith(GAME_ID_PREFIX) and game_id.isdigit() else None
+
+
+def __load_actions(game_id: int) -> tuple[int, Counter]:
+    actions = list(Action.select(Action.seq, Action.type, Action.user, Action.amount, Action.timestamp,
+                                 Action.is_undone)
+                   .where(Action.game == game_id)
+                   .tuples())
+    contents = Counter(tuple(action[1:5]) for action in actions if not action[5])
+    return max((action[0] for action in actions), default=0) + 1, contents
+
+
+def __skip_existing(actions: list[Action]) -> list[Action]:
+    existing = set(Action.select(Action.game, Action.seq)
+                   .where(Action.game.in_(list({action.game_id for action in actions}))
+                          & Action.seq.in_(list({action.seq for action in actions})))
+                   .tuples())
+    unique = {}
+    for action in actions:
+        if (action.game_id, action.seq) not in existing:
+            unique.setdefault((action.game_id, action.seq), action)
+    return list(unique.values())
+
+
+def __rebuild_aggregates(game_ids: set[int], chat_ids: set[str]) -> None:
+    with atomic():
+        for batch in chunked(sorted(game_ids), IMPORT_BATCH_SIZE):
+            rebuild_balances(Game.select(Game.id).where(Game.id.in_(batch)))
+        backfill_finished_at()
+        for chat_id in chat_ids:
+            rebuild_lifetime_totals(chat_id)
+            rebuild_analytics(chat_id)
@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+from peewee import chunked, Select, EXCLUDED
+
+from core.models import Balance, Game, LifetimeTotal, atomic
+from core.queries import sum_finished_profit_by_chat_and_user
+
+INSERT_BATCH_SIZE = 100
+
+
+def record_finished_games(games: Select) -> None:
+    rows = [{'chat_id': chat_id, 'user': user, 'profit': profit, 'games': 1}
+            for chat_id, user, profit in (Balance.select(Game.chat_id, Balance.user,
+                                                         Balance.cash_out - Balance.buy_in)
+                                          .join(Game)
+                                          .where(Balance.game.in_(games))
+                                          .tuples())]
+    for batch in chunked(rows, INSERT_BATCH_SIZE):
+        (LifetimeTotal.insert_many(batch)
+         .on_conflict(conflict_target=[LifetimeTotal.chat_id, LifetimeTotal.user],
+                      update={LifetimeTotal.profit: LifetimeTotal.profit + EXCLUDED.profit,
+                              LifetimeTotal.games: LifetimeTotal.games + EXCLUDED.games})
+         .execute())
+
+
+def get_lifetime_profits(chat_id: str) -> dict[str, int]:
+    return dict(LifetimeTotal.select(LifetimeTotal.user, LifetimeTotal.profit)
+                .where(LifetimeTotal.chat_id == chat_id)
+                .order_by(LifetimeTotal.id)
+                .tuples())
+
+
+def rebuild_lifetime_totals(chat_id: str = None) -> int:
+    rows = sum_finished_profit_by_chat_and_user(chat_id)
+    fields = [LifetimeTotal.chat_id, LifetimeTotal.user, LifetimeTotal.profit, LifetimeTotal.games]
+    with atomic():
+        delete = LifetimeTotal.delete()
+        if chat_id is not None:
+            delete = delete.where(LifetimeTotal.chat_id == chat_id)
+        delete.execute()
+        for batch in chunked(rows, INSERT_BATCH_SIZE):
+            LifetimeTotal.insert_many(batch, fields=fields).execute()
+    return len(rows)
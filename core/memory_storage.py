@@ -0,0 +1,319 @@
+from __future__ import annotations
+
+import bisect
+import datetime
+import logging
+import os
+import pickle
+import threading
+from typing import ContextManager
+
+from core.action_log import BUY_IN, CASH_OUT
+from core.analytics import MONTH_FORMAT
+from core.models import Game
+from core.settlement import settle, AUTO
+from core.storage import Storage
+
+SNAPSHOT_VERSION = 1
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryBalance:
+    __slots__ = ('buy_in', 'cash_out', 'buy_ins', 'cash_outs')
+
+    def __init__(self):
+        self.buy_in = 0
+        self.cash_out = 0
+        self.buy_ins: list[int] = []
+        self.cash_outs: list[int] = []
+
+    def is_active(self) -> bool:
+        return bool(self.buy_ins) and (not self.cash_outs or self.buy_ins[-1] > self.cash_outs[-1])
+
+
+class MemoryGame:
+    def __init__(self, chat_id: str):
+        self.chat_id = chat_id
+        self.balances: dict[str, MemoryBalance] = {}
+        self.actions: list[tuple[str, str, int, datetime.datetime]] = []
+        self.applied = 0
+
+    def append(self, type: str, users: list[str], amount: int) -> None:
+        del self.actions[self.applied:]
+        timestamp = datetime.datetime.now()
+        for user in users:
+            self.actions.append((type, user, amount, timestamp))
+            self.apply(len(self.actions) - 1)
+        self.applied = len(self.actions)
+
+    def apply(self, index: int) -> None:
+        type, user, amount, _ = self.actions[index]
+        balance = self.balances.get(user)
+        if balance is None:
+            balance = self.balances[user] = MemoryBalance()
+        if type == BUY_IN:
+            balance.buy_in += amount
+            balance.buy_ins.append(index)
+        else:
+            balance.cash_out += amount
+            balance.cash_outs.append(index)
+
+    def revert(self, index: int) -> None:
+        type, user, amount, _ = self.actions[index]
+        balance = self.balances[user]
+        if type == BUY_IN:
+            balance.buy_in -= amount
+            balance.buy_ins.pop()
+        else:
+            balance.cash_out -= amount
+            balance.cash_outs.pop()
+        if not balance.buy_ins and not balance.cash_outs:
+            del self.balances[user]
+
+
+class MemoryStorage(Storage):
+    def __init__(self, snapshot_path: str = None, snapshot_interval: float = None):
+        assert snapshot_interval is None or snapshot_path is not None, 'Periodic snapshots need a snapshot path'
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self.__active: dict[str, MemoryGame] = {}
+        self.__lifetime: dict[str, dict[str, list[int]]] = {}
+        self.__results: dict[str, list[tuple[datetime.datetime, str, int, int]]] = {}
+        self.__finished: dict[str, list[datetime.datetime]] = {}
+        self.__monthly: dict[str, dict[tuple[str, str], list[int]]] = {}
+        self.__processed: dict[int, datetime.datetime] = {}
+        self.__lock = threading.RLock()
+        self.__stopped = threading.Event()
+        self.__snapshot_thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        if self.snapshot_path and os.path.exists(self.snapshot_path):
+            self.load_snapshot(self.snapshot_path)
+        if self.snapshot_interval:
+            self.__stopped.clear()
+            self.__snapshot_thread = threading.Thread(target=self.__snapshot_periodically, name='poker-snapshot',
+                                                      daemon=True)
+            self.__snapshot_thread.start()
+
+    def stop(self) -> None:
+        if self.__snapshot_thread is not None:
+            self.__stopped.set()
+            self.__snapshot_thread.join()
+            self.__snapshot_thread = None
+        if self.snapshot_path:
+            self.save_snapshot(self.snapshot_path)
+
+    def atomic(self, lock_type: str = None) -> ContextManager:
+        return self.__lock
+
+    def save_snapshot(self, path: str) -> None:
+        with self.__lock:
+            data = pickle.dumps({'version': SNAPSHOT_VERSION, 'active': self.__active, 'lifetime': self.__lifetime,
+                                 'results': self.__results, 'monthly': self.__monthly,
+                                 'processed': self.__processed},
+                                protocol=pickle.HIGHEST_PROTOCOL)
+        temporary_path = f'{path}.tmp'
+        with open(temporary_path, 'wb') as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary_path, path)
+
+    def load_snapshot(self, path: str) -> None:
+        with open(path, 'rb') as file:
+            data = pickle.load(file)
+        assert data['version'] == SNAPSHOT_VERSION, f"Unsupported snapshot version {data['version']}"
+        with self.__lock:
+            self.__active = data['active']
+            self.__lifetime = data['lifetime']
+            self.__results = data['results']
+            self.__finished = {chat_id: [result[0] for result in results]
+                               for chat_id, results in self.__results.items()}
+            self.__monthly = data['monthly']
+            self.__processed = data.get('processed', {})
+
+    def has_active_games(self, chat_id: str) -> bool:
+        return chat_id in self.__active
+
+    def start_game(self, chat_id: str) -> None:
+        with self.__lock:
+            self.__active[chat_id] = MemoryGame(chat_id)
+
+    def finish_games(self, chat_id: str) -> None:
+        with self.__lock:
+            game = self.__active.pop(chat_id, None)
+            if game is None:
+                return
+            finished_at = datetime.datetime.now()
+            month = finished_at.strftime(MONTH_FORMAT)
+            lifetime = self.__lifetime.setdefault(chat_id, {})
+            results = self.__results.setdefault(chat_id, [])
+            finished = self.__finished.setdefault(chat_id, [])
+            monthly = self.__monthly.setdefault(chat_id, {})
+            for user, balance in game.balances.items():
+                profit = balance.cash_out - balance.buy_in
+                total = lifetime.setdefault(user, [0, 0])
+                total[0] += profit
+                total[1] += 1
+                results.append((finished_at, user, balance.buy_in, profit))
+                finished.append(finished_at)
+                rollup = monthly.get((month, user))
+                if rollup is None:
+                    monthly[month, user] = [1, balance.buy_in, profit, profit, profit]
+                else:
+                    rollup[0] += 1
+                    rollup[1] += balance.buy_in
+                    rollup[2] += profit
+                    rollup[3] = max(rollup[3], profit)
+                    rollup[4] = min(rollup[4], profit)
+
+    def add_buy_in(self, chat_id: str, users: list[str], amount: int) -> None:
+        assert users and amount > 0
+        with self.__lock:
+            self.__get_game(chat_id).append(BUY_IN, users, amount)
+
+    def has_buy_in(self, chat_id: str, user: str) -> bool:
+        balance = self.__get_game(chat_id).balances.get(user)
+        return balance is not None and bool(balance.buy_ins)
+
+    def calculate_total_buy_in(self, chat_id: str, users: list[str] = ()) -> dict[str, int]:
+        return {user: balance.buy_in for user, balance in self.__get_game(chat_id).balances.items()
+                if balance.buy_ins and (not users or user in users)}
+
+    def add_cash_out(self, chat_id: str, user: str, amount: int) -> None:
+        assert amount >= 0
+        with self.__lock:
+            self.__get_game(chat_id).append(CASH_OUT, [user], amount)
+
+    def calculate_total_cash_out(self, chat_id: str, user: str = None) -> int | dict[str, int]:
+        balances = self.__get_game(chat_id).balances
+        if user:
+            balance = balances.get(user)
+            return balance.cash_out if balance is not None and balance.cash_outs else 0
+        return {user: balance.cash_out for user, balance in balances.items() if balance.cash_outs}
+
+    def calculate_profit(self, chat_id: str, user: str = None) -> int | dict[str, int]:
+        if user:
+            return self.calculate_total_cash_out(chat_id, user) - self.calculate_total_buy_in(chat_id, [user])[user]
+        return {user: balance.cash_out - balance.buy_in for user, balance in self.__get_game(chat_id).balances.items()}
+
+    def calculate_total_profit_in_all_finished_games(self, chat_id: str) -> dict[str, int]:
+        return {user: profit for user, (profit, _) in self.__lifetime.get(chat_id, {}).items()}
+
+    def calculate_active_players(self, chat_id: str) -> list[str]:
+        return [user for user, balance in self.__get_game(chat_id).balances.items() if balance.is_active()]
+
+    def calculate_bank_size(self, chat_id: str) -> int:
+        return sum(balance.buy_in - balance.cash_out for balance in self.__get_game(chat_id).balances.values())
+
+    def calculate_money_transfers(self, chat_id: str, mode: str = AUTO) -> list[dict]:
+        return settle(self.calculate_profit(chat_id), mode)
+
+    def has_actions(self, chat_id: str) -> bool:
+        return self.__get_game(chat_id).applied > 0
+
+    def has_undone_actions(self, chat_id: str) -> bool:
+        game = self.__get_game(chat_id)
+        return game.applied < len(game.actions)
+
+    def undo_last_actions(self, chat_id: str, count: int = 1) -> list[dict[str, str | int]]:
+        assert count > 0
+        with self.__lock:
+            game = self.__get_game(chat_id)
+            undone = range(game.applied - 1, max(game.applied - count, 0) - 1, -1)
+            for index in undone:
+                game.revert(index)
+            game.applied = undone.stop + 1
+            return [self.__format_action(game, index) for index in undone]
+
+    def redo_undone_actions(self, chat_id: str, count: int = 1) -> list[dict[str, str | int]]:
+        assert count > 0
+        with self.__lock:
+            game = self.__get_game(chat_id)
+            redone = range(game.applied, min(game.applied + count, len(game.actions)))
+            for index in redone:
+                game.apply(index)
+            game.applied = redone.stop
+            return [self.__format_action(game, index) for index in redone]
+
+    def get_user_stats(self, chat_id: str, start: datetime.date = None, end: datetime.date = None) \
+            -> list[tuple[str, int, int, int, int, int]]:
+        stats: dict[str, list[int]] = {}
+        if start is None and end is None:
+            for (_, user), (games, buy_in, profit, biggest_win, biggest_loss) in self.__monthly.get(chat_id,
+                                                                                                   {}).items():
+                self.__add_stats(stats, user, games, buy_in, profit, biggest_win, biggest_loss)
+        else:
+            results = self.__results.get(chat_id, [])
+            finished = self.__finished.get(chat_id, [])
+            low = 0 if start is None else bisect.bisect_left(
+                finished, datetime.datetime.combine(start, datetime.time()))
+            high = len(results) if end is None else bisect.bisect_left(
+                finished, datetime.datetime.combine(end + datetime.timedelta(days=1), datetime.time()))
+            for _, user, buy_in, profit in results[low:high]:
+                self.__add_stats(stats, user, 1, buy_in, profit, profit, profit)
+        rows = sorted((user, *values) for user, values in stats.items())
+        return sorted(rows, key=lambda row: row[3], reverse=True)
+
+    def get_monthly_trend(self, chat_id: str, start: datetime.date = None, end: datetime.date = None) \
+            -> list[tuple[str, str, int, int]]:
+        first = start.strftime(MONTH_FORMAT) if start else ''
+        last = end.strftime(MONTH_FORMAT) if end else '9999-12'
+        return sorted(((month, user, games, profit)
+                       for (month, user), (games, _, profit, _, _) in self.__monthly.get(chat_id, {}).items()
+                       if first <= month <= last),
+                      key=lambda row: (row[0], -row[3]))
+
+    def record_update(self, update_id: int) -> None:
+        with self.__lock:
+            self.__processed.setdefault(update_id, datetime.datetime.now())
+
+    def is_update_processed(self, update_id: int) -> bool:
+        return update_id in self.__processed
+
+    def last_processed_update(self) -> int | None:
+        with self.__lock:
+            return max(self.__processed, default=None)
+
+    def prune_processed_updates(self, before: datetime.datetime) -> int:
+        with self.__lock:
+            pruned = [update_id for update_id, processed_at in self.__processed.items() if processed_at < before]
+            for update_id in pruned:
+                del self.__processed[update_id]
+        return len(pruned)
+
+    def __get_game(self, chat_id: str) -> MemoryGame:
+        game = self.__active.get(chat_id)
+        if game is None:
+            raise Game.DoesNotExist(f'No active game in chat {chat_id}')
+        return game
+
+    def __snapshot_periodically(self) -> None:
+        while not self.__stopped.wait(self.snapshot_interval):
+            try:
+                self.save_snapshot(self.snapshot_path)
+            except OSError:
+                logger.exception('Failed to save snapshot to %s', self.snapshot_path)
+
+    @staticmethod
+    def __format_action(game: MemoryGame, index: int) -> dict[str, str | int]:
+        type, user, amount, _ = game.actions[index]
+        return {
+            'type': type,
+            'user': user,
+            'amount': amount
+        }
+
+    @staticmethod
+    def __add_stats(stats: dict[str, list[int]], user: str, games: int, buy_in: int, profit: int,
+                    biggest_win: int, biggest_loss: int) -> None:
+        values = stats.get(user)
+        if values is None:
+            stats[user] = [games, buy_in, profit, biggest_win, biggest_loss]
+            return
+        values[0] += games
+        values[1] += buy_in
+        values[2] += profit
+        values[3] = max(values[3], biggest_win)
+        values[4] = min(values[4], biggest_loss)
@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import bisect
+import contextlib
+import contextvars
+import functools
+import threading
+import time
+from typing import Callable, Iterator, TypeVar
+
+from peewee import SqliteDatabase, QueryEvent
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000, 10000)
+
+T = TypeVar('T')
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: tuple, label: str):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.label = label
+        self.__series: dict[str, list] = {}
+        self.__lock = threading.Lock()
+
+    def observe(self, label_value: str, value: float) -> None:
+        with self.__lock:
+            series = self.__series.setdefault(label_value, [[0] * (len(self.buckets) + 1), 0, 0])
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self) -> dict[str, tuple[list[int], float, int]]:
+        with self.__lock:
+            return {label_value: (list(counts), total, count)
+                    for label_value, (counts, total, count) in self.__series.items()}
+
+    def quantile(self, label_value: str, quantile: float) -> float:
+        counts, _, count = self.snapshot().get(label_value, ([], 0, 0))
+        seen = 0
+        for bucket, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            seen += bucket_count
+            if count and seen >= quantile * count:
+                return bucket
+        return 0
+
+    def render(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for label_value, (counts, total, count) in sorted(self.snapshot().items()):
+            label = f'{self.label}="{escape_label(label_value)}"'
+            cumulative = 0
+            for bucket, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bucket == float('inf') else repr(bucket)
+                lines.append(f'{self.name}_bucket{{{label},le="{le}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label}}} {total}')
+            lines.append(f'{self.name}_count{{{label}}} {count}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help: str, label: str):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.__values: dict[str, float] = {}
+        self.__lock = threading.Lock()
+
+    def inc(self, label_value: str, amount: float = 1) -> None:
+        with self.__lock:
+            self.__values[label_value] = self.__values.get(label_value, 0) + amount
+
+    def snapshot(self) -> dict[str, float]:
+        with self.__lock:
+            return dict(self.__values)
+
+    def render(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        for label_value, value in sorted(self.snapshot().items()):
+            lines.append(f'{self.name}{{{self.label}="{escape_label(label_value)}"}} {value}')
+        return lines
+
+
+class Gauge:
+    type = 'gauge'
+
+    def __init__(self, name: str, help: str, callback: Callable[[], float]):
+        self.name = name
+        self.help = help
+        self.callback = callback
+
+    def render(self) -> list[str]:
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.type}', f'{self.name} {self.callback()}']
+
+
+class CallbackCounter(Gauge):
+    type = 'counter'
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: list[Histogram | Counter | Gauge | CallbackCounter] = []
+
+    def histogram(self, name: str, help: str, buckets: tuple, label: str) -> Histogram:
+        return self.__register(Histogram(name, help, buckets, label))
+
+    def counter(self, name: str, help: str, label: str) -> Counter:
+        return self.__register(Counter(name, help, label))
+
+    def gauge(self, name: str, help: str, callback: Callable[[], float]) -> Gauge:
+        return self.__register(Gauge(name, help, callback))
+
+    def callback_counter(self, name: str, help: str, callback: Callable[[], float]) -> CallbackCounter:
+        return self.__register(CallbackCounter(name, help, callback))
+
+    def render(self) -> str:
+        return '\n'.join(line for metric in self.metrics for line in metric.render()) + '\n'
+
+    def __register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+
+class CommandStats:
+    def __init__(self, command: str):
+        self.command = command
+        self.statements = 0
+        self.rows = 0
+        self.api_seconds = 0.0
+
+
+registry = Registry()
+COMMAND_SECONDS = registry.histogram('poker_command_seconds', 'Command handler latency', LATENCY_BUCKETS, 'command')
+COMMAND_SQL_STATEMENTS = registry.histogram('poker_command_sql_statements', 'SQL statements executed per command',
+                                            COUNT_BUCKETS, 'command')
+COMMAND_ROWS_FETCHED = registry.histogram('poker_command_rows_fetched', 'Rows fetched from SQLite per command',
+                                          COUNT_BUCKETS, 'command')
+COMMAND_API_SECONDS = registry.histogram('poker_command_api_seconds', 'Telegram Bot API time per command',
+                                         LATENCY_BUCKETS, 'command')
+COMMAND_ERRORS = registry.counter('poker_command_errors_total', 'Commands that raised an exception', 'command')
+FUNCTION_SECONDS = registry.histogram('poker_core_function_seconds', 'Core function latency', LATENCY_BUCKETS,
+                                      'function')
+SQL_SECONDS = registry.histogram('poker_sql_seconds', 'SQL statement latency', LATENCY_BUCKETS, 'statement')
+API_SECONDS = registry.histogram('poker_api_seconds', 'Telegram Bot API request latency', LATENCY_BUCKETS,
+                                 'method')
+
+__current_command: contextvars.ContextVar[CommandStats | None] = contextvars.ContextVar('poker_command',
+                                                                                       default=None)
+
+
+@contextlib.contextmanager
+def track_command(command: str) -> Iterator[CommandStats]:
+    stats = CommandStats(command)
+    token = __current_command.set(stats)
+    started = time.perf_counter()
+    try:
+        yield stats
+    except Exception:
+        COMMAND_ERRORS.inc(command)
+        raise
+    finally:
+        __current_command.reset(token)
+        COMMAND_SECONDS.observe(command, time.perf_counter() - started)
+        COMMAND_SQL_STATEMENTS.observe(command, stats.statements)
+        COMMAND_ROWS_FETCHED.observe(command, stats.rows)
+        COMMAND_API_SECONDS.observe(command, stats.api_seconds)
+
+
+def current_command() -> CommandStats | None:
+    return __current_command.get()
+
+
+def instrumented(func: Callable[..., T]) -> Callable[..., T]:
+    name = f'{func.__module__}.{func.__name__}'
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            FUNCTION_SECONDS.observe(name, time.perf_counter() - started)
+
+    return wrapper
+
+
+def record_query(event: QueryEvent) -> None:
+    stats = current_command()
+    if stats is not None:
+        stats.statements += 1
+    SQL_SECONDS.observe(event.sql.split(None, 1)[0].upper(), event.duration)
+
+
+def record_api_call(method: str, seconds: float) -> None:
+    stats = current_command()
+    if stats is not None:
+        stats.api_seconds += seconds
+    API_SECONDS.observe(method, seconds)
+
+
+def escape_label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class InstrumentedSqliteDatabase(SqliteDatabase):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.query_hooks.append(record_query)
+
+    def _initialize_connection(self, connection) -> None:
+        super()._initialize_connection(connection)
+        connection.row_factory = self.__count_row
+
+    @staticmethod
+    def __count_row(_, row: tuple) -> tuple:
+        stats = current_command()
+        if stats is not None:
+            stats.rows += 1
+        return row
@@ -0,0 +1,103 @@
+from typing import Callable
+
+from peewee import SqliteDatabase, Model, Field
+from playhouse.migrate import SqliteMigrator, migrate as run_migrations
+
+from core.action_log import backfill_actions
+from core.analytics import backfill_finished_at, rebuild_analytics
+from core.balance import insert_balances
+from core.leaderboard import rebuild_lifetime_totals
+from core.models import db, Game, BuyIn, CashOut, Action, Balance, LifetimeTotal, GameResult, MonthlyResult, \
+    ProcessedUpdate
+from core.queries import sum_balances
+
+MODELS = [Game, BuyIn, CashOut, Action, Balance, LifetimeTotal, GameResult, MonthlyResult, ProcessedUpdate]
+
+
+def __create_ledger_tables(database: SqliteDatabase) -> None:
+    database.create_tables([model for model in [Game, BuyIn, CashOut] if not model.table_exists()])
+
+
+def __add_ledger_indexes(database: SqliteDatabase) -> None:
+    __create_indexes(database, [Game, BuyIn, CashOut])
+
+
+def __create_balance_table(database: SqliteDatabase) -> None:
+    database.create_tables([Balance], safe=True)
+    insert_balances(sum_balances())
+
+
+def __create_lifetime_total_table(database: SqliteDatabase) -> None:
+    database.create_tables([LifetimeTotal], safe=True)
+    rebuild_lifetime_totals()
+
+
+def __create_action_log(database: SqliteDatabase) -> None:
+    for model in [BuyIn, CashOut]:
+        __add_column(database, model.seq)
+    database.create_tables([Action], safe=True)
+    __create_indexes(database, [BuyIn, CashOut])
+    backfill_actions()
+
+
+def __create_analytics_tables(database: SqliteDatabase) -> None:
+    __add_column(database, Game.finished_at)
+    database.create_tables([GameResult, MonthlyResult], safe=True)
+    backfill_finished_at()
+    rebuild_analytics()
+
+
+def __add_game_import_key(database: SqliteDatabase) -> None:
+    __add_column(database, Game.import_key)
+    __create_indexes(database, [Game])
+
+
+def __add_game_archive_flag(database: SqliteDatabase) -> None:
+    __add_column(database, Game.is_archived)
+
+
+def __create_processed_update_table(database: SqliteDatabase) -> None:
+    database.create_tables([ProcessedUpdate], safe=True)
+
+
+def __add_column(database: SqliteDatabase, field: Field) -> None:
+    table = field.model._meta.table_name
+    if field.column_name not in {column.name for column in database.get_columns(table)}:
+        run_migrations(SqliteMigrator(database).add_column(table, field.column_name, field))
+
+
+def __create_indexes(database: SqliteDatabase, models: list[type[Model]]) -> None:
+    for model in models:
+        columns = {column.name for column in database.get_columns(model._meta.table_name)}
+        for index in model._meta.fields_to_index():
+            if all(field.column_name in columns for field in index._expressions):
+                database.execute(model._schema._create_index(index, safe=True))
+
+
+MIGRATIONS: list[Callable[[SqliteDatabase], None]] = [
+    __create_ledger_tables,
+    __add_ledger_indexes,
+    __create_balance_table,
+    __create_lifetime_total_table,
+    __create_action_log,
+    __create_analytics_tables,
+    __add_game_import_key,
+    __add_game_archive_flag,
+    __create_processed_update_table,
+]
+
+
+def get_schema_version(database: SqliteDatabase = db) -> int:
+    return database.user_version
+
+
+def migrate(database: SqliteDatabase = db) -> list[int]:
+    applied = []
+    with database.bind_ctx(MODELS):
+        version = get_schema_version(database)
+        for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+            with database.atomic():
+                migration(database)
+                database.user_version = number
+            applied.append(number)
+    return applied
@@ -2,7 +2,9 @@ import datetime
 
 from peewee import *
 
-db = SqliteDatabase('poker.db')
+from core.metrics import InstrumentedSqliteDatabase
+
+db = InstrumentedSqliteDatabase(None)
 
 
 class BaseModel(Model):
@@ -13,6 +15,15 @@ class BaseModel(Model):
 class Game(BaseModel):
     chat_id = CharField()
     is_finished = BooleanField()
+    finished_at = DateTimeField(null=True)
+    import_key = CharField(null=True)
+    is_archived = BooleanField(default=False)
+
+    class Meta:
+        indexes = (
+            (('chat_id', 'is_finished'), False),
+            (('chat_id', 'import_key'), True),
+        )
 
 
 class BuyIn(BaseModel):
@@ -20,6 +31,14 @@ class BuyIn(BaseModel):
     user = CharField()
     amount = IntegerField()
     timestamp = DateTimeField(default=datetime.datetime.now)
+    seq = IntegerField(null=True)
+
+    class Meta:
+        indexes = (
+            (('game', 'user'), False),
+            (('game', 'timestamp'), False),
+            (('game', 'seq'), False),
+        )
 
 
 class CashOut(BaseModel):
@@ -27,8 +46,94 @@ class CashOut(BaseModel):
     user = CharField()
     amount = IntegerField()
     timestamp = DateTimeField(default=datetime.datetime.now)
+    seq = IntegerField(null=True)
+
+    class Meta:
+        indexes = (
+            (('game', 'user'), False),
+            (('game', 'timestamp'), False),
+            (('game', 'seq'), False),
+        )
+
+
+class Action(BaseModel):
+    game = ForeignKeyField(Game, backref="actions")
+    seq = IntegerField()
+    type = CharField()
+    user = CharField()
+    amount = IntegerField()
+    timestamp = DateTimeField(default=datetime.datetime.now)
+    is_undone = BooleanField(default=False)
+
+    class Meta:
+        indexes = (
+            (('game', 'seq'), True),
+            (('game', 'is_undone', 'seq'), False),
+        )
+
+
+class Balance(BaseModel):
+    game = ForeignKeyField(Game, backref="balances")
+    user = CharField()
+    buy_in = IntegerField(default=0)
+    cash_out = IntegerField(default=0)
+    last_buy_in = DateTimeField(null=True)
+    last_cash_out = DateTimeField(null=True)
+
+    class Meta:
+        indexes = (
+            (('game', 'user'), True),
+        )
+
+
+class LifetimeTotal(BaseModel):
+    chat_id = CharField()
+    user = CharField()
+    profit = IntegerField(default=0)
+    games = IntegerField(default=0)
+
+    class Meta:
+        indexes = (
+            (('chat_id', 'user'), True),
+        )
+
+
+class GameResult(BaseModel):
+    game = ForeignKeyField(Game, backref="results")
+    chat_id = CharField()
+    user = CharField()
+    buy_in = IntegerField()
+    cash_out = IntegerField()
+    profit = IntegerField()
+    finished_at = DateTimeField()
+
+    class Meta:
+        indexes = (
+            (('game', 'user'), True),
+            (('chat_id', 'finished_at'), False),
+        )
+
+
+class MonthlyResult(BaseModel):
+    chat_id = CharField()
+    month = CharField()
+    user = CharField()
+    games = IntegerField(default=0)
+    buy_in = IntegerField(default=0)
+    profit = IntegerField(default=0)
+    biggest_win = IntegerField(default=0)
+    biggest_loss = IntegerField(default=0)
+
+    class Meta:
+        indexes = (
+            (('chat_id', 'month', 'user'), True),
+        )
+
+
+class ProcessedUpdate(BaseModel):
+    update_id = IntegerField(primary_key=True)
+    processed_at = DateTimeField(default=datetime.datetime.now, index=True)
 
 
-Game.create_table()
-BuyIn.create_table()
-CashOut.create_table()
+def atomic():
+    return Game._meta.database.atomic()
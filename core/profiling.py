@@ -0,0 +1,245 @@
+from __future__ import annotations
+
+import asyncio
+import collections
+import contextlib
+import contextvars
+import cProfile
+import datetime
+import io
+import json
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from typing import AsyncIterator, Callable, Iterator, TypeVar
+
+DEFAULT_DIRECTORY = 'profiles'
+DEFAULT_KEEP = 500
+TRACEMALLOC_FRAMES = 10
+TOP_ALLOCATIONS = 20
+PROFILE_SUFFIX = '.prof'
+SUMMARY_SUFFIX = '.json'
+SORT_KEYS = ['cumulative', 'tottime', 'calls']
+
+T = TypeVar('T')
+
+
+class CommandProfile:
+    def __init__(self, command: str, chat_id: str | None):
+        self.command = command
+        self.chat_id = chat_id
+        self.started = datetime.datetime.now()
+        self.seconds = 0.0
+        self.peak_bytes = 0
+        self.allocations: list[tuple[str, int, int]] = []
+        self.profiler = cProfile.Profile()
+        self.active = True
+        self.lock = threading.Lock()
+        self.__thread: int | None = None
+        self.__traced_bytes = 0
+
+    def resume(self) -> bool:
+        with self.lock:
+            if not self.active or self.__thread is not None or profiling_tool_active():
+                return False
+            self.__thread = threading.get_ident()
+            self.__traced_bytes = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            self.profiler.enable()
+            return True
+
+    def pause(self) -> None:
+        with self.lock:
+            if self.__thread != threading.get_ident():
+                return
+            self.profiler.disable()
+            self.__thread = None
+            self.peak_bytes = max(self.peak_bytes, tracemalloc.get_traced_memory()[1] - self.__traced_bytes)
+
+    def summary(self) -> dict:
+        return {
+            'command': self.command,
+            'chat_id': self.chat_id,
+            'started': self.started.isoformat(),
+            'seconds': self.seconds,
+            'peak_bytes': self.peak_bytes,
+            'allocations': [{'location': location, 'size': size, 'count': count}
+                            for location, size, count in self.allocations],
+        }
+
+
+CURRENT_PROFILE: contextvars.ContextVar[CommandProfile | None] = contextvars.ContextVar('poker_profile', default=None)
+
+
+def current_profile() -> CommandProfile | None:
+    return CURRENT_PROFILE.get()
+
+
+def profiling_tool_active() -> bool:
+    monitoring = getattr(sys, 'monitoring', None)
+    if monitoring is not None:
+        return monitoring.get_tool(monitoring.PROFILER_ID) is not None
+    return sys.getprofile() is not None
+
+
+def run_profiled(func: Callable[..., T], *args, **kwargs) -> T:
+    profile = current_profile()
+    if profile is None or not profile.resume():
+        return func(*args, **kwargs)
+    try:
+        return func(*args, **kwargs)
+    finally:
+        profile.pause()
+
+
+@contextlib.contextmanager
+def handed_off() -> Iterator[None]:
+    profile = current_profile()
+    if profile is None:
+        yield
+        return
+    profile.pause()
+    try:
+        yield
+    finally:
+        profile.resume()
+
+
+class Profiler:
+    def __init__(self, directory: str = DEFAULT_DIRECTORY, rate: float = 0.0, keep: int = DEFAULT_KEEP,
+                 chats: set[str] = None, random_: random.Random = None):
+        self.directory = directory
+        self.rate = rate
+        self.keep = keep
+        self.chats = chats or set()
+        self.saved = 0
+        self.__random = random_ or random.Random()
+        self.__lock = threading.Lock()
+        self.__active = False
+
+    def sample(self, chat_id: str | None) -> bool:
+        if self.rate <= 0 or self.__active or (self.chats and chat_id not in self.chats):
+            return False
+        return self.rate >= 1 or self.__random.random() < self.rate
+
+    @contextlib.asynccontextmanager
+    async def profile(self, command: str, chat_id: str | None) -> AsyncIterator[CommandProfile | None]:
+        with self.__lock:
+            busy, self.__active = self.__active, True
+        if busy:
+            yield None
+            return
+        profile = CommandProfile(command, chat_id)
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        if not profile.resume():
+            if started_tracing:
+                tracemalloc.stop()
+            with self.__lock:
+                self.__active = False
+            yield None
+            return
+        token = CURRENT_PROFILE.set(profile)
+        started = time.perf_counter()
+        try:
+            yield profile
+        finally:
+            profile.pause()
+            profile.seconds = time.perf_counter() - started
+            CURRENT_PROFILE.reset(token)
+            with profile.lock:
+                profile.active = False
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, self.__finish, profile, started_tracing)
+            finally:
+                with self.__lock:
+                    self.__active = False
+
+    def save(self, profile: CommandProfile) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        chat = re.sub(r'[^\w-]', '_', profile.chat_id or 'none')
+        name = f'{profile.started:%Y%m%dT%H%M%S%f}-{os.getpid()}-{profile.command}-{chat}'
+        path = os.path.join(self.directory, name)
+        stats = pstats.Stats(profile.profiler)
+        stats.dump_stats(path + PROFILE_SUFFIX)
+        with open(path + SUMMARY_SUFFIX, 'w', encoding='utf-8') as file:
+            json.dump(profile.summary(), file)
+        self.saved += 1
+        self.__rotate()
+        return path
+
+    def __finish(self, profile: CommandProfile, stop_tracing: bool) -> None:
+        try:
+            statistics = tracemalloc.take_snapshot().statistics('lineno')[:TOP_ALLOCATIONS]
+        finally:
+            if stop_tracing:
+                tracemalloc.stop()
+        profile.allocations = [(f'{statistic.traceback[0].filename}:{statistic.traceback[0].lineno}',
+                                statistic.size, statistic.count) for statistic in statistics]
+        self.save(profile)
+
+    def __rotate(self) -> None:
+        names = sorted(name[:-len(SUMMARY_SUFFIX)] for name in os.listdir(self.directory)
+                       if name.endswith(SUMMARY_SUFFIX))
+        for name in names[:max(len(names) - self.keep, 0)]:
+            for suffix in [PROFILE_SUFFIX, SUMMARY_SUFFIX]:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(os.path.join(self.directory, name + suffix))
+
+
+def load_profiles(directory: str, command: str = None, chat_id: str = None) \
+        -> tuple[pstats.Stats | None, list[dict]]:
+    stats = None
+    summaries = []
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(SUMMARY_SUFFIX):
+            continue
+        path = os.path.join(directory, name[:-len(SUMMARY_SUFFIX)])
+        with open(path + SUMMARY_SUFFIX, encoding='utf-8') as file:
+            summary = json.load(file)
+        if (command and summary['command'] != command) or (chat_id and summary['chat_id'] != chat_id):
+            continue
+        if not os.path.exists(path + PROFILE_SUFFIX):
+            continue
+        summaries.append(summary)
+        if stats is None:
+            stats = pstats.Stats(path + PROFILE_SUFFIX, stream=io.StringIO())
+        else:
+            stats.add(path + PROFILE_SUFFIX)
+    return stats, summaries
+
+
+def format_report(stats: pstats.Stats | None, summaries: list[dict], sort: str = SORT_KEYS[0],
+                  limit: int = 30) -> str:
+    if stats is None:
+        return 'No profiles found\n'
+    output = io.StringIO()
+    commands = collections.defaultdict(list)
+    for summary in summaries:
+        commands[(summary['command'], summary['chat_id'])].append(summary)
+    output.write(f'{len(summaries)} sampled commands\n\n')
+    output.write(f'{"command":<12} {"chat":<16} {"samples":>7} {"mean ms":>9} {"max ms":>9} {"peak KiB":>9}\n')
+    for (command, chat_id), samples in sorted(commands.items(),
+                                              key=lambda item: -sum(sample['seconds'] for sample in item[1])):
+        seconds = [sample['seconds'] for sample in samples]
+        output.write(f'{command:<12} {chat_id or "-":<16} {len(samples):>7} '
+                     f'{sum(seconds) / len(seconds) * 1000:>9.1f} {max(seconds) * 1000:>9.1f} '
+                     f'{max(sample["peak_bytes"] for sample in samples) / 1024:>9.1f}\n')
+    allocations = collections.Counter()
+    for summary in summaries:
+        for allocation in summary['allocations']:
+            allocations[allocation['location']] += allocation['size']
+    if allocations:
+        output.write('\nLargest allocation sites (KiB held at the end of sampled commands)\n')
+        for location, size in allocations.most_common(TOP_ALLOCATIONS):
+            output.write(f'{size / 1024:>9.1f}  {location}\n')
+    output.write('\n')
+    stats.stream = output
+    stats.sort_stats(sort).print_stats(limit)
+    return output.getvalue()
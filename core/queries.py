@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import datetime
+
+from peewee import fn, Select, Value
+
+from core.models import Game, BuyIn, CashOut, Balance
+
+
+def sum_balances(games: int | Select = None, user: str = None) \
+        -> list[tuple[int, str, int, int, datetime.datetime | None, datetime.datetime | None]]:
+    buy_ins = BuyIn.select(BuyIn.game.alias('game_id'), BuyIn.user.alias('user'), BuyIn.amount.alias('buy_in'),
+                           Value(0).alias('cash_out'), BuyIn.timestamp.alias('last_buy_in'),
+                           Value(None).alias('last_cash_out'))
+    cash_outs = CashOut.select(CashOut.game.alias('game_id'), CashOut.user.alias('user'), Value(0).alias('buy_in'),
+                               CashOut.amount.alias('cash_out'), Value(None).alias('last_buy_in'),
+                               CashOut.timestamp.alias('last_cash_out'))
+    if games is not None:
+        games = games if isinstance(games, Select) else [games]
+        buy_ins = buy_ins.where(BuyIn.game.in_(games))
+        cash_outs = cash_outs.where(CashOut.game.in_(games))
+    if user is not None:
+        buy_ins = buy_ins.where(BuyIn.user == user)
+        cash_outs = cash_outs.where(CashOut.user == user)
+    actions = (buy_ins + cash_outs).alias('actions')
+    query = (actions.select_from(actions.c.game_id, actions.c.user, fn.SUM(actions.c.buy_in),
+                                 fn.SUM(actions.c.cash_out), fn.MAX(actions.c.last_buy_in),
+                                 fn.MAX(actions.c.last_cash_out))
+             .group_by(actions.c.game_id, actions.c.user))
+    return [(game_id, user, buy_in, cash_out, __parse_timestamp(last_buy_in), __parse_timestamp(last_cash_out))
+            for game_id, user, buy_in, cash_out, last_buy_in, last_cash_out in query.tuples()]
+
+
+def sum_finished_profit_by_chat_and_user(chat_id: str = None) -> list[tuple[str, str, int, int]]:
+    query = (Balance.select(Game.chat_id, Balance.user, fn.SUM(Balance.cash_out - Balance.buy_in),
+                            fn.COUNT(Balance.game.distinct()))
+             .join(Game)
+             .where(Game.is_finished))
+    if chat_id is not None:
+        query = query.where(Game.chat_id == chat_id)
+    return list(query.group_by(Game.chat_id, Balance.user).tuples())
+
+
+def select_unarchived_games(games: int | Select = None) -> Select:
+    query = Game.select(Game.id).where(~Game.is_archived)
+    if games is not None:
+        query = query.where(Game.id.in_(games if isinstance(games, Select) else [games]))
+    return query
+
+
+def __parse_timestamp(value: datetime.datetime | str | None) -> datetime.datetime | None:
+    if value is None or isinstance(value, datetime.datetime):
+        return value
+    return datetime.datetime.fromisoformat(value)
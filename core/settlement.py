@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import heapq
+import time
+
+GREEDY = 'greedy'
+EXACT = 'exact'
+AUTO = 'auto'
+
+EXACT_MAX_PLAYERS = 16
+EXACT_TIME_BUDGET = 0.5
+TIME_CHECK_INTERVAL = 1024
+
+
+class TimeBudgetExceeded(Exception):
+    pass
+
+
+def settle(profits: dict[str, int], mode: str = AUTO, time_budget: float = EXACT_TIME_BUDGET) -> list[dict]:
+    assert mode in (GREEDY, EXACT, AUTO)
+    balances = [(user, profit) for user, profit in profits.items() if profit != 0]
+    if mode == GREEDY or mode == AUTO and len(balances) > EXACT_MAX_PLAYERS:
+        return settle_greedy(balances)
+    try:
+        groups = __find_zero_sum_groups(balances, time.monotonic() + time_budget)
+    except TimeBudgetExceeded:
+        return settle_greedy(balances)
+    transfers = []
+    for group in groups:
+        transfers += settle_greedy(group)
+    return transfers
+
+
+def settle_greedy(balances: list[tuple[str, int]]) -> list[dict]:
+    debtors = [(profit, index, user) for index, (user, profit) in enumerate(balances) if profit < 0]
+    creditors = [(-profit, index, user) for index, (user, profit) in enumerate(balances) if profit > 0]
+    heapq.heapify(debtors)
+    heapq.heapify(creditors)
+    transfers = []
+    while debtors and creditors:
+        debt, debtor_index, debtor = heapq.heappop(debtors)
+        credit, creditor_index, creditor = heapq.heappop(creditors)
+        amount = min(-debt, -credit)
+        transfers.append({
+            'from': debtor,
+            'to': creditor,
+            'amount': amount
+        })
+        if debt + amount < 0:
+            heapq.heappush(debtors, (debt + amount, debtor_index, debtor))
+        if credit + amount < 0:
+            heapq.heappush(creditors, (credit + amount, creditor_index, creditor))
+    return transfers
+
+
+def __find_zero_sum_groups(balances: list[tuple[str, int]], deadline: float) -> list[list[tuple[str, int]]]:
+    players = len(balances)
+    full_mask = (1 << players) - 1
+    sums = [0] * (full_mask + 1)
+    groups = [0] * (full_mask + 1)
+    for mask in range(1, full_mask + 1):
+        if not mask % TIME_CHECK_INTERVAL and time.monotonic() > deadline:
+            raise TimeBudgetExceeded()
+        lowest_bit = mask & -mask
+        sums[mask] = sums[mask ^ lowest_bit] + balances[lowest_bit.bit_length() - 1][1]
+        best = 0
+        remaining = mask
+        while remaining:
+            bit = remaining & -remaining
+            best = max(best, groups[mask ^ bit])
+            remaining ^= bit
+        groups[mask] = best + (sums[mask] == 0)
+
+    order = []
+    mask = full_mask
+    while mask:
+        remaining = mask
+        while remaining:
+            bit = remaining & -remaining
+            if groups[mask ^ bit] + (sums[mask] == 0) == groups[mask]:
+                break
+            remaining ^= bit
+        order.append(bit.bit_length() - 1)
+        mask ^= bit
+
+    result = []
+    group = []
+    total = 0
+    for index in reversed(order):
+        group.append(index)
+        total += balances[index][1]
+        if total == 0:
+            result.append([balances[member] for member in sorted(group)])
+            group = []
+    if group:
+        result.append([balances[member] for member in sorted(group)])
+    return result
@@ -0,0 +1,234 @@
+from __future__ import annotations
+
+import abc
+import datetime
+from typing import ContextManager
+
+import core.analytics
+import core.buy_in
+import core.cash_out
+import core.game
+import core.updates
+from core.models import Game
+from core.settlement import AUTO
+
+SQLITE = 'sqlite'
+MEMORY = 'memory'
+ENGINES = [SQLITE, MEMORY]
+
+
+class Storage(abc.ABC):
+    def start(self) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+    def connect(self, reuse_if_open: bool = False) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+    @abc.abstractmethod
+    def atomic(self, lock_type: str = None) -> ContextManager:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def has_active_games(self, chat_id: str) -> bool:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def start_game(self, chat_id: str) -> None:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def finish_games(self, chat_id: str) -> None:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def add_buy_in(self, chat_id: str, users: list[str], amount: int) -> None:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def has_buy_in(self, chat_id: str, user: str) -> bool:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def calculate_total_buy_in(self, chat_id: str, users: list[str] = ()) -> dict[str, int]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def add_cash_out(self, chat_id: str, user: str, amount: int) -> None:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def calculate_total_cash_out(self, chat_id: str, user: str = None) -> int | dict[str, int]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def calculate_profit(self, chat_id: str, user: str = None) -> int | dict[str, int]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def calculate_total_profit_in_all_finished_games(self, chat_id: str) -> dict[str, int]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def calculate_active_players(self, chat_id: str) -> list[str]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def calculate_bank_size(self, chat_id: str) -> int:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def calculate_money_transfers(self, chat_id: str, mode: str = AUTO) -> list[dict]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def has_actions(self, chat_id: str) -> bool:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def has_undone_actions(self, chat_id: str) -> bool:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def undo_last_actions(self, chat_id: str, count: int = 1) -> list[dict[str, str | int]]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def redo_undone_actions(self, chat_id: str, count: int = 1) -> list[dict[str, str | int]]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_user_stats(self, chat_id: str, start: datetime.date = None, end: datetime.date = None) \
+            -> list[tuple[str, int, int, int, int, int]]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_monthly_trend(self, chat_id: str, start: datetime.date = None, end: datetime.date = None) \
+            -> list[tuple[str, str, int, int]]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def record_update(self, update_id: int) -> None:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def is_update_processed(self, update_id: int) -> bool:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def last_processed_update(self) -> int | None:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def prune_processed_updates(self, before: datetime.datetime) -> int:
+        raise NotImplementedError
+
+
+class SqliteStorage(Storage):
+    def __init__(self, path: str = None):
+        self.path = path
+
+    def start(self) -> None:
+        from core.database import bootstrap
+
+        if self.path is not None:
+            bootstrap(self.path)
+
+    @property
+    def database(self):
+        return Game._meta.database
+
+    def connect(self, reuse_if_open: bool = False) -> None:
+        self.database.connect(reuse_if_open=reuse_if_open)
+
+    def close(self) -> None:
+        if not self.database.is_closed():
+            self.database.close()
+
+    def atomic(self, lock_type: str = None) -> ContextManager:
+        return self.database.atomic(lock_type)
+
+    def has_active_games(self, chat_id: str) -> bool:
+        return core.game.has_active_games(chat_id)
+
+    def start_game(self, chat_id: str) -> None:
+        core.game.start_game(chat_id)
+
+    def finish_games(self, chat_id: str) -> None:
+        core.game.finish_games(chat_id)
+
+    def add_buy_in(self, chat_id: str, users: list[str], amount: int) -> None:
+        core.buy_in.add_buy_in(chat_id, users, amount)
+
+    def has_buy_in(self, chat_id: str, user: str) -> bool:
+        return core.buy_in.has_buy_in(chat_id, user)
+
+    def calculate_total_buy_in(self, chat_id: str, users: list[str] = ()) -> dict[str, int]:
+        return core.buy_in.calculate_total_buy_in(chat_id, users)
+
+    def add_cash_out(self, chat_id: str, user: str, amount: int) -> None:
+        core.cash_out.add_cash_out(chat_id, user, amount)
+
+    def calculate_total_cash_out(self, chat_id: str, user: str = None) -> int | dict[str, int]:
+        return core.cash_out.calculate_total_cash_out(chat_id, user)
+
+    def calculate_profit(self, chat_id: str, user: str = None) -> int | dict[str, int]:
+        return core.game.calculate_profit(chat_id, user)
+
+    def calculate_total_profit_in_all_finished_games(self, chat_id: str) -> dict[str, int]:
+        return core.game.calculate_total_profit_in_all_finished_games(chat_id)
+
+    def calculate_active_players(self, chat_id: str) -> list[str]:
+        return core.game.calculate_active_players(chat_id)
+
+    def calculate_bank_size(self, chat_id: str) -> int:
+        return core.game.calculate_bank_size(chat_id)
+
+    def calculate_money_transfers(self, chat_id: str, mode: str = AUTO) -> list[dict]:
+        return core.game.calculate_money_transfers(chat_id, mode)
+
+    def has_actions(self, chat_id: str) -> bool:
+        return core.game.has_actions(chat_id)
+
+    def has_undone_actions(self, chat_id: str) -> bool:
+        return core.game.has_undone_actions(chat_id)
+
+    def undo_last_actions(self, chat_id: str, count: int = 1) -> list[dict[str, str | int]]:
+        return core.game.undo_last_actions(chat_id, count)
+
+    def redo_undone_actions(self, chat_id: str, count: int = 1) -> list[dict[str, str | int]]:
+        return core.game.redo_undone_actions(chat_id, count)
+
+    def get_user_stats(self, chat_id: str, start: datetime.date = None, end: datetime.date = None) \
+            -> list[tuple[str, int, int, int, int, int]]:
+        return core.analytics.get_user_stats(chat_id, start, end)
+
+    def get_monthly_trend(self, chat_id: str, start: datetime.date = None, end: datetime.date = None) \
+            -> list[tuple[str, str, int, int]]:
+        return core.analytics.get_monthly_trend(chat_id, start, end)
+
+    def record_update(self, update_id: int) -> None:
+        core.updates.record_update(update_id)
+
+    def is_update_processed(self, update_id: int) -> bool:
+        return core.updates.is_update_processed(update_id)
+
+    def last_processed_update(self) -> int | None:
+        return core.updates.last_processed_update()
+
+    def prune_processed_updates(self, before: datetime.datetime) -> int:
+        return core.updates.prune_processed_updates(before)
+
+
+def create_storage(engine: str, path: str = None, snapshot_interval: float = None) -> Storage:
+    assert engine in ENGINES, f'Unknown storage engine {engine}'
+    if engine == MEMORY:
+        from core.memory_storage import MemoryStorage
+
+        return MemoryStorage(path, snapshot_interval)
+    return SqliteStorage(path)
@@ -0,0 +1,23 @@
+from __future__ import annotations
+
+import datetime
+
+from peewee import fn
+
+from core.models import ProcessedUpdate
+
+
+def record_update(update_id: int) -> None:
+    ProcessedUpdate.insert(update_id=update_id, processed_at=datetime.datetime.now()).on_conflict_ignore().execute()
+
+
+def is_update_processed(update_id: int) -> bool:
+    return ProcessedUpdate.select().where(ProcessedUpdate.update_id == update_id).exists()
+
+
+def last_processed_update() -> int | None:
+    return ProcessedUpdate.select(fn.MAX(ProcessedUpdate.update_id)).scalar()
+
+
+def prune_processed_updates(before: datetime.datetime) -> int:
+    return ProcessedUpdate.delete().where(ProcessedUpdate.processed_at < before).execute()
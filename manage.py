@@ -0,0 +1,149 @@
+import argparse
+import datetime
+import os
+import sys
+
+import core.action_log
+import core.analytics
+import core.archive
+import core.balance
+import core.database
+import core.history
+import core.leaderboard
+import core.migrations
+import core.profiling
+
+DEFAULT_ARCHIVE_AGE_DAYS = 365
+
+
+def migrate(_: argparse.Namespace) -> None:
+    applied = core.migrations.migrate(core.database.db)
+    if not applied:
+        print(f'Schema is up to date (version {core.migrations.get_schema_version()})')
+        return
+    for number in applied:
+        print(f'Applied migration {number}')
+
+
+def check_balances(args: argparse.Namespace) -> None:
+    drift = core.balance.rebuild_balances() if args.rebuild else core.balance.check_balances()
+    for game_id, user, expected, actual in drift:
+        print(f'game {game_id} {user}: expected {expected}, stored {actual}')
+    print(f'{len(drift)} drifted balances' + (' rebuilt' if args.rebuild else ''))
+
+
+def backfill_leaderboard(args: argparse.Namespace) -> None:
+    rows = core.leaderboard.rebuild_lifetime_totals(args.chat)
+    print(f'Rebuilt {rows} lifetime totals')
+
+
+def export_history(args: argparse.Namespace) -> None:
+    archive_path = args.archive or core.archive.default_archive_path(args.db)
+    if args.archive is None and not os.path.exists(archive_path):
+        archive_path = None
+    with open(args.file, 'w', newline='', encoding='utf-8') if args.file != '-' else __stdout() as file:
+        stats = core.history.export_history(file, args.format, args.chat, archive_path)
+    __report(f"Exported {stats['rows']} rows", stats)
+    if stats['skipped_games']:
+        print(f"WARNING: {stats['skipped_games']} archived games were not exported, "
+              f"pass --archive to read them from the archive database", file=sys.stderr)
+
+
+def import_history(args: argparse.Namespace) -> None:
+    with open(args.file, newline='', encoding='utf-8') as file:
+        stats = core.history.import_history(file, args.format, args.batch_size)
+    __report(f"Imported {stats['imported']} of {stats['rows']} rows into {stats['games']} new games, "
+             f"skipped {stats['skipped']} rows already present", stats)
+
+
+def __stdout():
+    return open(sys.stdout.fileno(), 'w', newline='', encoding='utf-8', closefd=False)
+
+
+def __report(message: str, stats: dict) -> None:
+    rate = stats['rows'] / stats['seconds'] if stats['seconds'] else 0
+    print(f"{message} in {stats['seconds']:.2f}s ({rate:.0f} rows/s)", file=sys.stderr)
+
+
+def rebuild_analytics(args: argparse.Namespace) -> None:
+    rows = core.analytics.rebuild_analytics(args.chat)
+    print(f'Rebuilt {rows} game results')
+
+
+def rebuild_ledger(args: argparse.Namespace) -> None:
+    actions = core.action_log.rebuild_ledger(args.game)
+    print(f'Replayed {actions} actions')
+
+
+def archive(args: argparse.Namespace) -> None:
+    before = (datetime.datetime.combine(args.before, datetime.time()) if args.before
+              else datetime.datetime.now() - datetime.timedelta(days=args.older_than_days))
+    path = args.archive or core.archive.default_archive_path(args.db)
+    stats = core.archive.archive_games(path, before, args.batch_size)
+    print(f"Archived {stats['games']} games finished before {before:%Y-%m-%d %H:%M} to {path} "
+          f"({stats['action']} actions, {stats['buyin']} buy-ins, {stats['cashout']} cash-outs)")
+    if args.vacuum != core.archive.NONE:
+        print(f'Vacuum freed {core.archive.vacuum(args.vacuum)} bytes')
+
+
+def profile_report(args: argparse.Namespace) -> None:
+    stats, summaries = core.profiling.load_profiles(args.directory, args.command, args.chat)
+    print(core.profiling.format_report(stats, summaries, args.sort, args.limit), end='')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='PokerBot maintenance commands')
+    parser.add_argument('--db', default=os.getenv('POKER_BOT_DB_PATH', core.database.DEFAULT_PATH),
+                        help='database file')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('migrate', help='upgrade database schema').set_defaults(handler=migrate)
+    check = commands.add_parser('check-balances', help='compare stored balances with buy-ins and cash-outs')
+    check.add_argument('--rebuild', action='store_true', help='rebuild drifted balances')
+    check.set_defaults(handler=check_balances)
+    backfill = commands.add_parser('backfill-leaderboard', help='rebuild lifetime totals from finished games')
+    backfill.add_argument('--chat', help='only rebuild this chat')
+    backfill.set_defaults(handler=backfill_leaderboard)
+    analytics = commands.add_parser('rebuild-analytics', help='rebuild per-game and per-month rollups')
+    analytics.add_argument('--chat', help='only rebuild this chat')
+    analytics.set_defaults(handler=rebuild_analytics)
+    rebuild = commands.add_parser('rebuild-ledger', help='rebuild buy-ins, cash-outs and balances from the action log')
+    rebuild.add_argument('--game', type=int, help='only rebuild this game')
+    rebuild.set_defaults(handler=rebuild_ledger)
+    export = commands.add_parser('export', help='stream game history to a CSV or JSONL file')
+    export.add_argument('file', help="output file, '-' for stdout")
+    export.add_argument('--format', choices=core.history.FORMATS, default=core.history.CSV)
+    export.add_argument('--chat', help='only export this chat')
+    export.add_argument('--archive', help='archive database to read archived games from, <db>-archive.db by default')
+    export.set_defaults(handler=export_history)
+    load = commands.add_parser('import', help='import game history from a CSV or JSONL file')
+    load.add_argument('file')
+    load.add_argument('--format', choices=core.history.FORMATS, default=core.history.CSV)
+    load.add_argument('--batch-size', type=int, default=core.history.IMPORT_BATCH_SIZE)
+    load.set_defaults(handler=import_history)
+    compact = commands.add_parser('archive', help='move raw actions of old finished games to an archive database')
+    cutoff = compact.add_mutually_exclusive_group()
+    cutoff.add_argument('--before', type=datetime.date.fromisoformat, help='archive games finished before YYYY-MM-DD')
+    cutoff.add_argument('--older-than-days', type=int, default=DEFAULT_ARCHIVE_AGE_DAYS,
+                        help='archive games finished this many days ago')
+    compact.add_argument('--archive', help='archive database file, <db>-archive.db by default')
+    compact.add_argument('--vacuum', choices=core.archive.VACUUM_MODES, default=core.archive.INCREMENTAL)
+    compact.add_argument('--batch-size', type=int, default=core.archive.ARCHIVE_BATCH_SIZE)
+    compact.set_defaults(handler=archive)
+    report = commands.add_parser('profile-report', help='merge sampled command profiles into a hot-path report')
+    report.add_argument('directory', nargs='?', default=os.getenv('POKER_BOT_PROFILE_DIR',
+                                                                  core.profiling.DEFAULT_DIRECTORY))
+    report.add_argument('--command', help='only merge profiles of this command')
+    report.add_argument('--chat', help='only merge profiles of this chat')
+    report.add_argument('--sort', choices=core.profiling.SORT_KEYS, default=core.profiling.SORT_KEYS[0])
+    report.add_argument('--limit', type=int, default=30, help='functions to show')
+    report.set_defaults(handler=profile_report)
+    args = parser.parse_args()
+    core.database.init_database(args.db)
+    try:
+        args.handler(args)
+    finally:
+        core.database.close_database()
+
+
+if __name__ == '__main__':
+    main()
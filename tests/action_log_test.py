@@ -0,0 +1,107 @@
+import datetime
+
+from core.action_log import backfill_actions, rebuild_ledger, undo_actions, redo_actions
+from core.balance import check_balances, get_balances
+from core.buy_in import add_buy_in, calculate_total_buy_in
+from core.cash_out import add_cash_out
+from core.game import start_game, undo_last_actions, redo_undone_actions, has_undone_actions, has_actions, \
+    calculate_bank_size
+from core.models import Game, BuyIn, CashOut, Action, Balance
+from tests.base import BaseTestCase
+
+CHAT_ID = '123'
+
+
+class ActionLogTestCase(BaseTestCase):
+    def models(self):
+        return [Game, BuyIn, CashOut, Action, Balance]
+
+    def setUp(self):
+        super().setUp()
+        start_game(CHAT_ID)
+        self.game = Game.get(chat_id=CHAT_ID, is_finished=False)
+        add_buy_in(CHAT_ID, ['user1', 'user2', 'user3'], 500)
+        add_buy_in(CHAT_ID, ['user1'], 1000)
+        add_cash_out(CHAT_ID, 'user2', 800)
+
+    def test_actions_get_sequence_numbers(self):
+        self.assertEqual(
+            [(1, 'buy_in', 'user1'), (2, 'buy_in', 'user2'), (3, 'buy_in', 'user3'), (4, 'buy_in', 'user1'),
+             (5, 'cash_out', 'user2')],
+            [(action.seq, action.type, action.user) for action in Action.select().order_by(Action.seq)]
+        )
+        self.assertEqual([1, 2, 3, 4], [buy_in.seq for buy_in in BuyIn.select().order_by(BuyIn.id)])
+
+    def test_undo_bulk_buy_in_with_equal_timestamps(self):
+        self.assertEqual(['user2', 'user1'], [result['user'] for result in undo_last_actions(CHAT_ID, 2)])
+        results = undo_last_actions(CHAT_ID, 2)
+        self.assertEqual([('buy_in', 'user3', 500), ('buy_in', 'user2', 500)],
+                         [(result['type'], result['user'], result['amount']) for result in results])
+        self.assertEqual({'user1': 500}, calculate_total_buy_in(CHAT_ID))
+        self.assertEqual([], check_balances())
+
+    def test_undo_more_actions_than_logged(self):
+        self.assertEqual(5, len(undo_last_actions(CHAT_ID, 10)))
+        self.assertFalse(has_actions(CHAT_ID))
+        self.assertEqual(0, calculate_bank_size(CHAT_ID))
+        self.assertEqual([], get_balances(self.game))
+
+    def test_redo(self):
+        undo_last_actions(CHAT_ID, 3)
+        self.assertTrue(has_undone_actions(CHAT_ID))
+        self.assertEqual([('buy_in', 'user3'), ('buy_in', 'user1')],
+                         [(result['type'], result['user']) for result in redo_undone_actions(CHAT_ID, 2)])
+        self.assertEqual(2500, calculate_bank_size(CHAT_ID))
+        redo_undone_actions(CHAT_ID)
+        self.assertFalse(has_undone_actions(CHAT_ID))
+        self.assertEqual([], redo_undone_actions(CHAT_ID))
+        self.assertEqual(1700, calculate_bank_size(CHAT_ID))
+        self.assertEqual([], check_balances())
+
+    def test_new_action_discards_undone_actions(self):
+        undo_last_actions(CHAT_ID, 2)
+        add_cash_out(CHAT_ID, 'user3', 100)
+        self.assertFalse(has_undone_actions(CHAT_ID))
+        self.assertEqual([(4, 'cash_out', 'user3')],
+                         [(action.seq, action.type, action.user)
+                          for action in Action.select().where(Action.seq > 3)])
+
+    def test_undo_and_redo_use_log_order(self):
+        actions = undo_actions(self.game.id, 5)
+        self.assertEqual([5, 4, 3, 2, 1], [action.seq for action in actions])
+        self.assertEqual([1, 2, 3, 4, 5], [action.seq for action in redo_actions(self.game.id, 5)])
+        self.assertEqual([], undo_actions(Game.create(chat_id='other', is_finished=False).id))
+
+    def test_rebuild_ledger_from_log(self):
+        undo_last_actions(CHAT_ID)
+        BuyIn.delete().execute()
+        CashOut.create(game=self.game, user='user4', amount=100)
+        self.assertEqual(4, rebuild_ledger(self.game.id))
+        self.assertEqual({'user1': 1500, 'user2': 500, 'user3': 500}, calculate_total_buy_in(CHAT_ID))
+        self.assertEqual(0, CashOut.select().count())
+        self.assertEqual([], check_balances())
+
+    def test_backfill_orders_by_timestamp(self):
+        game = Game.create(chat_id='legacy', is_finished=True)
+        timestamp = datetime.datetime(2023, 1, 1, 20)
+        CashOut.create(game=game, user='user1', amount=600, timestamp=timestamp + datetime.timedelta(hours=1))
+        BuyIn.create(game=game, user='user2', amount=500, timestamp=timestamp)
+        BuyIn.create(game=game, user='user1', amount=500, timestamp=timestamp)
+        self.assertEqual(3, backfill_actions())
+        self.assertEqual([(1, 'buy_in', 'user2'), (2, 'buy_in', 'user1'), (3, 'cash_out', 'user1')],
+                         [(action.seq, action.type, action.user)
+                          for action in Action.select().where(Action.game == game).order_by(Action.seq)])
+        self.assertEqual(0, backfill_actions())
+
+    def test_backfill_assigns_sequence_numbers_in_bulk(self):
+        game = Game.create(chat_id='legacy', is_finished=True)
+        timestamp = datetime.datetime(2023, 1, 1, 20)
+        for index in range(250):
+            BuyIn.create(game=game, user=f'user{index}', amount=100, timestamp=timestamp)
+            CashOut.create(game=game, user=f'user{index}', amount=100, timestamp=timestamp)
+        with self.assertMaxQueries(6):
+            self.assertEqual(500, backfill_actions())
+        self.assertEqual(0, BuyIn.select().where(BuyIn.seq.is_null()).count()
+                         + CashOut.select().where(CashOut.seq.is_null()).count())
+        self.assertEqual(list(range(1, 501)), sorted(row.seq for model in [BuyIn, CashOut]
+                                                     for row in model.select().where(model.game == game)))
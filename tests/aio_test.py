@@ -0,0 +1,87 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+from peewee import SqliteDatabase
+
+from core.aio import DatabaseExecutor, current_update
+from core.buy_in import add_buy_in
+from core.cache import active_games
+from core.game import start_game, calculate_bank_size
+from core.migrations import migrate, MODELS
+from core.updates import is_update_processed
+
+CHAT_ID = '123'
+OTHER_CHAT_ID = '234'
+
+
+class DatabaseExecutorTestCase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.test_db = SqliteDatabase(os.path.join(self.directory.name, 'poker.db'), check_same_thread=False)
+        self.test_db.bind(MODELS, bind_refs=True, bind_backrefs=True)
+        migrate(self.test_db)
+        self.test_db.close()
+        active_games.clear()
+        self.executor = DatabaseExecutor(pool_size=2, database=self.test_db)
+
+    def tearDown(self):
+        self.executor.shutdown()
+        self.directory.cleanup()
+
+    async def test_run_core_functions_off_event_loop(self):
+        await self.executor.run(start_game, CHAT_ID)
+        await self.executor.run(add_buy_in, CHAT_ID, ['user1', 'user2'], 500)
+        self.assertEqual(1000, await self.executor.run(calculate_bank_size, CHAT_ID))
+        self.assertIsNot(threading.current_thread(), await self.executor.run(threading.current_thread))
+        self.assertTrue(self.test_db.is_closed())
+
+    async def test_transaction_rolls_back_failed_command(self):
+        await self.executor.run(start_game, CHAT_ID)
+
+        def failing_command():
+            add_buy_in(CHAT_ID, ['user1'], 500)
+            raise ValueError()
+
+        with self.assertRaises(ValueError):
+            await self.executor.transaction(failing_command, immediate=True)
+        self.assertEqual(0, await self.executor.transaction(calculate_bank_size, CHAT_ID))
+
+    async def test_write_transaction_records_current_update(self):
+        await self.executor.run(start_game, CHAT_ID)
+
+        def failing_command():
+            add_buy_in(CHAT_ID, ['user1'], 500)
+            raise ValueError()
+
+        current_update.set(1)
+        await self.executor.transaction(calculate_bank_size, CHAT_ID)
+        current_update.set(2)
+        with self.assertRaises(ValueError):
+            await self.executor.transaction(failing_command, immediate=True)
+        current_update.set(3)
+        await self.executor.transaction(add_buy_in, CHAT_ID, ['user1'], 500, immediate=True)
+        self.assertEqual([False, False, True],
+                         [await self.executor.run(is_update_processed, update_id) for update_id in [1, 2, 3]])
+
+    async def test_failed_command_keeps_other_chats_cached(self):
+        await self.executor.run(start_game, CHAT_ID)
+        await self.executor.run(active_games.get, CHAT_ID)
+
+        def failing_command():
+            start_game(OTHER_CHAT_ID)
+            active_games.get(OTHER_CHAT_ID)
+            raise ValueError()
+
+        with self.assertRaises(ValueError):
+            await self.executor.transaction(failing_command)
+        self.assertEqual(1, active_games.stats()['size'])
+        self.assertIsNone(await self.executor.run(active_games.lookup, OTHER_CHAT_ID))
+
+    async def test_shutdown_closes_worker_connections(self):
+        await self.executor.run(start_game, CHAT_ID)
+        connection = await self.executor.run(self.test_db.connection)
+        self.executor.shutdown()
+        self.assertRaisesRegex(sqlite3.ProgrammingError, 'closed', lambda: connection.execute('SELECT 1'))
@@ -0,0 +1,83 @@
+import datetime
+
+from core.analytics import get_user_stats, get_monthly_trend, rebuild_analytics, backfill_finished_at
+from core.buy_in import add_buy_in
+from core.cash_out import add_cash_out
+from core.game import start_game, finish_games
+from core.models import Game, BuyIn, CashOut, Action, Balance, LifetimeTotal, GameResult, MonthlyResult
+from tests.base import BaseTestCase, play_game
+
+CHAT_ID_1 = '1234'
+CHAT_ID_2 = '2345'
+CHAT_ID_3 = '3456'
+
+
+class AnalyticsTestCase(BaseTestCase):
+    def models(self):
+        return [Game, BuyIn, CashOut, Action, Balance, LifetimeTotal, GameResult, MonthlyResult]
+
+    def setUp(self):
+        super().setUp()
+        play_game(CHAT_ID_1, {'user1': (500, 900), 'user2': (500, 100)}, datetime.datetime(2024, 1, 10))
+        play_game(CHAT_ID_1, {'user1': (1000, 0), 'user2': (300, 1300)}, datetime.datetime(2024, 1, 20))
+        play_game(CHAT_ID_1, {'user1': (200, 500), 'user3': (300, 0)}, datetime.datetime(2024, 2, 5))
+        play_game(CHAT_ID_2, {'user1': (200, 400), 'user2': (200, 0)}, datetime.datetime(2024, 2, 5))
+
+    def test_user_stats(self):
+        self.assertEqual(
+            [
+                ('user2', 2, 800, 600, 1000, -400),
+                ('user1', 3, 1700, -300, 400, -1000),
+                ('user3', 1, 300, -300, -300, -300),
+            ],
+            get_user_stats(CHAT_ID_1)
+        )
+
+    def test_user_stats_in_date_range(self):
+        self.assertEqual(
+            [('user2', 1, 300, 1000, 1000, 1000), ('user1', 1, 1000, -1000, -1000, -1000)],
+            get_user_stats(CHAT_ID_1, datetime.date(2024, 1, 15), datetime.date(2024, 1, 20))
+        )
+        self.assertEqual([('user1', 1, 200, 300, 300, 300), ('user3', 1, 300, -300, -300, -300)],
+                         get_user_stats(CHAT_ID_1, start=datetime.date(2024, 2, 1)))
+
+    def test_monthly_trend(self):
+        self.assertEqual(
+            [('2024-01', 'user2', 2, 600), ('2024-01', 'user1', 2, -600), ('2024-02', 'user1', 1, 300),
+             ('2024-02', 'user3', 1, -300)],
+            get_monthly_trend(CHAT_ID_1)
+        )
+        self.assertEqual([('2024-02', 'user1', 1, 200), ('2024-02', 'user2', 1, -200)],
+                         get_monthly_trend(CHAT_ID_2, end=datetime.date(2024, 2, 29)))
+
+    def test_finish_games_updates_rollups(self):
+        for cash_out in [1000, 200]:
+            start_game(CHAT_ID_3)
+            add_buy_in(CHAT_ID_3, ['user1', 'user2'], 500)
+            add_cash_out(CHAT_ID_3, 'user1', cash_out)
+            add_cash_out(CHAT_ID_3, 'user2', 1000 - cash_out)
+            finish_games(CHAT_ID_3)
+        self.assertEqual([('user1', 2, 1000, 200, 500, -300), ('user2', 2, 1000, -200, 300, -500)],
+                         get_user_stats(CHAT_ID_3))
+        self.assertEqual(4, GameResult.select().where(GameResult.chat_id == CHAT_ID_3).count())
+
+    def test_rebuild_matches_incremental_rollups(self):
+        expected = self.__rollups()
+        MonthlyResult.delete().execute()
+        GameResult.delete().where(GameResult.chat_id == CHAT_ID_2).execute()
+        self.assertEqual(8, rebuild_analytics())
+        self.assertEqual(expected, self.__rollups())
+
+    def test_backfill_finished_at_from_last_action(self):
+        Game.update(finished_at=None).execute()
+        self.assertEqual(4, backfill_finished_at())
+        game = Game.select().order_by(Game.id).first()
+        self.assertEqual(Action.select().where(Action.game == game).order_by(Action.seq.desc()).first().timestamp,
+                         game.finished_at)
+
+    @staticmethod
+    def __rollups():
+        return (sorted(GameResult.select(GameResult.game, GameResult.user, GameResult.profit,
+                                         GameResult.finished_at).tuples()),
+                sorted(MonthlyResult.select(MonthlyResult.chat_id, MonthlyResult.month, MonthlyResult.user,
+                                            MonthlyResult.games, MonthlyResult.profit).tuples()))
@@ -0,0 +1,162 @@
+import contextlib
+import datetime
+import io
+import os
+import tempfile
+from typing import Iterator
+
+from peewee import SqliteDatabase
+
+from core.action_log import rebuild_ledger
+from core.analytics import get_user_stats, get_monthly_trend, rebuild_analytics
+from core.archive import archive_games, vacuum, default_archive_path, FULL, INCREMENTAL
+from core.balance import check_balances, rebuild_balances
+from core.cache import active_games
+from core.buy_in import add_buy_in
+from core.game import start_game, calculate_total_profit_in_all_finished_games, calculate_bank_size
+from core.history import export_history, import_history, CSV
+from core.leaderboard import rebuild_lifetime_totals
+from core.models import Game, BuyIn, CashOut, Action, Balance, LifetimeTotal, GameResult, MonthlyResult
+from tests.base import BaseTestCase, play_game
+
+CHAT_ID_1 = '1234'
+CHAT_ID_2 = '2345'
+CUTOFF = datetime.datetime(2024, 3, 1)
+
+
+class ArchiveTestCase(BaseTestCase):
+    def models(self):
+        return [Game, BuyIn, CashOut, Action, Balance, LifetimeTotal, GameResult, MonthlyResult]
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.archive_path = os.path.join(self.directory.name, 'poker-archive.db')
+        play_game(CHAT_ID_1, {'user1': (500, 900), 'user2': (500, 100)}, datetime.datetime(2024, 1, 10))
+        play_game(CHAT_ID_1, {'user1': (1000, 0), 'user3': (300, 1300)}, datetime.datetime(2024, 2, 20))
+        play_game(CHAT_ID_2, {'user1': (200, 400), 'user2': (200, 0)}, datetime.datetime(2024, 2, 5))
+        play_game(CHAT_ID_1, {'user2': (700, 300), 'user3': (100, 500)}, datetime.datetime(2024, 4, 5))
+        start_game(CHAT_ID_1)
+        add_buy_in(CHAT_ID_1, ['user1', 'user2'], 300)
+
+    def tearDown(self):
+        super().tearDown()
+        self.directory.cleanup()
+
+    def test_statistics_are_unchanged(self):
+        expected = self.__statistics()
+        self.assertEqual({'games': 3, 'action': 12, 'buyin': 6, 'cashout': 6},
+                         archive_games(self.archive_path, CUTOFF))
+        self.assertEqual(expected, self.__statistics())
+        self.assertEqual(600, calculate_bank_size(CHAT_ID_1))
+
+    def test_raw_rows_are_moved_to_archive(self):
+        archived = [game.id for game in Game.select().where(Game.finished_at < CUTOFF)]
+        archive_games(self.archive_path, CUTOFF, batch_size=2)
+        for model, remaining in [(Action, 6), (BuyIn, 4), (CashOut, 2)]:
+            self.assertEqual(0, model.select().where(model.game.in_(archived)).count())
+            self.assertEqual(remaining, model.select().count())
+        self.assertEqual(archived, [game.id for game in Game.select().where(Game.is_archived)])
+        self.assertEqual(6, Balance.select().where(Balance.game.in_(archived)).count())
+        archive = SqliteDatabase(self.archive_path)
+        with archive.bind_ctx([Game, Action, BuyIn, CashOut]):
+            self.assertEqual(archived, [game.id for game in Game.select().order_by(Game.id)])
+            self.assertEqual(12, Action.select().count())
+            self.assertEqual(2700, sum(buy_in.amount for buy_in in BuyIn.select()))
+        archive.close()
+
+    def test_rebuilds_keep_archived_games(self):
+        expected = self.__statistics()
+        archive_games(self.archive_path, CUTOFF)
+        self.assertEqual([], check_balances())
+        self.assertEqual([], rebuild_balances())
+        rebuild_lifetime_totals()
+        rebuild_analytics()
+        self.assertEqual(6, rebuild_ledger())
+        self.assertEqual(expected, self.__statistics())
+
+    def test_archived_game_is_not_rebuilt(self):
+        archive_games(self.archive_path, CUTOFF)
+        game = Game.select().where(Game.is_archived).first()
+        balances = list(Balance.select().where(Balance.game == game).tuples())
+        self.assertEqual(0, rebuild_ledger(game.id))
+        self.assertEqual([], rebuild_balances(game.id))
+        self.assertEqual(balances, list(Balance.select().where(Balance.game == game).tuples()))
+
+    def test_export_reads_archived_actions(self):
+        expected = io.StringIO()
+        export_history(expected, CSV)
+        archive_games(self.archive_path, CUTOFF)
+        exported = io.StringIO()
+        self.assertEqual(0, export_history(exported, CSV, archive_path=self.archive_path)['skipped_games'])
+        self.assertEqual(expected.getvalue(), exported.getvalue())
+        stats = export_history(io.StringIO(), CSV, CHAT_ID_1)
+        self.assertEqual((6, 2), (stats['rows'], stats['skipped_games']))
+
+    def test_import_skips_archived_games(self):
+        archive_games(self.archive_path, CUTOFF)
+        expected = self.__statistics()
+        exported = io.StringIO()
+        export_history(exported, CSV, CHAT_ID_1, archive_path=self.archive_path)
+        exported.seek(0)
+        stats = import_history(exported, CSV)
+        self.assertEqual((14, 0, 0), (stats['rows'], stats['imported'], stats['games']))
+        self.assertEqual(6, Action.select().count())
+        self.assertEqual(expected, self.__statistics())
+        self.assertEqual(14, export_history(io.StringIO(), CSV, CHAT_ID_1, archive_path=self.archive_path)['rows'])
+
+    def test_archiving_again_is_noop(self):
+        archive_games(self.archive_path, CUTOFF)
+        expected = self.__statistics()
+        self.assertEqual({'games': 0, 'action': 0, 'buyin': 0, 'cashout': 0},
+                         archive_games(self.archive_path, datetime.datetime(2024, 3, 2)))
+        self.assertEqual(1, archive_games(self.archive_path, datetime.datetime(2024, 5, 1))['games'])
+        self.assertEqual(expected, self.__statistics())
+
+    def test_full_vacuum(self):
+        with self.__disk_database() as database:
+            page_count = database.pragma('page_count')
+            self.assertGreater(vacuum(FULL), 0)
+            self.assertLess(database.pragma('page_count'), page_count)
+            self.assertEqual(0, database.pragma('freelist_count'))
+            self.assertEqual(600, calculate_bank_size(CHAT_ID_1))
+
+    def test_incremental_vacuum(self):
+        with self.__disk_database() as database:
+            self.assertGreater(vacuum(INCREMENTAL), 0)
+            self.assertEqual(2, database.pragma('auto_vacuum'))
+            self.__play_old_games(CHAT_ID_2)
+            archive_games(self.archive_path, CUTOFF)
+            page_count = database.pragma('page_count')
+            self.assertGreater(database.pragma('freelist_count'), 1)
+            self.assertGreater(vacuum(INCREMENTAL), 0)
+            self.assertLess(database.pragma('page_count'), page_count)
+            self.assertEqual(0, database.pragma('freelist_count'))
+            self.assertEqual(600, calculate_bank_size(CHAT_ID_1))
+
+    def test_default_archive_path(self):
+        self.assertEqual('data/poker-archive.db', default_archive_path('data/poker.db'))
+        self.assertEqual('poker-archive.db', default_archive_path('poker'))
+
+    @staticmethod
+    def __statistics():
+        return [(calculate_total_profit_in_all_finished_games(chat_id), get_user_stats(chat_id),
+                 get_monthly_trend(chat_id)) for chat_id in [CHAT_ID_1, CHAT_ID_2]]
+
+    @contextlib.contextmanager
+    def __disk_database(self) -> Iterator[SqliteDatabase]:
+        database = SqliteDatabase(os.path.join(self.directory.name, 'poker.db'))
+        with database.bind_ctx(self.models()), database.connection_context():
+            database.create_tables(self.models())
+            active_games.clear()
+            self.__play_old_games(CHAT_ID_1)
+            start_game(CHAT_ID_1)
+            add_buy_in(CHAT_ID_1, ['user1', 'user2'], 300)
+            archive_games(self.archive_path, CUTOFF)
+            yield database
+        active_games.clear()
+
+    @staticmethod
+    def __play_old_games(chat_id: str) -> None:
+        for day in range(1, 4):
+            play_game(chat_id, {f'user{index}': (100, 100) for index in range(60)}, datetime.datetime(2024, 1, day))
@@ -0,0 +1,53 @@
+from core.balance import check_balances, rebuild_balances, get_balances
+from core.buy_in import add_buy_in
+from core.cash_out import add_cash_out
+from core.game import start_game, undo_last_action
+from core.models import Game, BuyIn, CashOut, Action, Balance
+from tests.base import BaseTestCase
+
+CHAT_ID = '123'
+
+
+class BalanceTestCase(BaseTestCase):
+    def models(self):
+        return [Game, BuyIn, CashOut, Action, Balance]
+
+    def setUp(self):
+        super().setUp()
+        start_game(CHAT_ID)
+        self.game = Game.get(chat_id=CHAT_ID, is_finished=False)
+        add_buy_in(CHAT_ID, ['user1', 'user2'], 500)
+        add_buy_in(CHAT_ID, ['user1'], 1000)
+        add_cash_out(CHAT_ID, 'user2', 800)
+
+    def test_balances_follow_actions(self):
+        self.assertEqual(
+            [('user1', 1500, 0), ('user2', 500, 800)],
+            [(user, buy_in, cash_out) for user, buy_in, cash_out, _, _ in get_balances(self.game)]
+        )
+        self.assertEqual([], check_balances())
+
+    def test_balances_follow_undo(self):
+        undo_last_action(CHAT_ID)
+        undo_last_action(CHAT_ID)
+        self.assertEqual(
+            [('user1', 500, 0, True), ('user2', 500, 0, True)],
+            [(user, buy_in, cash_out, last_cash_out is None)
+             for user, buy_in, cash_out, _, last_cash_out in get_balances(self.game)]
+        )
+        self.assertEqual([], check_balances())
+
+    def test_check_balances_reports_drift(self):
+        Balance.update(buy_in=Balance.buy_in + 1).where(Balance.user == 'user1').execute()
+        Balance.delete().where(Balance.user == 'user2').execute()
+        drift = check_balances(self.game)
+        self.assertEqual([(self.game.id, 'user1'), (self.game.id, 'user2')],
+                         [(game_id, user) for game_id, user, _, _ in drift])
+        self.assertEqual(1500, drift[0][2][0])
+        self.assertEqual(1501, drift[0][3][0])
+        self.assertIsNone(drift[1][3])
+
+    def test_rebuild_balances(self):
+        Balance.update(cash_out=0).execute()
+        self.assertEqual(1, len(rebuild_balances()))
+        self.assertEqual([], check_balances())
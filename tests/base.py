@@ -1,6 +1,16 @@
+import contextlib
+import datetime
 import unittest
+from typing import Iterator
 
-from peewee import SqliteDatabase
+from peewee import SqliteDatabase, QueryEvent
+
+from core.analytics import rebuild_analytics
+from core.cache import active_games
+from core.models import Game
+from core.storage import Storage, SqliteStorage
+
+TRANSACTION_STATEMENTS = ('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE')
 
 
 class BaseTestCase(unittest.TestCase):
@@ -12,7 +22,43 @@ class BaseTestCase(unittest.TestCase):
         self.test_db.bind(self.models(), bind_refs=True, bind_backrefs=True)
         self.test_db.connect()
         self.test_db.create_tables(self.models())
+        active_games.clear()
 
     def tearDown(self):
         self.test_db.drop_tables(self.models())
         self.test_db.close()
+
+    @contextlib.contextmanager
+    def count_queries(self) -> Iterator[list[str]]:
+        queries = []
+
+        def record(event: QueryEvent) -> None:
+            if not event.sql.lstrip().upper().startswith(TRANSACTION_STATEMENTS):
+                queries.append(event.sql)
+
+        self.test_db.query_hooks.append(record)
+        try:
+            yield queries
+        finally:
+            self.test_db.query_hooks.remove(record)
+
+    @contextlib.contextmanager
+    def assertMaxQueries(self, maximum: int) -> Iterator[list[str]]:
+        with self.count_queries() as queries:
+            yield queries
+        if len(queries) > maximum:
+            self.fail(f'{len(queries)} queries, expected at most {maximum}:\n' + '\n'.join(queries))
+
+
+def play_game(chat_id: str, results: dict[str, tuple[int, int]], finished_at: datetime.datetime = None,
+              storage: Storage = None) -> None:
+    storage = storage or SqliteStorage()
+    storage.start_game(chat_id)
+    for user, (buy_in, cash_out) in results.items():
+        storage.add_buy_in(chat_id, [user], buy_in)
+        storage.add_cash_out(chat_id, user, cash_out)
+    storage.finish_games(chat_id)
+    if finished_at is not None:
+        game = Game.select(Game.id).where(Game.chat_id == chat_id).order_by(Game.id.desc()).scalar()
+        Game.update(finished_at=finished_at).where(Game.id == game).execute()
+        rebuild_analytics(chat_id)
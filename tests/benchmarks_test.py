@@ -0,0 +1,42 @@
+import unittest
+
+from benchmarks.results import find_regressions
+from benchmarks.workload import Workload
+from core.balance import check_balances
+from core.game import calculate_total_profit_in_all_finished_games, has_active_games
+from core.leaderboard import rebuild_lifetime_totals
+from core.models import Game, BuyIn, CashOut, Action, Balance, LifetimeTotal, GameResult, MonthlyResult
+from tests.base import BaseTestCase
+
+
+class WorkloadTestCase(BaseTestCase):
+    def models(self):
+        return [Game, BuyIn, CashOut, Action, Balance, LifetimeTotal, GameResult, MonthlyResult]
+
+    def test_generated_workload_is_consistent(self):
+        workload = Workload(chats=3, players=20, players_per_game=5, finished_games=4, actions_per_game=10,
+                            active_actions=50)
+        workload.generate()
+        self.assertEqual(15, Game.select().count())
+        self.assertTrue(all(has_active_games(chat_id) for chat_id in workload.chats))
+        self.assertEqual([], check_balances())
+        totals = calculate_total_profit_in_all_finished_games(workload.busy_chat)
+        self.assertEqual(0, sum(totals.values()))
+        rebuild_lifetime_totals()
+        self.assertEqual(totals, calculate_total_profit_in_all_finished_games(workload.busy_chat))
+
+
+class ResultsTestCase(unittest.TestCase):
+    def test_find_regressions(self):
+        self.assertEqual(
+            [('new', None, 10.0), ('slow', 1.0, 1.5)],
+            find_regressions({'fast': 1.1, 'slow': 1.5, 'new': 10.0}, {'fast': 1.0, 'slow': 1.0}, threshold=0.25)
+        )
+
+    def test_find_throughput_regressions(self):
+        baseline = {'commands_per_second': 100.0, 'all.p50_ms': 10.0}
+        self.assertEqual([], find_regressions({'commands_per_second': 200.0, 'all.p50_ms': 10.0}, baseline,
+                                              higher_is_better=['commands_per_second']))
+        self.assertEqual([('commands_per_second', 100.0, 50.0)],
+                         find_regressions({'commands_per_second': 50.0, 'all.p50_ms': 10.0}, baseline,
+                                          higher_is_better=['commands_per_second']))
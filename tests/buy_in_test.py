@@ -1,6 +1,6 @@
 from core.buy_in import add_buy_in, calculate_total_buy_in, has_buy_in
 from core.game import start_game
-from core.models import Game, BuyIn
+from core.models import Game, BuyIn, Action, Balance
 from tests.base import BaseTestCase
 
 CHAT_ID = '123'
@@ -8,7 +8,7 @@ CHAT_ID = '123'
 
 class BuyInTestCase(BaseTestCase):
     def models(self):
-        return [Game, BuyIn]
+        return [Game, BuyIn, Action, Balance]
 
     def setUp(self):
         super().setUp()
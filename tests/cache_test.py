@@ -0,0 +1,97 @@
+import os
+import tempfile
+import threading
+
+from peewee import SqliteDatabase
+
+from core.cache import ActiveGameCache, active_games
+from core.buy_in import add_buy_in, calculate_total_buy_in
+from core.game import start_game, finish_games, has_active_games, calculate_bank_size
+from core.models import Game, BuyIn, Action, Balance, LifetimeTotal, GameResult, MonthlyResult
+from tests.base import BaseTestCase
+
+CHAT_ID_1 = '1234'
+CHAT_ID_2 = '2345'
+CHAT_ID_3 = '3456'
+
+
+class ActiveGameCacheTestCase(BaseTestCase):
+    def models(self):
+        return [Game, BuyIn, Action, Balance, LifetimeTotal, GameResult, MonthlyResult]
+
+    def test_repeated_lookups_hit_cache(self):
+        hits, misses = active_games.hits, active_games.misses
+        start_game(CHAT_ID_1)
+        has_active_games(CHAT_ID_1)
+        add_buy_in(CHAT_ID_1, ['user1'], 500)
+        calculate_total_buy_in(CHAT_ID_1)
+        calculate_bank_size(CHAT_ID_1)
+        self.assertEqual(1, active_games.misses - misses)
+        self.assertEqual(3, active_games.hits - hits)
+
+    def test_clear_keeps_counters(self):
+        cache = ActiveGameCache()
+        start_game(CHAT_ID_1)
+        cache.lookup(CHAT_ID_1)
+        cache.lookup(CHAT_ID_1)
+        cache.clear()
+        self.assertEqual({'size': 0, 'max_size': 1024, 'hits': 1, 'misses': 1, 'evictions': 0}, cache.stats())
+
+    def test_start_game_invalidates_cache(self):
+        self.assertFalse(has_active_games(CHAT_ID_1))
+        start_game(CHAT_ID_1)
+        self.assertTrue(has_active_games(CHAT_ID_1))
+
+    def test_finish_games_invalidates_cache(self):
+        start_game(CHAT_ID_1)
+        self.assertTrue(has_active_games(CHAT_ID_1))
+        finish_games(CHAT_ID_1)
+        self.assertFalse(has_active_games(CHAT_ID_1))
+        self.assertRaises(Game.DoesNotExist, lambda: active_games.get(CHAT_ID_1))
+
+    def test_least_recently_used_chat_is_evicted(self):
+        cache = ActiveGameCache(max_size=2)
+        for chat_id in [CHAT_ID_1, CHAT_ID_2]:
+            start_game(chat_id)
+            cache.lookup(chat_id)
+        cache.lookup(CHAT_ID_1)
+        cache.lookup(CHAT_ID_3)
+        cache.lookup(CHAT_ID_2)
+        self.assertEqual({'size': 2, 'max_size': 2, 'hits': 1, 'misses': 4, 'evictions': 2}, cache.stats())
+
+    def test_missing_game_is_not_cached_inside_transaction(self):
+        with self.test_db.atomic():
+            self.assertFalse(has_active_games(CHAT_ID_1))
+            self.assertEqual(0, active_games.stats()['size'])
+        self.assertFalse(has_active_games(CHAT_ID_1))
+        self.assertEqual(1, active_games.stats()['size'])
+
+    def test_lookup_before_commit_is_invalidated_after_commit(self):
+        with tempfile.TemporaryDirectory() as directory:
+            database = SqliteDatabase(os.path.join(directory, 'poker.db'))
+            with database.bind_ctx(self.models()):
+                database.create_tables(self.models())
+                with database.atomic():
+                    start_game(CHAT_ID_1)
+                    reader = threading.Thread(target=has_active_games, args=(CHAT_ID_1,))
+                    reader.start()
+                    reader.join()
+                    self.assertEqual(1, active_games.stats()['size'])
+                self.assertEqual(0, active_games.stats()['size'])
+                self.assertTrue(has_active_games(CHAT_ID_1))
+            database.close()
+
+    def test_rollback_drops_only_chats_invalidated_in_transaction(self):
+        start_game(CHAT_ID_1)
+        self.assertTrue(has_active_games(CHAT_ID_1))
+        with self.assertRaises(ValueError):
+            with self.test_db.atomic():
+                start_game(CHAT_ID_2)
+                self.assertTrue(has_active_games(CHAT_ID_2))
+                raise ValueError()
+        active_games.rollback()
+        self.assertEqual(1, active_games.stats()['size'])
+        self.assertFalse(has_active_games(CHAT_ID_2))
+        hits = active_games.hits
+        self.assertTrue(has_active_games(CHAT_ID_1))
+        self.assertEqual(hits + 1, active_games.hits)
@@ -1,6 +1,6 @@
 from core.cash_out import add_cash_out, calculate_total_cash_out
 from core.game import start_game
-from core.models import CashOut, Game
+from core.models import CashOut, Game, Action, Balance
 from tests.base import BaseTestCase
 
 CHAT_ID = "123"
@@ -8,7 +8,7 @@ CHAT_ID = "123"
 
 class CashOutTestCase(BaseTestCase):
     def models(self):
-        return [Game, CashOut]
+        return [Game, CashOut, Action, Balance]
 
     def setUp(self):
         super().setUp()
@@ -0,0 +1,127 @@
+import multiprocessing
+import os
+import queue
+import tempfile
+import time
+import unittest
+
+from telegram import Update
+
+from bot.cluster import Dispatcher, WorkerChannel, MAX_REPLAYS, STOP
+
+CHATS = [-100123, -100456, -100789, 1001, 1002, 1003, 1004, 1005]
+UPDATES_PER_CHAT = 5
+RESULT_TIMEOUT = 30
+
+
+def record_updates(channel: WorkerChannel, results: multiprocessing.Queue) -> None:
+    while True:
+        channel.beat()
+        data = channel.receive(0.05)
+        if data is None:
+            continue
+        if data == STOP:
+            return
+        text = data['message']['text']
+        if text == '/crash' or text.startswith('/crash_once ') and __mark_crashed(text.split()[1]):
+            results.close()
+            results.join_thread()
+            os._exit(1)
+        if text == '/hang':
+            time.sleep(RESULT_TIMEOUT)
+        results.put((channel.index, data['message']['chat']['id'], data['update_id']))
+        channel.complete(data['update_id'])
+
+
+def __mark_crashed(path: str) -> bool:
+    if os.path.exists(path):
+        return False
+    open(path, 'w').close()
+    return True
+
+
+def recorded_update(update_id: int, chat_id: int, text: str = '/buy 500') -> Update:
+    return Update.de_json({
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': 1700000000,
+            'chat': {'id': chat_id, 'type': 'group', 'title': 'Poker'},
+            'from': {'id': 42, 'is_bot': False, 'first_name': 'User', 'username': 'user1'},
+            'text': text,
+        }
+    }, None)
+
+
+class DispatcherTestCase(unittest.TestCase):
+    def setUp(self):
+        self.results = multiprocessing.get_context('spawn').Queue()
+
+    def tearDown(self):
+        self.dispatcher.stop()
+
+    def start(self, workers: int, heartbeat_timeout: float = RESULT_TIMEOUT) -> None:
+        self.dispatcher = Dispatcher(workers, record_updates, (self.results,), heartbeat_timeout)
+        self.dispatcher.start()
+
+    def collect(self, count: int, check_health: bool = False) -> list[tuple[int, int, int]]:
+        results = []
+        deadline = time.monotonic() + RESULT_TIMEOUT
+        while len(results) < count and time.monotonic() < deadline:
+            if check_health:
+                self.dispatcher.check_health()
+            try:
+                results.append(self.results.get(timeout=0.1))
+            except queue.Empty:
+                pass
+        return results
+
+    def test_updates_are_routed_by_chat(self):
+        self.start(4)
+        updates = [recorded_update(1 + index, CHATS[index % len(CHATS)])
+                   for index in range(len(CHATS) * UPDATES_PER_CHAT)]
+        for update in updates:
+            self.dispatcher.dispatch(update)
+        results = self.collect(len(updates))
+        self.assertEqual(len(updates), len(results))
+        for chat_id in CHATS:
+            received = [(worker, update_id) for worker, chat, update_id in results if chat == chat_id]
+            self.assertEqual({self.dispatcher.route(recorded_update(0, chat_id))}, {worker for worker, _ in received})
+            self.assertEqual([update.update_id for update in updates if update.effective_chat.id == chat_id],
+                             [update_id for _, update_id in received])
+        self.assertGreater(len({worker for worker, _, _ in results}), 1)
+
+    def test_crashed_worker_is_restarted(self):
+        self.start(2)
+        chat_id = CHATS[0]
+        self.dispatcher.dispatch(recorded_update(1, chat_id))
+        self.dispatcher.dispatch(recorded_update(2, chat_id, '/crash'))
+        for update_id in range(3, 6):
+            self.dispatcher.dispatch(recorded_update(update_id, chat_id))
+        results = self.collect(4, check_health=True)
+        self.assertEqual([1, 3, 4, 5], [update_id for _, _, update_id in results])
+        health = self.dispatcher.health()[self.dispatcher.route(recorded_update(0, chat_id))]
+        self.assertEqual(1 + MAX_REPLAYS, health['restarts'])
+        self.assertTrue(health['alive'])
+        self.assertEqual(0, health['pending'])
+
+    def test_update_received_before_crash_is_replayed(self):
+        self.start(2)
+        chat_id = CHATS[0]
+        with tempfile.TemporaryDirectory() as directory:
+            self.dispatcher.dispatch(recorded_update(1, chat_id))
+            self.dispatcher.dispatch(recorded_update(2, chat_id, f'/crash_once {os.path.join(directory, "crashed")}'))
+            self.dispatcher.dispatch(recorded_update(3, chat_id))
+            results = self.collect(3, check_health=True)
+        self.assertEqual([1, 2, 3], [update_id for _, _, update_id in results])
+        health = self.dispatcher.health()[self.dispatcher.route(recorded_update(0, chat_id))]
+        self.assertEqual(1, health['restarts'])
+        self.assertEqual(0, health['pending'])
+
+    def test_hung_worker_is_restarted(self):
+        self.start(1, heartbeat_timeout=1)
+        self.dispatcher.dispatch(recorded_update(1, CHATS[0], '/hang'))
+        self.dispatcher.dispatch(recorded_update(2, CHATS[0]))
+        results = self.collect(1, check_health=True)
+        self.assertEqual([(0, CHATS[0], 2)], results)
+        self.assertEqual(1 + MAX_REPLAYS, self.dispatcher.health()[0]['restarts'])
@@ -0,0 +1,39 @@
+import os
+import tempfile
+import unittest
+
+from core.database import create_database, bootstrap, close_database
+from core.migrations import MIGRATIONS, get_schema_version
+
+
+class DatabaseTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'poker.db')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_default_pragmas(self):
+        database = create_database(self.path)
+        with database.connection_context():
+            self.assertEqual('wal', database.journal_mode)
+            self.assertEqual(1, database.synchronous)
+            self.assertEqual(-64 * 1024, database.cache_size)
+            self.assertEqual(256 * 1024 * 1024, database.mmap_size)
+            self.assertEqual(5000, database.pragma('busy_timeout'))
+
+    def test_override_pragmas(self):
+        database = create_database(self.path, pragmas={'synchronous': 'full'}, timeout=1)
+        with database.connection_context():
+            self.assertEqual(2, database.synchronous)
+            self.assertEqual(1000, database.pragma('busy_timeout'))
+
+    def test_bootstrap_migrates_once(self):
+        database = bootstrap(self.path)
+        self.assertTrue(database.is_closed())
+        self.assertEqual(len(MIGRATIONS), get_schema_version(database))
+        database.user_version = 0
+        bootstrap(self.path)
+        self.assertEqual(0, get_schema_version(database))
+        close_database()
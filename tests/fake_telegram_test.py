@@ -0,0 +1,97 @@
+import asyncio
+import random
+import unittest
+from unittest.mock import patch
+
+import benchmarks.load
+import bot.bot
+from benchmarks.fake_telegram import FakeTelegramServer
+from benchmarks.load import script_chat, play_chat
+
+TOKEN = '123456:test'
+CHAT_ID = -100123
+
+
+class FakeTelegramTestCase(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = FakeTelegramServer(TOKEN)
+        await self.server.start()
+        self.patches = [patch.object(bot.bot, name, value) for name, value in [
+            ('TOKEN', TOKEN),
+            ('API_BASE_URL', self.server.base_url),
+            ('STORAGE', 'memory'),
+            ('SNAPSHOT_PATH', None),
+            ('METRICS_PORT', None),
+            ('LIVE_STATUS', False),
+            ('STATE_PATH', None),
+            ('storage', bot.bot.storage),
+            ('live_status', None),
+        ]]
+        for patcher in self.patches:
+            patcher.start()
+        self.application = bot.bot.build_application()
+        await self.application.initialize()
+        await self.application.start()
+        await self.application.updater.start_polling(poll_interval=0, timeout=1)
+
+    async def asyncTearDown(self):
+        await self.application.updater.stop()
+        await self.application.stop()
+        await self.application.shutdown()
+        await self.application.post_shutdown(self.application)
+        await self.server.stop()
+        for patcher in reversed(self.patches):
+            patcher.stop()
+
+    async def reply(self, username: str, text: str) -> str:
+        message, _ = await self.server.request(CHAT_ID, username, text)
+        return message['text']
+
+    async def test_game_through_fake_api(self):
+        self.assertEqual('Катка началась', await self.reply('user1', '/start'))
+        self.assertEqual('Закуп:\nuser1 500\n\nБанк 500', await self.reply('user1', '/buy 500'))
+        self.assertEqual('Закуп:\nuser2 500\n\nБанк 1000', await self.reply('user1', '@poker_bot /buy @user2 500'))
+        self.assertEqual('Профит:\nuser1 200\n\nБанк 300', await self.reply('user1', '/quit 700'))
+        self.assertEqual('Профит:\nuser2 -200\n\nБанк 0', await self.reply('user1', '/quit @user2 300'))
+        self.assertTrue((await self.reply('user1', '/stop')).startswith('Катка закончилась, банк сходится'))
+        self.assertEqual(1, self.server.calls['getMe'])
+        self.assertEqual(6, self.server.calls['sendMessage'])
+
+    async def test_scripted_chat_replies_to_every_command(self):
+        commands = script_chat(random.Random(0), games=2)
+        replies = [await self.reply(username, text) for username, text in commands]
+        self.assertEqual(len(commands), len(replies))
+        self.assertEqual(2, sum(reply.startswith('Катка закончилась, банк сходится') for reply in replies))
+
+    async def test_edits_are_recorded(self):
+        message, _ = await self.server.request(CHAT_ID, 'user1', '/start')
+        await self.application.bot.edit_message_text('Катка идёт', chat_id=CHAT_ID, message_id=message['message_id'])
+        self.assertEqual([(message['message_id'], 'Катка идёт')],
+                         [(edit['message_id'], edit['text']) for edit in self.server.edited])
+
+
+class LoadDriverTestCase(unittest.IsolatedAsyncioTestCase):
+    async def test_missing_reply_times_out(self):
+        server = FakeTelegramServer(TOKEN)
+        await server.start()
+        try:
+            with patch.object(benchmarks.load, 'REPLY_TIMEOUT', 0.05), self.assertRaises(TimeoutError):
+                await play_chat(server, CHAT_ID, [('user1', '/start')], asyncio.Semaphore(1), {})
+        finally:
+            await server.stop()
+
+
+class FakeTelegramServerTestCase(unittest.TestCase):
+    def test_server_created_outside_event_loop(self):
+        server = FakeTelegramServer(TOKEN)
+
+        async def request_without_bot():
+            await server.start()
+            try:
+                with self.assertRaises(TimeoutError):
+                    await server.request(CHAT_ID, 'user1', '/start', timeout=0.05)
+            finally:
+                await server.stop()
+
+        asyncio.run(request_without_bot())
+        self.assertEqual(0, server.calls['getUpdates'])
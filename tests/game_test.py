@@ -3,7 +3,7 @@ from core.cash_out import add_cash_out, calculate_total_cash_out
 from core.game import start_game, has_active_games, finish_games, calculate_profit, calculate_active_players, \
     calculate_bank_size, calculate_money_transfers, calculate_total_profit_in_all_finished_games, has_actions, \
     undo_last_action
-from core.models import Game, CashOut, BuyIn
+from core.models import Game, CashOut, BuyIn, Action, Balance, LifetimeTotal, GameResult, MonthlyResult
 from tests.base import BaseTestCase
 
 CHAT_ID_1 = '1234'
@@ -12,7 +12,7 @@ CHAT_ID_2 = '2345'
 
 class GamesTestCase(BaseTestCase):
     def models(self):
-        return [Game, BuyIn, CashOut]
+        return [Game, BuyIn, CashOut, Action, Balance, LifetimeTotal, GameResult, MonthlyResult]
 
     def setUp(self):
         super().setUp()
@@ -0,0 +1,106 @@
+import io
+
+from core.analytics import get_user_stats
+from core.balance import check_balances
+from core.buy_in import add_buy_in
+from core.cash_out import add_cash_out
+from core.game import start_game, finish_games, calculate_total_profit_in_all_finished_games, calculate_profit, \
+    undo_last_action
+from core.history import export_history, import_history, CSV, JSONL
+from core.models import Game, BuyIn, CashOut, Action, Balance, LifetimeTotal, GameResult, MonthlyResult
+from tests.base import BaseTestCase
+
+CHAT_ID_1 = '1234'
+CHAT_ID_2 = '2345'
+SPREADSHEET = '''chat_id,game,is_finished,type,user,amount,timestamp
+777,2019-05-01,yes,buy_in,user1,500,2019-05-01 20:00:00
+777,2019-05-01,yes,buy_in,user2,500,2019-05-01 20:00:00
+777,2019-05-01,yes,cash_out,user1,800,2019-05-01 23:00:00
+777,2019-05-01,yes,cash_out,user2,200,2019-05-01 23:00:00
+'''
+
+
+class HistoryTestCase(BaseTestCase):
+    def models(self):
+        return [Game, BuyIn, CashOut, Action, Balance, LifetimeTotal, GameResult, MonthlyResult]
+
+    def setUp(self):
+        super().setUp()
+        for chat_id in [CHAT_ID_1, CHAT_ID_2]:
+            start_game(chat_id)
+            add_buy_in(chat_id, ['user1', 'user2'], 500)
+            add_cash_out(chat_id, 'user1', 700)
+            add_cash_out(chat_id, 'user2', 300)
+            finish_games(chat_id)
+        start_game(CHAT_ID_1)
+        add_buy_in(CHAT_ID_1, ['user1', 'user2'], 1000)
+        add_buy_in(CHAT_ID_1, ['user3'], 200)
+        undo_last_action(CHAT_ID_1)
+
+    def test_round_trip(self):
+        for format in [CSV, JSONL]:
+            with self.subTest(format=format):
+                expected = self.__snapshot()
+                file = io.StringIO()
+                self.assertEqual(10, export_history(file, format)['rows'])
+                self.__clear()
+                file.seek(0)
+                stats = import_history(file, format, batch_size=3)
+                self.assertEqual((10, 10, 3), (stats['rows'], stats['imported'], stats['games']))
+                self.assertEqual(expected, self.__snapshot())
+                self.assertEqual([], check_balances())
+
+    def test_import_is_idempotent(self):
+        file = io.StringIO()
+        export_history(file, JSONL)
+        file.seek(0)
+        stats = import_history(file, JSONL)
+        self.assertEqual((10, 0, 0), (stats['rows'], stats['imported'], stats['games']))
+        self.assertEqual(3, Game.select().count())
+        self.assertEqual(11, Action.select().count())
+
+    def test_export_single_chat(self):
+        file = io.StringIO()
+        export_history(file, CSV, CHAT_ID_2)
+        self.assertEqual(5, len(file.getvalue().splitlines()))
+
+    def test_import_spreadsheet(self):
+        for _ in range(2):
+            import_history(io.StringIO(SPREADSHEET), CSV)
+        self.assertEqual({'user1': 300, 'user2': -300}, calculate_total_profit_in_all_finished_games('777'))
+        self.assertEqual([('user1', 1, 500, 300, 300, 300), ('user2', 1, 500, -300, -300, -300)],
+                         get_user_stats('777'))
+        game = Game.get(chat_id='777')
+        self.assertEqual('2019-05-01', game.import_key)
+        self.assertEqual('2019-05-01 23:00:00', str(game.finished_at))
+
+    def test_spreadsheet_key_does_not_match_game_id(self):
+        game = Game.get(chat_id=CHAT_ID_1, is_finished=True)
+        file = io.StringIO('chat_id,game,is_finished,type,user,amount,timestamp\n'
+                           f'{CHAT_ID_1},{game.id},yes,buy_in,user1,500,2024-01-01 20:00:00\n')
+        stats = import_history(file, CSV)
+        self.assertEqual((1, 1), (stats['imported'], stats['games']))
+        self.assertEqual(4, Action.select().where(Action.game == game).count())
+
+    def test_import_appends_to_existing_game(self):
+        import_history(io.StringIO(SPREADSHEET), CSV)
+        extra = '777,2019-05-01,yes,buy_in,user1,500,2019-05-01 21:00:00\n'
+        stats = import_history(io.StringIO(SPREADSHEET + extra), CSV)
+        self.assertEqual((5, 1, 4, 0), (stats['rows'], stats['imported'], stats['skipped'], stats['games']))
+        game = Game.get(chat_id='777')
+        self.assertEqual([1, 2, 3, 4, 5], [action.seq for action in game.actions.order_by(Action.seq)])
+        self.assertEqual({'user1': -200, 'user2': -300}, calculate_total_profit_in_all_finished_games('777'))
+
+    def test_import_second_active_game(self):
+        file = io.StringIO('chat_id,game,is_finished,type,user,amount,timestamp\n'
+                           f'{CHAT_ID_1},other,0,buy_in,user1,500,2024-01-01 20:00:00\n')
+        with self.assertRaises(ValueError):
+            import_history(file, CSV)
+
+    def __snapshot(self):
+        return ([(calculate_total_profit_in_all_finished_games(chat_id), get_user_stats(chat_id))
+                 for chat_id in [CHAT_ID_1, CHAT_ID_2]], calculate_profit(CHAT_ID_1))
+
+    def __clear(self):
+        for model in reversed(self.models()):
+            model.delete().execute()
@@ -0,0 +1,47 @@
+from core.buy_in import add_buy_in
+from core.game import start_game, calculate_total_profit_in_all_finished_games
+from core.leaderboard import rebuild_lifetime_totals
+from core.models import Game, BuyIn, CashOut, Action, Balance, LifetimeTotal, GameResult, MonthlyResult
+from tests.base import BaseTestCase, play_game
+
+CHAT_ID_1 = '1234'
+CHAT_ID_2 = '2345'
+
+
+class LeaderboardTestCase(BaseTestCase):
+    def models(self):
+        return [Game, BuyIn, CashOut, Action, Balance, LifetimeTotal, GameResult, MonthlyResult]
+
+    def setUp(self):
+        super().setUp()
+        play_game(CHAT_ID_1, {'user1': (500, 900), 'user2': (500, 100)})
+        play_game(CHAT_ID_1, {'user1': (1000, 0), 'user3': (300, 1300)})
+        play_game(CHAT_ID_2, {'user1': (200, 400), 'user2': (200, 0)})
+
+    def test_finish_games_updates_lifetime_totals(self):
+        self.assertEqual({'user1': -600, 'user2': -400, 'user3': 1000},
+                         calculate_total_profit_in_all_finished_games(CHAT_ID_1))
+        self.assertEqual({'user1': 200, 'user2': -200}, calculate_total_profit_in_all_finished_games(CHAT_ID_2))
+        self.assertEqual(2, LifetimeTotal.get(chat_id=CHAT_ID_1, user='user1').games)
+
+    def test_active_game_is_not_counted(self):
+        start_game(CHAT_ID_2)
+        add_buy_in(CHAT_ID_2, ['user1'], 1000)
+        self.assertEqual({'user1': 200, 'user2': -200}, calculate_total_profit_in_all_finished_games(CHAT_ID_2))
+
+    def test_rebuild_matches_incremental_totals(self):
+        expected = self.__totals()
+        LifetimeTotal.delete().execute()
+        self.assertEqual(5, rebuild_lifetime_totals())
+        self.assertEqual(expected, self.__totals())
+
+    def test_rebuild_single_chat(self):
+        LifetimeTotal.update(profit=0).execute()
+        rebuild_lifetime_totals(CHAT_ID_2)
+        self.assertEqual({'user1': 200, 'user2': -200}, calculate_total_profit_in_all_finished_games(CHAT_ID_2))
+        self.assertEqual({'user1': 0, 'user2': 0, 'user3': 0}, calculate_total_profit_in_all_finished_games(CHAT_ID_1))
+
+    @staticmethod
+    def __totals():
+        return sorted(LifetimeTotal.select(LifetimeTotal.chat_id, LifetimeTotal.user, LifetimeTotal.profit,
+                                           LifetimeTotal.games).tuples())
@@ -0,0 +1,120 @@
+import asyncio
+import unittest
+
+from telegram.error import BadRequest
+
+from bot.live_status import LiveStatus, LIVE_STATUS_KEY, MORE_MARKER
+from bot.rendering import MAX_MESSAGE_LENGTH
+
+CHAT_ID = -100123
+DELAY = 0.01
+
+
+class FakeMessage:
+    def __init__(self, message_id: int):
+        self.message_id = message_id
+
+
+class FakeBot:
+    def __init__(self):
+        self.calls = []
+        self.deleted = set()
+
+    async def send_message(self, chat_id: int, text: str):
+        self.calls.append(('send', chat_id, text))
+        return FakeMessage(len(self.calls))
+
+    async def edit_message_text(self, text: str, chat_id: int, message_id: int):
+        if message_id in self.deleted:
+            raise BadRequest('Message to edit not found')
+        self.calls.append(('edit', message_id, text))
+
+    async def pin_chat_message(self, chat_id: int, message_id: int, disable_notification: bool = False):
+        self.calls.append(('pin', message_id))
+
+    async def unpin_chat_message(self, chat_id: int, message_id: int):
+        self.calls.append(('unpin', message_id))
+
+
+class FakeContext:
+    def __init__(self):
+        self.bot = FakeBot()
+        self.chat_data = {}
+
+
+class LiveStatusTestCase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.bank = 0
+        self.loads = 0
+        self.context = FakeContext()
+        self.live_status = LiveStatus(self.load_status, DELAY)
+
+    async def load_status(self, chat_id: int) -> list[str]:
+        self.loads += 1
+        return [f'Банк {self.bank}']
+
+    async def buy_in_burst(self, count: int) -> None:
+        for _ in range(count):
+            self.bank += 100
+            self.live_status.schedule(CHAT_ID, self.context)
+        await self.wait()
+
+    async def wait(self) -> None:
+        while self.live_status.pending_chats:
+            await asyncio.sleep(DELAY)
+
+    async def test_burst_is_coalesced_into_one_message(self):
+        await self.buy_in_burst(10)
+        self.assertEqual([('send', CHAT_ID, 'Банк 1000'), ('pin', 1)], self.context.bot.calls)
+        self.assertEqual(1, self.loads)
+        await self.buy_in_burst(5)
+        self.assertEqual([('send', CHAT_ID, 'Банк 1000'), ('pin', 1), ('edit', 1, 'Банк 1500')],
+                         self.context.bot.calls)
+
+    async def test_unchanged_status_is_not_edited(self):
+        await self.buy_in_burst(1)
+        self.live_status.schedule(CHAT_ID, self.context)
+        await self.wait()
+        self.assertEqual(2, len(self.context.bot.calls))
+        self.assertEqual(2, self.loads)
+
+    async def test_deleted_message_is_sent_again(self):
+        await self.buy_in_burst(1)
+        self.context.bot.deleted.add(1)
+        await self.buy_in_burst(1)
+        self.assertEqual([('send', CHAT_ID, 'Банк 100'), ('pin', 1), ('send', CHAT_ID, 'Банк 200'), ('pin', 3)],
+                         self.context.bot.calls)
+        self.assertEqual(3, self.context.chat_data[LIVE_STATUS_KEY]['message_id'])
+
+    async def test_update_during_publish_is_published(self):
+        async def load_status(chat_id: int) -> list[str]:
+            if self.loads == 0:
+                self.live_status.schedule(chat_id, self.context)
+                self.bank += 100
+            return await self.load_status(chat_id)
+
+        self.live_status.load_status = load_status
+        await self.buy_in_burst(1)
+        self.assertEqual([('send', CHAT_ID, 'Банк 200'), ('pin', 1)], self.context.bot.calls)
+        self.assertEqual(2, self.loads)
+
+    async def test_finish_cancels_pending_update_and_unpins(self):
+        await self.buy_in_burst(1)
+        self.bank += 100
+        self.live_status.schedule(CHAT_ID, self.context)
+        await self.live_status.finish(CHAT_ID, self.context)
+        await asyncio.sleep(DELAY * 3)
+        self.assertEqual([('send', CHAT_ID, 'Банк 100'), ('pin', 1), ('unpin', 1)], self.context.bot.calls)
+        self.assertEqual({}, self.context.chat_data)
+        self.assertEqual(0, self.live_status.pending_chats)
+
+    async def test_long_status_is_marked_as_truncated(self):
+        async def load_status(chat_id: int) -> list[str]:
+            return [f'user{index} {index * 100}\n' for index in range(500)]
+
+        self.live_status.load_status = load_status
+        await self.buy_in_burst(1)
+        text = self.context.bot.calls[0][2]
+        self.assertTrue(text.startswith('user0 0\n'))
+        self.assertTrue(text.endswith(MORE_MARKER))
+        self.assertLessEqual(len(text), MAX_MESSAGE_LENGTH)
@@ -0,0 +1,128 @@
+import asyncio
+import tempfile
+import unittest
+import urllib.error
+import urllib.request
+from types import SimpleNamespace
+
+from bot.metrics import MetricsServer, PROMETHEUS_CONTENT_TYPE, instrument_handler
+from core.buy_in import add_buy_in
+from core.cash_out import add_cash_out
+from core.game import start_game, calculate_bank_size
+from core.metrics import Histogram, Counter, InstrumentedSqliteDatabase, track_command, \
+    FUNCTION_SECONDS, COMMAND_ERRORS, COMMAND_SQL_STATEMENTS, registry
+from core.models import Game, BuyIn, CashOut, Action, Balance, LifetimeTotal, GameResult, MonthlyResult
+from core.profiling import Profiler
+from tests.base import BaseTestCase
+
+CHAT_ID = '123'
+
+
+class MetricsTestCase(BaseTestCase):
+    def models(self):
+        return [Game, BuyIn, CashOut, Action, Balance, LifetimeTotal, GameResult, MonthlyResult]
+
+    def setUp(self):
+        super().setUp()
+        self.test_db.close()
+        self.test_db = InstrumentedSqliteDatabase(':memory:')
+        self.test_db.bind(self.models(), bind_refs=True, bind_backrefs=True)
+        self.test_db.connect()
+        self.test_db.create_tables(self.models())
+
+    def test_track_command_counts_statements_and_rows(self):
+        start_game(CHAT_ID)
+        add_buy_in(CHAT_ID, ['user1', 'user2'], 500)
+        with track_command('test') as stats:
+            self.assertEqual(1000, calculate_bank_size(CHAT_ID))
+            add_cash_out(CHAT_ID, 'user1', 300)
+        self.assertGreater(stats.statements, 0)
+        self.assertGreater(stats.rows, 0)
+        self.assertIn('test', COMMAND_SQL_STATEMENTS.snapshot())
+
+    def test_statements_outside_command_are_not_attributed(self):
+        with track_command('empty') as stats:
+            pass
+        start_game(CHAT_ID)
+        self.assertEqual(0, stats.statements)
+        self.assertEqual(0, stats.rows)
+
+    def test_track_command_counts_errors(self):
+        before = COMMAND_ERRORS.snapshot().get('failing', 0)
+        with self.assertRaises(ValueError):
+            with track_command('failing'):
+                raise ValueError()
+        self.assertEqual(before + 1, COMMAND_ERRORS.snapshot()['failing'])
+
+    def test_instrument_handler(self):
+        calls = []
+
+        async def callback(update, context):
+            calls.append(update.effective_chat.id)
+
+        update = SimpleNamespace(effective_chat=SimpleNamespace(id=int(CHAT_ID)))
+        with tempfile.TemporaryDirectory() as directory:
+            for profiler in [None, Profiler(directory, rate=0), Profiler(directory, rate=1)]:
+                asyncio.run(instrument_handler('handled', callback, profiler)(update, None))
+            self.assertEqual(1, profiler.saved)
+        self.assertEqual([int(CHAT_ID)] * 3, calls)
+        self.assertEqual(3, COMMAND_SQL_STATEMENTS.snapshot()['handled'][2])
+
+    def test_instrumented_records_function_latency(self):
+        start_game(CHAT_ID)
+        _, _, count = FUNCTION_SECONDS.snapshot().get('core.game.calculate_bank_size', ([], 0, 0))
+        calculate_bank_size(CHAT_ID)
+        self.assertEqual(count + 1, FUNCTION_SECONDS.snapshot()['core.game.calculate_bank_size'][2])
+
+
+class HistogramTestCase(unittest.TestCase):
+    def test_render_cumulative_buckets(self):
+        histogram = Histogram('test_seconds', 'Test latency', (0.1, 1.0), 'command')
+        histogram.observe('buy', 0.05)
+        histogram.observe('buy', 0.5)
+        histogram.observe('buy', 5)
+        self.assertEqual(['# HELP test_seconds Test latency',
+                          '# TYPE test_seconds histogram',
+                          'test_seconds_bucket{command="buy",le="0.1"} 1',
+                          'test_seconds_bucket{command="buy",le="1.0"} 2',
+                          'test_seconds_bucket{command="buy",le="+Inf"} 3',
+                          'test_seconds_sum{command="buy"} 5.55',
+                          'test_seconds_count{command="buy"} 3'], histogram.render())
+
+    def test_quantile(self):
+        histogram = Histogram('test_seconds', 'Test latency', (0.1, 1.0), 'command')
+        for _ in range(19):
+            histogram.observe('buy', 0.05)
+        histogram.observe('buy', 0.5)
+        self.assertEqual(0.1, histogram.quantile('buy', 0.95))
+        self.assertEqual(1.0, histogram.quantile('buy', 1))
+        self.assertEqual(0, histogram.quantile('quit', 0.95))
+
+    def test_counter_escapes_labels(self):
+        counter = Counter('test_total', 'Test counter', 'command')
+        counter.inc('a"b')
+        self.assertEqual('test_total{command="a\\"b"} 1', counter.render()[-1])
+
+
+class MetricsServerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = MetricsServer('127.0.0.1', 0)
+        self.server.start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_serve_metrics(self):
+        with urllib.request.urlopen(f'http://127.0.0.1:{self.server.port}/metrics') as response:
+            self.assertEqual(PROMETHEUS_CONTENT_TYPE, response.headers['Content-Type'])
+            body = response.read().decode()
+        self.assertIn('# TYPE poker_command_seconds histogram', body)
+        self.assertIn('poker_active_game_cache_size', body)
+        self.assertIn('# TYPE poker_active_game_cache_hits_total counter\npoker_active_game_cache_hits_total ', body)
+        self.assertIn('# TYPE poker_active_game_cache_misses_total counter', body)
+        self.assertEqual(len(registry.metrics), body.count('# TYPE'))
+
+    def test_unknown_path(self):
+        with self.assertRaises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(f'http://127.0.0.1:{self.server.port}/other')
+        self.assertEqual(404, error.exception.code)
@@ -0,0 +1,49 @@
+from core.migrations import migrate, get_schema_version, MIGRATIONS
+from tests.base import BaseTestCase
+
+LEGACY_SCHEMA = [
+    'CREATE TABLE "game" ("id" INTEGER NOT NULL PRIMARY KEY, "chat_id" VARCHAR(255) NOT NULL, '
+    '"is_finished" INTEGER NOT NULL)',
+    'CREATE TABLE "buyin" ("id" INTEGER NOT NULL PRIMARY KEY, "game_id" INTEGER NOT NULL, '
+    '"user" VARCHAR(255) NOT NULL, "amount" INTEGER NOT NULL, "timestamp" DATETIME NOT NULL, '
+    'FOREIGN KEY ("game_id") REFERENCES "game" ("id"))',
+    'CREATE INDEX "buyin_game_id" ON "buyin" ("game_id")',
+    'CREATE TABLE "cashout" ("id" INTEGER NOT NULL PRIMARY KEY, "game_id" INTEGER NOT NULL, '
+    '"user" VARCHAR(255) NOT NULL, "amount" INTEGER NOT NULL, "timestamp" DATETIME NOT NULL, '
+    'FOREIGN KEY ("game_id") REFERENCES "game" ("id"))',
+    'CREATE INDEX "cashout_game_id" ON "cashout" ("game_id")',
+]
+
+
+class MigrationsTestCase(BaseTestCase):
+    def test_migrate_empty_database(self):
+        self.assertEqual(list(range(1, len(MIGRATIONS) + 1)), migrate(self.test_db))
+        self.assertEqual(len(MIGRATIONS), get_schema_version(self.test_db))
+        self.assertTrue({'game', 'buyin', 'cashout', 'action', 'balance', 'lifetimetotal', 'gameresult', 'monthlyresult'}
+                        <= set(self.test_db.get_tables()))
+
+    def test_migrate_is_idempotent(self):
+        migrate(self.test_db)
+        self.assertEqual([], migrate(self.test_db))
+
+    def test_migrate_legacy_database(self):
+        for sql in LEGACY_SCHEMA:
+            self.test_db.execute_sql(sql)
+        self.test_db.execute_sql('INSERT INTO "game" ("chat_id", "is_finished") VALUES (?, ?)', ('123', 0))
+        self.test_db.execute_sql('INSERT INTO "buyin" ("game_id", "user", "amount", "timestamp") VALUES (?, ?, ?, ?)',
+                                 (1, 'user1', 500, '2023-01-01 20:00:00'))
+        migrate(self.test_db)
+        self.assertEqual(len(MIGRATIONS), get_schema_version(self.test_db))
+        self.assertIn('game_chat_id_is_finished', self.__indexes('game'))
+        self.assertIn('buyin_game_id_user', self.__indexes('buyin'))
+        self.assertIn('cashout_game_id_timestamp', self.__indexes('cashout'))
+        self.assertEqual(1, self.test_db.execute_sql('SELECT COUNT(*) FROM "game"').fetchone()[0])
+        self.assertEqual((1, 'user1', 500, 0), self.test_db.execute_sql(
+            'SELECT "game_id", "user", "buy_in", "cash_out" FROM "balance"').fetchone())
+        self.assertEqual((1, 1, 'buy_in', 'user1', 500), self.test_db.execute_sql(
+            'SELECT "game_id", "seq", "type", "user", "amount" FROM "action"').fetchone())
+        self.assertEqual(1, self.test_db.execute_sql('SELECT "seq" FROM "buyin"').fetchone()[0])
+        self.assertIn('buyin_game_id_seq', self.__indexes('buyin'))
+
+    def __indexes(self, table):
+        return [index.name for index in self.test_db.get_indexes(table)]
@@ -0,0 +1,188 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from telegram import Bot
+
+import bot.bot
+import core.aio
+from benchmarks.fake_telegram import FakeTelegramServer
+from bot.live_status import LIVE_STATUS_KEY
+from bot.persistence import UpdateTracker, create_persistence
+from bot.polling import UpdatePoller
+from bot.rendering import PAGES_KEY
+from core.cache import active_games
+from core.memory_storage import MemoryStorage
+from core.migrations import MODELS
+from core.models import db
+
+TOKEN = '123456:test'
+CHAT_ID = -100123
+TIMEOUT = 5
+
+
+class UpdateTrackerTestCase(unittest.IsolatedAsyncioTestCase):
+    async def test_finish_resolves_tracked_update(self):
+        tracker = UpdateTracker(MemoryStorage())
+        handled = tracker.track(1)
+        self.assertIs(handled, tracker.track(1))
+        self.assertIn(1, tracker)
+        tracker.finish(1, True)
+        tracker.finish(2, False)
+        self.assertTrue(await handled)
+        self.assertNotIn(1, tracker)
+        failed = tracker.track(1)
+        tracker.finish(1, False)
+        self.assertFalse(await failed)
+
+
+class UpdatePollerTestCase(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = FakeTelegramServer(TOKEN)
+        await self.server.start()
+        self.bot = Bot(TOKEN, base_url=self.server.base_url)
+        await self.bot.initialize()
+        self.tracker = UpdateTracker(MemoryStorage())
+        self.update_queue = asyncio.Queue()
+
+    async def asyncTearDown(self):
+        await self.bot.shutdown()
+        await self.server.stop()
+
+    async def test_offset_stops_at_unhandled_update(self):
+        for text in ['/buy 100', '/buy 200', '/buy 300']:
+            await self.server.push_message(CHAT_ID, 'user1', text)
+        poller = UpdatePoller(self.bot, self.update_queue, self.tracker, timeout=0)
+        polling = asyncio.create_task(poller.run())
+        updates = [await asyncio.wait_for(self.update_queue.get(), TIMEOUT) for _ in range(3)]
+        self.assertEqual([1, 2, 3], [update.update_id for update in updates])
+        self.tracker.finish(1, True)
+        self.tracker.finish(3, True)
+        await asyncio.wait_for(self.wait_offset(poller, 2), TIMEOUT)
+        self.assertTrue(self.update_queue.empty())
+        polling.cancel()
+        await asyncio.gather(polling, return_exceptions=True)
+        await poller.confirm()
+
+        restarted = UpdatePoller(self.bot, self.update_queue, UpdateTracker(MemoryStorage()), timeout=0)
+        polling = asyncio.create_task(restarted.run())
+        redelivered = [await asyncio.wait_for(self.update_queue.get(), TIMEOUT) for _ in range(2)]
+        polling.cancel()
+        await asyncio.gather(polling, return_exceptions=True)
+        self.assertEqual([2, 3], [update.update_id for update in redelivered])
+
+    @staticmethod
+    async def wait_offset(poller: UpdatePoller, offset: int) -> None:
+        while poller.offset != offset:
+            await asyncio.sleep(0.01)
+
+
+class BotPersistenceTestCase(unittest.IsolatedAsyncioTestCase):
+    async def test_reply_pages_are_not_persisted(self):
+        with tempfile.TemporaryDirectory() as directory:
+            persistence = create_persistence(os.path.join(directory, 'bot-state.pickle'))
+            await persistence.update_chat_data(CHAT_ID, {PAGES_KEY: {1: ['page']}, LIVE_STATUS_KEY: {'message_id': 1}})
+            await persistence.flush()
+            persistence = create_persistence(os.path.join(directory, 'bot-state.pickle'))
+            self.assertEqual({CHAT_ID: {LIVE_STATUS_KEY: {'message_id': 1}}}, await persistence.get_chat_data())
+
+
+class RestartTestCase(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.server = FakeTelegramServer(TOKEN)
+        await self.server.start()
+        self.patches = [patch.object(bot.bot, name, value) for name, value in [
+            ('TOKEN', TOKEN),
+            ('API_BASE_URL', self.server.base_url),
+            ('STORAGE', 'sqlite'),
+            ('DB_PATH', os.path.join(self.directory.name, 'poker.db')),
+            ('STATE_PATH', os.path.join(self.directory.name, 'bot-state.pickle')),
+            ('MODE', 'polling'),
+            ('METRICS_PORT', None),
+            ('LIVE_STATUS', False),
+            ('storage', bot.bot.storage),
+            ('live_status', None),
+            ('update_tracker', None),
+        ]]
+        for patcher in self.patches:
+            patcher.start()
+        self.application = None
+        db.bind(MODELS, bind_refs=True, bind_backrefs=True)
+        active_games.clear()
+
+    async def asyncTearDown(self):
+        await self.stop()
+        await self.server.stop()
+        for patcher in reversed(self.patches):
+            patcher.stop()
+        self.directory.cleanup()
+
+    async def start(self):
+        self.application = bot.bot.build_application()
+        await self.application.initialize()
+        await self.application.post_init(self.application)
+        await self.application.start()
+        self.poller = UpdatePoller(self.application.bot, self.application.update_queue, bot.bot.update_tracker,
+                                   timeout=1)
+        self.polling = asyncio.create_task(self.poller.run())
+
+    async def stop(self, confirm: bool = True):
+        if self.application is None:
+            return
+        self.polling.cancel()
+        await asyncio.gather(self.polling, return_exceptions=True)
+        await self.application.stop()
+        if confirm:
+            await self.poller.confirm()
+        await self.application.shutdown()
+        await self.application.post_shutdown(self.application)
+        self.application = None
+
+    async def reply(self, text: str) -> str:
+        message, _ = await self.server.request(CHAT_ID, 'user1', text, TIMEOUT)
+        return message['text']
+
+    async def processed(self, update_id: int) -> bool:
+        return await core.aio.run(bot.bot.storage.is_update_processed, update_id)
+
+    async def test_redelivered_update_is_skipped(self):
+        await self.start()
+        self.assertEqual('Катка началась', await self.reply('/start'))
+        self.assertEqual('Закуп:\nuser1 500\n\nБанк 500', await self.reply('/buy 500'))
+        await self.stop()
+        self.assertTrue(os.path.exists(bot.bot.STATE_PATH))
+        await self.server.redeliver(2)
+        await self.start()
+        self.assertIn('Банк 500', await self.reply('/status'))
+        self.assertEqual(3, self.server.calls['sendMessage'])
+        self.assertTrue(await self.processed(2))
+        self.assertFalse(await self.processed(3))
+
+    async def test_update_applied_before_crash_is_not_applied_twice(self):
+        await self.start()
+        self.assertEqual('Катка началась', await self.reply('/start'))
+        with patch.object(bot.bot, '__reply_or_refresh', side_effect=RuntimeError('crashed')):
+            with self.assertLogs('bot.persistence', 'ERROR'):
+                await self.server.push_message(CHAT_ID, 'user1', '/buy 500')
+                self.assertIn('Банк 500', await self.reply('/status'))
+        self.assertTrue(await self.processed(2))
+        await self.stop(confirm=False)
+        await self.server.redeliver(2)
+        await self.start()
+        self.assertIn('Банк 500', await self.reply('/status'))
+
+    async def test_failed_update_is_not_recorded(self):
+        with patch.object(bot.bot, 'buy', side_effect=RuntimeError('failed')):
+            await self.start()
+            self.assertEqual('Катка началась', await self.reply('/start'))
+            with self.assertLogs('bot.persistence', 'ERROR'):
+                await self.server.push_message(CHAT_ID, 'user1', '/buy 500')
+                self.assertEqual('Никто не входил', await self.reply('/status'))
+        self.assertFalse(await self.processed(2))
+        await self.stop()
+        await self.server.redeliver(2)
+        await self.start()
+        self.assertIn('Банк 500', await self.reply('/status'))
@@ -0,0 +1,128 @@
+import asyncio
+import cProfile
+import os
+import random
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+from core.profiling import Profiler, run_profiled, current_profile, handed_off, load_profiles, format_report
+
+CHAT_ID = '-100123'
+
+
+def settle_bank() -> list[int]:
+    return [index * 2 for index in range(20000)]
+
+
+def render_status() -> int:
+    return sum(range(1000))
+
+
+def other_chat() -> int:
+    return sum(range(1000))
+
+
+class ProfilingTestCase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.profiler = Profiler(self.directory.name, rate=1, keep=3, random_=random.Random(0))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    async def run_command(self, command: str = 'stop', chat_id: str = CHAT_ID) -> None:
+        async with self.profiler.profile(command, chat_id) as profile:
+            self.assertIs(profile, current_profile())
+            render_status()
+            with handed_off():
+                await asyncio.to_thread(run_profiled, settle_bank)
+
+    def test_sample(self):
+        self.assertTrue(self.profiler.sample(CHAT_ID))
+        self.profiler.rate = 0
+        self.assertFalse(self.profiler.sample(CHAT_ID))
+        self.profiler.rate = 0.5
+        self.assertEqual(5, sum(self.profiler.sample(CHAT_ID) for _ in range(10)))
+        self.profiler.rate = 1
+        self.profiler.chats = {'-100999'}
+        self.assertFalse(self.profiler.sample(CHAT_ID))
+        self.assertTrue(self.profiler.sample('-100999'))
+
+    async def test_profile_covers_loop_and_executor_threads(self):
+        await self.run_command()
+        self.assertIsNone(current_profile())
+        stats, summaries = load_profiles(self.directory.name)
+        functions = {name for _, _, name in stats.stats}
+        self.assertTrue({'settle_bank', 'render_status'} <= functions)
+        self.assertEqual(1, len(summaries))
+        self.assertEqual(('stop', CHAT_ID), (summaries[0]['command'], summaries[0]['chat_id']))
+        self.assertGreater(summaries[0]['peak_bytes'], 20000 * 8)
+
+    async def test_profile_is_saved_off_the_event_loop(self):
+        threads = []
+        save = self.profiler.save
+
+        def record_thread(profile):
+            threads.append(threading.current_thread())
+            return save(profile)
+
+        with patch.object(self.profiler, 'save', record_thread):
+            await self.run_command()
+        self.assertEqual(1, len(threads))
+        self.assertIsNot(threading.current_thread(), threads[0])
+        self.assertEqual(2, len(os.listdir(self.directory.name)))
+
+    async def test_other_chats_are_not_recorded_while_handed_off(self):
+        async def other_handler():
+            await asyncio.sleep(0)
+            other_chat()
+
+        async with self.profiler.profile('stop', CHAT_ID):
+            render_status()
+            with handed_off():
+                await other_handler()
+                await asyncio.to_thread(run_profiled, settle_bank)
+        stats, _ = load_profiles(self.directory.name)
+        functions = {name for _, _, name in stats.stats}
+        self.assertTrue({'settle_bank', 'render_status'} <= functions)
+        self.assertNotIn('other_chat', functions)
+
+    async def test_command_is_not_profiled_under_another_profiler(self):
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            async with self.profiler.profile('stop', CHAT_ID) as profile:
+                self.assertIsNone(profile)
+                await asyncio.to_thread(run_profiled, settle_bank)
+        finally:
+            profiler.disable()
+        self.assertEqual(0, self.profiler.saved)
+        self.assertTrue(self.profiler.sample(CHAT_ID))
+
+    async def test_nested_command_is_not_profiled(self):
+        async with self.profiler.profile('stop', CHAT_ID):
+            self.assertFalse(self.profiler.sample(CHAT_ID))
+            async with self.profiler.profile('status', CHAT_ID) as nested:
+                self.assertIsNone(nested)
+        self.assertEqual(1, self.profiler.saved)
+
+    async def test_old_profiles_are_rotated(self):
+        for command in ['start', 'buy', 'quit', 'stop', 'statistics']:
+            await self.run_command(command)
+        self.assertEqual(6, len(os.listdir(self.directory.name)))
+        _, summaries = load_profiles(self.directory.name)
+        self.assertEqual(['quit', 'stop', 'statistics'], [summary['command'] for summary in summaries])
+
+    async def test_report_filters_and_ranks(self):
+        await self.run_command('stop')
+        await self.run_command('statistics', '-100999')
+        stats, summaries = load_profiles(self.directory.name, command='stop')
+        self.assertEqual(1, len(summaries))
+        report = format_report(stats, summaries, limit=10)
+        self.assertIn('1 sampled commands', report)
+        self.assertIn(f'stop         {CHAT_ID}', report)
+        self.assertIn('settle_bank', report)
+        self.assertNotIn('-100999', report)
+        self.assertEqual('No profiles found\n', format_report(*load_profiles(self.directory.name, chat_id='1')))
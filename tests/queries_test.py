@@ -0,0 +1,51 @@
+from core.buy_in import add_buy_in
+from core.cash_out import add_cash_out
+from core.game import start_game, finish_games
+from core.models import Game, BuyIn, CashOut, Action, Balance, LifetimeTotal, GameResult, MonthlyResult
+from core.queries import sum_balances, sum_finished_profit_by_chat_and_user
+from tests.base import BaseTestCase
+
+CHAT_ID = '123'
+
+
+class QueriesTestCase(BaseTestCase):
+    def models(self):
+        return [Game, BuyIn, CashOut, Action, Balance, LifetimeTotal, GameResult, MonthlyResult]
+
+    def setUp(self):
+        super().setUp()
+        start_game(CHAT_ID)
+        self.game = Game.get(chat_id=CHAT_ID, is_finished=False)
+        add_buy_in(CHAT_ID, ['user1', 'user2'], 500)
+        add_buy_in(CHAT_ID, ['user1'], 1000)
+        add_cash_out(CHAT_ID, 'user2', 800)
+
+    def test_sum_balances(self):
+        balances = {user: (buy_in, cash_out, last_buy_in, last_cash_out)
+                    for _, user, buy_in, cash_out, last_buy_in, last_cash_out in sum_balances(self.game)}
+        self.assertEqual({'user1', 'user2'}, set(balances))
+        self.assertEqual((1500, 0), balances['user1'][:2])
+        self.assertIsNone(balances['user1'][3])
+        self.assertEqual((500, 800), balances['user2'][:2])
+        self.assertGreater(balances['user2'][3], balances['user2'][2])
+
+    def test_sum_balances_for_one_user(self):
+        self.assertEqual([(self.game.id, 'user2', 500, 800)],
+                         [row[:4] for row in sum_balances(self.game.id, 'user2')])
+
+    def test_sum_balances_over_several_games(self):
+        finish_games(CHAT_ID)
+        start_game(CHAT_ID)
+        add_buy_in(CHAT_ID, ['user2'], 100)
+        games = Game.select(Game.id).where(Game.chat_id == CHAT_ID)
+        self.assertEqual(3, len(sum_balances(games)))
+
+    def test_sum_finished_profit_by_chat_and_user(self):
+        self.assertEqual([], sum_finished_profit_by_chat_and_user())
+        finish_games(CHAT_ID)
+        start_game(CHAT_ID)
+        add_buy_in(CHAT_ID, ['user2'], 100)
+        add_cash_out(CHAT_ID, 'user2', 300)
+        finish_games(CHAT_ID)
+        self.assertEqual([(CHAT_ID, 'user1', -1500, 1), (CHAT_ID, 'user2', 500, 2)],
+                         sum_finished_profit_by_chat_and_user(CHAT_ID))
@@ -0,0 +1,137 @@
+import datetime
+
+import core.buy_in
+import core.cash_out
+import core.game
+from core.analytics import get_user_stats, get_monthly_trend
+from core.buy_in import add_buy_in, has_buy_in, calculate_total_buy_in
+from core.cache import active_games
+from core.cash_out import add_cash_out, calculate_total_cash_out
+from core.game import start_game, finish_games, has_active_games, calculate_profit, \
+    calculate_total_profit_in_all_finished_games, calculate_active_players, calculate_bank_size, \
+    calculate_money_transfers, has_actions, has_undone_actions, undo_last_actions, undo_last_action, \
+    redo_undone_actions
+from core.models import Game, BuyIn, CashOut, Action, Balance, LifetimeTotal, GameResult, MonthlyResult, \
+    ProcessedUpdate
+from core.storage import Storage
+from core.updates import record_update, is_update_processed, last_processed_update, prune_processed_updates
+from tests.base import BaseTestCase, play_game
+
+CHAT_ID = '1234'
+OTHER_CHAT_ID = '2345'
+BUY_IN = 500
+
+QUERY_BUDGETS = {
+    'has_active_games': 1,
+    'has_buy_in': 2,
+    'calculate_total_buy_in': 2,
+    'calculate_total_buy_in(users)': 2,
+    'calculate_total_cash_out': 2,
+    'calculate_total_cash_out(user)': 2,
+    'calculate_profit': 2,
+    'calculate_profit(user)': 3,
+    'calculate_active_players': 2,
+    'calculate_bank_size': 2,
+    'calculate_money_transfers': 2,
+    'has_actions': 2,
+    'has_undone_actions': 2,
+    'calculate_total_profit_in_all_finished_games': 1,
+    'get_user_stats': 1,
+    'get_monthly_trend': 1,
+    'add_buy_in': 6,
+    'add_cash_out': 6,
+    'undo_last_actions': 7,
+    'undo_last_action': 7,
+    'redo_undone_actions': 8,
+    'finish_games': 6,
+    'start_game': 1,
+    'record_update': 1,
+    'is_update_processed': 1,
+    'last_processed_update': 1,
+    'prune_processed_updates': 1,
+}
+
+
+class QueryBudgetTestCase(BaseTestCase):
+    def models(self):
+        return [Game, BuyIn, CashOut, Action, Balance, LifetimeTotal, GameResult, MonthlyResult, ProcessedUpdate]
+
+    def test_query_counts_do_not_grow_with_data(self):
+        small = self.__measure(players=3, games=1)
+        self.__reset()
+        large = self.__measure(players=30, games=12)
+        self.assertEqual(small, large)
+
+    def test_every_core_function_has_a_budget(self):
+        storage_methods = Storage.__abstractmethods__ - {'atomic'}
+        instrumented = {name for module in [core.game, core.buy_in, core.cash_out]
+                        for name, function in vars(module).items()
+                        if hasattr(function, '__wrapped__') and function.__module__ == module.__name__}
+        budgeted = {name.split('(')[0] for name in QUERY_BUDGETS}
+        self.assertEqual(set(), (storage_methods | instrumented) - budgeted)
+
+    def test_budget_violation_lists_queries(self):
+        with self.assertRaises(AssertionError) as context:
+            with self.assertMaxQueries(1):
+                Game.select().count()
+                Action.select().count()
+        self.assertIn('2 queries, expected at most 1', str(context.exception))
+        self.assertIn('FROM "action"', str(context.exception))
+
+    def __measure(self, players: int, games: int) -> dict[str, int]:
+        users = [f'user{index}' for index in range(players)]
+        for chat_id in [CHAT_ID, OTHER_CHAT_ID]:
+            for _ in range(games):
+                play_game(chat_id, {user: (BUY_IN * 2, BUY_IN * 2) if index == 0 else (BUY_IN, BUY_IN)
+                                    for index, user in enumerate(users)})
+        start_game(CHAT_ID)
+        for user in users:
+            add_buy_in(CHAT_ID, [user], BUY_IN)
+        add_buy_in(CHAT_ID, users[::2], BUY_IN)
+        for user in users[::3]:
+            add_cash_out(CHAT_ID, user, BUY_IN)
+        for update_id in range(players * games):
+            record_update(update_id)
+        calls = {
+            'has_active_games': lambda: has_active_games(CHAT_ID),
+            'has_buy_in': lambda: has_buy_in(CHAT_ID, users[-1]),
+            'calculate_total_buy_in': lambda: calculate_total_buy_in(CHAT_ID),
+            'calculate_total_buy_in(users)': lambda: calculate_total_buy_in(CHAT_ID, users),
+            'calculate_total_cash_out': lambda: calculate_total_cash_out(CHAT_ID),
+            'calculate_total_cash_out(user)': lambda: calculate_total_cash_out(CHAT_ID, users[0]),
+            'calculate_profit': lambda: calculate_profit(CHAT_ID),
+            'calculate_profit(user)': lambda: calculate_profit(CHAT_ID, users[0]),
+            'calculate_active_players': lambda: calculate_active_players(CHAT_ID),
+            'calculate_bank_size': lambda: calculate_bank_size(CHAT_ID),
+            'calculate_money_transfers': lambda: calculate_money_transfers(CHAT_ID),
+            'has_actions': lambda: has_actions(CHAT_ID),
+            'has_undone_actions': lambda: has_undone_actions(CHAT_ID),
+            'calculate_total_profit_in_all_finished_games':
+                lambda: calculate_total_profit_in_all_finished_games(CHAT_ID),
+            'get_user_stats': lambda: get_user_stats(CHAT_ID),
+            'get_monthly_trend': lambda: get_monthly_trend(CHAT_ID),
+            'add_buy_in': lambda: add_buy_in(CHAT_ID, users, BUY_IN),
+            'add_cash_out': lambda: add_cash_out(CHAT_ID, users[-1], BUY_IN),
+            'undo_last_actions': lambda: undo_last_actions(CHAT_ID, 2),
+            'undo_last_action': lambda: undo_last_action(CHAT_ID),
+            'redo_undone_actions': lambda: redo_undone_actions(CHAT_ID, 2),
+            'finish_games': lambda: finish_games(CHAT_ID),
+            'start_game': lambda: start_game(CHAT_ID),
+            'record_update': lambda: record_update(players * games),
+            'is_update_processed': lambda: is_update_processed(players * games),
+            'last_processed_update': last_processed_update,
+            'prune_processed_updates': lambda: prune_processed_updates(datetime.datetime.now()),
+        }
+        counts = {}
+        for name, call in calls.items():
+            active_games.clear()
+            with self.subTest(name, players=players, games=games), \
+                    self.assertMaxQueries(QUERY_BUDGETS.get(name, 0)) as queries:
+                call()
+            counts[name] = len(queries)
+        return counts
+
+    def __reset(self):
+        self.test_db.drop_tables(self.models())
+        self.test_db.create_tables(self.models())
+        active_games.clear()
@@ -0,0 +1,108 @@
+import unittest
+
+from bot.rendering import MAX_MESSAGE_LENGTH, PAGES_KEY, format_summary, format_profit, message_length, paginate, \
+    render, reply_pages, show_page
+
+
+class FakeMessage:
+    def __init__(self, message_id: int, text: str = None):
+        self.message_id = message_id
+        self.text = text
+        self.replies = []
+
+    async def reply_text(self, text: str, reply_markup=None):
+        self.replies.append((text, reply_markup))
+        return FakeMessage(self.message_id + len(self.replies), text.strip())
+
+
+class FakeQuery:
+    def __init__(self, message: FakeMessage, data: str):
+        self.message = message
+        self.data = data
+        self.answers = []
+        self.edits = []
+
+    async def answer(self, text: str = None):
+        self.answers.append(text)
+
+    async def edit_message_text(self, text: str, reply_markup=None):
+        self.edits.append((text, reply_markup))
+
+
+class FakeUpdate:
+    def __init__(self, message: FakeMessage = None, callback_query: FakeQuery = None):
+        self.message = message
+        self.callback_query = callback_query
+
+
+class FakeContext:
+    def __init__(self):
+        self.chat_data = {}
+
+
+class RenderingTestCase(unittest.TestCase):
+    def test_format_summary(self):
+        lines = format_summary({'user1': 500, 'user2': 1000}, {'user1': 300}, 1200)
+        self.assertEqual('Банк 1200\n\nВход:\nuser2 1000\nuser1 500\n\nВыход:\nuser1 300\n', render(lines))
+
+    def test_format_summary_without_buy_ins(self):
+        self.assertEqual('Никто не входил', render(format_summary({}, {})))
+
+    def test_format_profit(self):
+        self.assertEqual('\nПрофит:\nuser2 300\nuser1 -300\n', render(format_profit({'user1': -300, 'user2': 300})))
+
+    def test_short_output_is_single_page(self):
+        lines = format_profit({'user1': 100})
+        self.assertEqual([lines], paginate(lines))
+
+    def test_long_output_is_split_on_line_boundaries(self):
+        lines = format_profit({f'user{i}': i for i in range(1000)})
+        pages = paginate(lines)
+        self.assertGreater(len(pages), 1)
+        self.assertEqual(lines, [line for page in pages for line in page])
+        for page in pages:
+            self.assertLessEqual(message_length(render(page)), MAX_MESSAGE_LENGTH)
+
+    def test_size_is_measured_in_utf16_units(self):
+        self.assertEqual(2, message_length('😀'))
+        pages = paginate(['😀' * 3], limit=4)
+        self.assertEqual([['😀😀'], ['😀']], pages)
+
+
+class PaginatedReplyTestCase(unittest.IsolatedAsyncioTestCase):
+    async def test_short_reply_has_no_keyboard(self):
+        message = FakeMessage(1)
+        context = FakeContext()
+        await reply_pages(FakeUpdate(message), context, ['Катка не идёт'])
+        self.assertEqual([('Катка не идёт', None)], message.replies)
+        self.assertEqual({}, context.chat_data)
+
+    async def test_navigate_pages(self):
+        message = FakeMessage(1)
+        context = FakeContext()
+        lines = format_profit({f'user{i}': i for i in range(1000)})
+        reply = await reply_pages(FakeUpdate(message), context, lines)
+        pages = context.chat_data[PAGES_KEY][reply.message_id]
+        text, keyboard = message.replies[0]
+        self.assertEqual(pages[0], text)
+        self.assertEqual(f'1/{len(pages)}', keyboard.inline_keyboard[0][1].text)
+
+        query = FakeQuery(reply, keyboard.inline_keyboard[0][2].callback_data)
+        await show_page(FakeUpdate(callback_query=query), context)
+        text, keyboard = query.edits[0]
+        self.assertEqual(pages[1], text)
+        self.assertEqual(f'2/{len(pages)}', keyboard.inline_keyboard[0][1].text)
+
+    async def test_current_page_is_not_edited(self):
+        context = FakeContext()
+        reply = await reply_pages(FakeUpdate(FakeMessage(1)), context, format_profit({f'u{i}': i for i in range(1000)}))
+        query = FakeQuery(reply, 'page:0')
+        await show_page(FakeUpdate(callback_query=query), context)
+        self.assertEqual([None], query.answers)
+        self.assertEqual([], query.edits)
+
+    async def test_expired_pages(self):
+        query = FakeQuery(FakeMessage(5), 'page:1')
+        await show_page(FakeUpdate(callback_query=query), FakeContext())
+        self.assertEqual(['Страница устарела'], query.answers)
+        self.assertEqual([], query.edits)
@@ -0,0 +1,63 @@
+import asyncio
+import unittest
+
+from telegram import Update
+
+from bot.scheduler import ChatUpdateProcessor
+
+
+def make_update(update_id: int, chat_id: int) -> Update:
+    return Update.de_json({
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': 0,
+            'chat': {'id': chat_id, 'type': 'group'},
+            'text': '/status',
+        }
+    }, None)
+
+
+class ChatUpdateProcessorTestCase(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.processor = ChatUpdateProcessor(max_concurrent_updates=8)
+        await self.processor.initialize()
+        self.running = {}
+        self.max_running = {}
+        self.order = []
+        self.peak = 0
+
+    async def asyncTearDown(self):
+        await self.processor.shutdown()
+
+    async def test_updates_in_same_chat_run_in_order(self):
+        await self.__process([make_update(update_id, chat_id=1) for update_id in range(5)])
+        self.assertEqual([(1, update_id) for update_id in range(5)], self.order)
+        self.assertEqual({1: 1}, self.max_running)
+
+    async def test_updates_in_different_chats_run_concurrently(self):
+        await self.__process([make_update(update_id, chat_id=update_id % 3) for update_id in range(6)])
+        self.assertEqual({0: 1, 1: 1, 2: 1}, self.max_running)
+        self.assertEqual([0, 3], [update_id for chat_id, update_id in self.order if chat_id == 0])
+        self.assertEqual(3, self.peak)
+        self.assertEqual(0, self.processor.active_chats)
+
+    async def test_queued_chat_does_not_hold_slots(self):
+        self.processor = ChatUpdateProcessor(max_concurrent_updates=2)
+        updates = [make_update(update_id, chat_id=1) for update_id in range(4)] + [make_update(4, chat_id=2)]
+        await self.__process(updates)
+        self.assertLess(self.order.index((2, 4)), 2)
+        self.assertEqual({1: 1, 2: 1}, self.max_running)
+        self.assertEqual(0, self.processor.active_chats)
+
+    async def __process(self, updates):
+        await asyncio.gather(*[self.processor.process_update(update, self.__handle(update)) for update in updates])
+
+    async def __handle(self, update):
+        chat_id = update.effective_chat.id
+        self.running[chat_id] = self.running.get(chat_id, 0) + 1
+        self.max_running[chat_id] = max(self.max_running.get(chat_id, 0), self.running[chat_id])
+        self.peak = max(self.peak, sum(self.running.values()))
+        await asyncio.sleep(0.01)
+        self.order.append((chat_id, update.update_id))
+        self.running[chat_id] -= 1
@@ -0,0 +1,44 @@
+import unittest
+
+from core.settlement import settle, GREEDY, EXACT
+
+
+class SettlementTestCase(unittest.TestCase):
+    def test_greedy_pays_largest_debt_to_largest_credit(self):
+        self.assertEqual(
+            [
+                {'from': 'user1', 'to': 'user2', 'amount': 1250},
+                {'from': 'user1', 'to': 'user3', 'amount': 250}
+            ],
+            settle({'user1': -1500, 'user2': 1250, 'user3': 250}, GREEDY)
+        )
+
+    def test_no_transfers_when_everyone_is_even(self):
+        self.assertEqual([], settle({'user1': 0, 'user2': 0}))
+        self.assertEqual([], settle({}))
+
+    def test_exact_finds_zero_sum_subgroups(self):
+        profits = {'user1': -400, 'user2': -350, 'user3': 350, 'user4': 100, 'user5': 300}
+        self.assertEqual(4, len(settle(profits, GREEDY)))
+        self.assertEqual(
+            [
+                {'from': 'user1', 'to': 'user5', 'amount': 300},
+                {'from': 'user1', 'to': 'user4', 'amount': 100},
+                {'from': 'user2', 'to': 'user3', 'amount': 350}
+            ],
+            sorted(settle(profits, EXACT), key=lambda transfer: transfer['from'])
+        )
+
+    def test_exact_falls_back_to_greedy_when_out_of_time(self):
+        profits = {f'user{index}': (index % 7 - 3) * 100 for index in range(15)}
+        profits['user15'] = -sum(profits.values())
+        self.assertEqual(settle(profits, GREEDY), settle(profits, EXACT, time_budget=0))
+
+    def test_transfers_settle_all_profits(self):
+        profits = {f'user{index}': (index * 37 % 11 - 5) * 50 for index in range(12)}
+        profits['user12'] = -sum(profits.values())
+        balances = dict(profits)
+        for transfer in settle(profits):
+            balances[transfer['from']] += transfer['amount']
+            balances[transfer['to']] -= transfer['amount']
+        self.assertEqual({0}, set(balances.values()))
@@ -0,0 +1,147 @@
+import datetime
+import os
+import tempfile
+
+from core.memory_storage import MemoryStorage
+from core.models import Game, BuyIn, CashOut, Action, Balance, LifetimeTotal, GameResult, MonthlyResult, \
+    ProcessedUpdate
+from core.storage import Storage, SqliteStorage, create_storage, MEMORY, SQLITE
+from tests.base import BaseTestCase, play_game
+
+CHAT_ID_1 = '1234'
+CHAT_ID_2 = '2345'
+
+
+def play(storage: Storage) -> list:
+    results = []
+    with storage.atomic():
+        storage.start_game(CHAT_ID_1)
+        storage.start_game(CHAT_ID_2)
+        storage.add_buy_in(CHAT_ID_1, ['user1', 'user2', 'user3'], 500)
+        storage.add_buy_in(CHAT_ID_1, ['user2'], 300)
+        storage.add_buy_in(CHAT_ID_2, ['user1'], 100)
+        storage.add_cash_out(CHAT_ID_1, 'user1', 1000)
+        results.append(storage.undo_last_actions(CHAT_ID_1, 2))
+        results.append(storage.has_undone_actions(CHAT_ID_1))
+        results.append(storage.redo_undone_actions(CHAT_ID_1))
+        results.append(storage.calculate_active_players(CHAT_ID_1))
+        storage.add_cash_out(CHAT_ID_1, 'user1', 900)
+        storage.add_cash_out(CHAT_ID_1, 'user2', 400)
+        results.append(storage.has_undone_actions(CHAT_ID_1))
+        results.append(storage.redo_undone_actions(CHAT_ID_1))
+        results.append(storage.calculate_total_buy_in(CHAT_ID_1))
+        results.append(storage.calculate_total_cash_out(CHAT_ID_1))
+        results.append(storage.calculate_total_cash_out(CHAT_ID_1, 'user3'))
+        results.append(storage.calculate_profit(CHAT_ID_1))
+        results.append(storage.calculate_profit(CHAT_ID_1, 'user1'))
+        results.append(storage.calculate_bank_size(CHAT_ID_1))
+        results.append(storage.calculate_active_players(CHAT_ID_1))
+        results.append(storage.calculate_money_transfers(CHAT_ID_1))
+        results.append(storage.has_buy_in(CHAT_ID_1, 'user3'))
+        storage.add_cash_out(CHAT_ID_1, 'user3', 100)
+        storage.finish_games(CHAT_ID_1)
+        results.append(storage.has_active_games(CHAT_ID_1))
+        results.append(storage.has_actions(CHAT_ID_2))
+        play_game(CHAT_ID_1, {'user3': (200, 400), 'user1': (200, 0)}, storage=storage)
+        results.append(storage.calculate_total_profit_in_all_finished_games(CHAT_ID_1))
+        results.append(storage.calculate_total_profit_in_all_finished_games(CHAT_ID_2))
+        results.append(storage.get_user_stats(CHAT_ID_1))
+        today = datetime.date.today()
+        results.append(storage.get_user_stats(CHAT_ID_1, today, today))
+        results.append(storage.get_user_stats(CHAT_ID_1, today + datetime.timedelta(days=1)))
+        results.append(storage.get_monthly_trend(CHAT_ID_1))
+        results.append(storage.calculate_bank_size(CHAT_ID_2))
+    return results
+
+
+class StorageTestCase(BaseTestCase):
+    def models(self):
+        return [Game, BuyIn, CashOut, Action, Balance, LifetimeTotal, GameResult, MonthlyResult, ProcessedUpdate]
+
+    def test_engines_agree(self):
+        self.assertEqual(play(SqliteStorage()), play(MemoryStorage()))
+
+    def test_scenario(self):
+        results = play(MemoryStorage())
+        self.assertEqual([{'type': 'cash_out', 'user': 'user1', 'amount': 1000},
+                          {'type': 'buy_in', 'user': 'user2', 'amount': 300}], results[0])
+        self.assertEqual([{'type': 'buy_in', 'user': 'user2', 'amount': 300}], results[2])
+        self.assertEqual(['user1', 'user2', 'user3'], results[3])
+        self.assertFalse(results[4])
+        self.assertEqual([], results[5])
+        self.assertEqual({'user1': 500, 'user2': 800, 'user3': 500}, results[6])
+        self.assertEqual({'user1': 900, 'user2': 400}, results[7])
+        self.assertEqual(0, results[8])
+        self.assertEqual(500, results[11])
+        self.assertEqual(['user3'], results[12])
+        self.assertEqual({'user1': 200, 'user2': -400, 'user3': -200}, results[17])
+        self.assertEqual([('user1', 2, 700, 200, 400, -200), ('user3', 2, 700, -200, 200, -400),
+                          ('user2', 1, 800, -400, -400, -400)], results[19])
+        self.assertEqual(results[19], results[20])
+        self.assertEqual([], results[21])
+
+    def test_incomplete_engine_cannot_be_created(self):
+        class PartialStorage(Storage):
+            def has_active_games(self, chat_id: str) -> bool:
+                return False
+
+        with self.assertRaisesRegex(TypeError, 'abstract'):
+            PartialStorage()
+
+    def test_missing_game(self):
+        for storage in [SqliteStorage(), MemoryStorage()]:
+            with self.assertRaises(Game.DoesNotExist):
+                storage.calculate_bank_size(CHAT_ID_1)
+
+    def test_processed_updates(self):
+        for storage in [SqliteStorage(), MemoryStorage()]:
+            self.assertIsNone(storage.last_processed_update())
+            with storage.atomic():
+                storage.record_update(10)
+                storage.record_update(10)
+                storage.record_update(8)
+            self.assertTrue(storage.is_update_processed(10))
+            self.assertFalse(storage.is_update_processed(9))
+            self.assertEqual(10, storage.last_processed_update())
+            self.assertEqual(0, storage.prune_processed_updates(datetime.datetime.now() - datetime.timedelta(days=1)))
+            self.assertEqual(2, storage.prune_processed_updates(datetime.datetime.now() + datetime.timedelta(days=1)))
+            self.assertFalse(storage.is_update_processed(10))
+
+    def test_snapshot_round_trip(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'poker.snapshot')
+            storage = create_storage(MEMORY, path)
+            storage.start()
+            play(storage)
+            storage.start_game(CHAT_ID_1)
+            storage.add_buy_in(CHAT_ID_1, ['user1'], 100)
+            storage.undo_last_actions(CHAT_ID_1)
+            storage.record_update(10)
+            storage.stop()
+
+            restored = create_storage(MEMORY, path)
+            restored.start()
+            self.assertTrue(restored.has_undone_actions(CHAT_ID_1))
+            self.assertEqual([{'type': 'buy_in', 'user': 'user1', 'amount': 100}],
+                             restored.redo_undone_actions(CHAT_ID_1))
+            self.assertEqual(storage.get_user_stats(CHAT_ID_1), restored.get_user_stats(CHAT_ID_1))
+            self.assertEqual(storage.calculate_total_profit_in_all_finished_games(CHAT_ID_1),
+                             restored.calculate_total_profit_in_all_finished_games(CHAT_ID_1))
+            self.assertEqual(100, restored.calculate_bank_size(CHAT_ID_2))
+            self.assertTrue(restored.is_update_processed(10))
+
+    def test_periodic_snapshots(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'poker.snapshot')
+            storage = MemoryStorage(path, snapshot_interval=0.01)
+            storage.start()
+            storage.start_game(CHAT_ID_1)
+            storage.stop()
+            self.assertTrue(os.path.exists(path))
+            self.assertFalse(os.path.exists(f'{path}.tmp'))
+
+    def test_create_storage(self):
+        self.assertIsInstance(create_storage(SQLITE), SqliteStorage)
+        self.assertIsInstance(create_storage(MEMORY), MemoryStorage)
+        with self.assertRaises(AssertionError):
+            create_storage('redis')
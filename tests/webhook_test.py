@@ -0,0 +1,109 @@
+import asyncio
+import unittest
+
+import httpx
+
+from bot.persistence import UpdateTracker
+from bot.webhook import WebhookServer
+from core.memory_storage import MemoryStorage
+
+SECRET_TOKEN = 'secret'
+RECORDED_UPDATE = {
+    'update_id': 10001,
+    'message': {
+        'message_id': 1,
+        'date': 1700000000,
+        'chat': {'id': -100123, 'type': 'group', 'title': 'Poker'},
+        'from': {'id': 42, 'is_bot': False, 'first_name': 'User', 'username': 'user1'},
+        'text': '/buy 500',
+        'entities': [{'type': 'bot_command', 'offset': 0, 'length': 4}],
+    }
+}
+
+
+class WebhookServerTestCase(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.update_queue = asyncio.Queue()
+        self.server = WebhookServer(self.update_queue, None, SECRET_TOKEN, '/telegram')
+        await self.server.start('127.0.0.1', 0)
+        self.client = httpx.AsyncClient(base_url=f'http://127.0.0.1:{self.server.port}')
+
+    async def asyncTearDown(self):
+        await self.client.aclose()
+        await self.server.stop()
+
+    async def test_recorded_update_is_queued(self):
+        response = await self.client.post('/telegram', json=RECORDED_UPDATE,
+                                          headers={'X-Telegram-Bot-Api-Secret-Token': SECRET_TOKEN})
+        self.assertEqual(200, response.status_code)
+        update = self.update_queue.get_nowait()
+        self.assertEqual(10001, update.update_id)
+        self.assertEqual(-100123, update.effective_chat.id)
+        self.assertEqual('/buy 500', update.message.text)
+
+    async def test_wrong_secret_token_is_rejected(self):
+        response = await self.client.post('/telegram', json=RECORDED_UPDATE,
+                                          headers={'X-Telegram-Bot-Api-Secret-Token': 'wrong'})
+        self.assertEqual(403, response.status_code)
+        response = await self.client.post('/telegram', json=RECORDED_UPDATE)
+        self.assertEqual(403, response.status_code)
+        response = await self.client.post('/telegram', json=RECORDED_UPDATE,
+                                          headers={'X-Telegram-Bot-Api-Secret-Token': 'sécret'.encode()})
+        self.assertEqual(403, response.status_code)
+        self.assertTrue(self.update_queue.empty())
+
+    async def test_invalid_requests(self):
+        headers = {'X-Telegram-Bot-Api-Secret-Token': SECRET_TOKEN}
+        self.assertEqual(404, (await self.client.post('/other', json=RECORDED_UPDATE, headers=headers)).status_code)
+        self.assertEqual(405, (await self.client.get('/telegram', headers=headers)).status_code)
+        self.assertEqual(400, (await self.client.post('/telegram', content=b'{', headers=headers)).status_code)
+        self.assertEqual(400, (await self.client.post('/telegram', json=[], headers=headers)).status_code)
+        self.assertEqual(400, (await self.client.post('/telegram', json=1, headers=headers)).status_code)
+        self.assertTrue(self.update_queue.empty())
+
+    async def test_concurrent_updates_on_many_connections(self):
+        clients = [httpx.AsyncClient(base_url=f'http://127.0.0.1:{self.server.port}') for _ in range(5)]
+        responses = await asyncio.gather(*[
+            client.post('/telegram', json=dict(RECORDED_UPDATE, update_id=index),
+                        headers={'X-Telegram-Bot-Api-Secret-Token': SECRET_TOKEN})
+            for index, client in enumerate(clients)
+        ])
+        for client in clients:
+            await client.aclose()
+        self.assertEqual([200] * 5, [response.status_code for response in responses])
+        self.assertEqual(5, self.update_queue.qsize())
+
+    async def test_stop_waits_for_in_flight_updates(self):
+        self.update_queue = asyncio.Queue(maxsize=1)
+        self.update_queue.put_nowait(None)
+        self.server.update_queue = self.update_queue
+        request = asyncio.create_task(self.client.post('/telegram', json=RECORDED_UPDATE,
+                                                       headers={'X-Telegram-Bot-Api-Secret-Token': SECRET_TOKEN}))
+        await asyncio.sleep(0.05)
+        stop = asyncio.create_task(self.server.stop())
+        await asyncio.sleep(0.05)
+        self.assertFalse(stop.done())
+        self.update_queue.get_nowait()
+        await stop
+        self.assertEqual(200, (await request).status_code)
+        self.assertEqual(10001, self.update_queue.get_nowait().update_id)
+
+    async def test_response_waits_for_handled_update(self):
+        self.server.tracker = UpdateTracker(MemoryStorage())
+        headers = {'X-Telegram-Bot-Api-Secret-Token': SECRET_TOKEN}
+        requests = [asyncio.create_task(self.client.post('/telegram', json=RECORDED_UPDATE, headers=headers))
+                    for _ in range(2)]
+        update = await asyncio.wait_for(self.update_queue.get(), 1)
+        await asyncio.sleep(0.05)
+        self.assertFalse(any(request.done() for request in requests))
+        self.assertTrue(self.update_queue.empty())
+        self.server.tracker.finish(update.update_id, True)
+        self.assertEqual([200, 200], [(await request).status_code for request in requests])
+
+    async def test_failed_update_is_reported_for_retry(self):
+        self.server.tracker = UpdateTracker(MemoryStorage())
+        request = asyncio.create_task(self.client.post('/telegram', json=RECORDED_UPDATE,
+                                                       headers={'X-Telegram-Bot-Api-Secret-Token': SECRET_TOKEN}))
+        update = await asyncio.wait_for(self.update_queue.get(), 1)
+        self.server.tracker.finish(update.update_id, False)
+        self.assertEqual(500, (await request).status_code)